@@ -3,12 +3,30 @@ import os
 import json
 from datetime import datetime
 from pathlib import Path
-import plotly.graph_objects as go
-import plotly.express as px
 from dotenv import load_dotenv
 from orchestrator.prompt_tester import PromptTester
 from orchestrator.workflow_engine import WorkflowEngine
-import glob
+from orchestrator.streaming import BRIEF_STREAM
+from orchestrator.map_reduce import workflow_for
+from orchestrator.dag import format_critical_path
+from orchestrator.variant_runner import VariantRunner
+from orchestrator.adaptive_runner import AdaptiveVariantRunner, resume_runner
+from orchestrator.checkpoints import CheckpointStore
+from orchestrator.pricing import billed_calls, total_tokens
+from orchestrator.results_index import ANALYSIS, AB_TEST, ResultsIndex, save_test
+from orchestrator.result_store import Compactor
+from orchestrator.analytics import TestHistory
+from orchestrator.charts import (METRIC_TABS, ab_test_figures, composite_scores_figure, score_box_figure,
+                                 score_trend_figure, win_rate_figure)
+from orchestrator.resilience import ResilientAgentClient, describe_attempts, hedging_enabled
+from orchestrator.jobs import CANCELLED, FAILED, QUEUED, RUNNING, JobQueue
+from orchestrator.single_flight import fingerprint
+from orchestrator.cascade import cascading_client, describe_cascade
+from orchestrator.telemetry import METRICS_PORT, TELEMETRY, start_metrics_server
+from orchestrator.tracing import activate, span, start_trace, within
+from orchestrator.session_store import SessionStore, result_summary
+import time
+import uuid
 
 # Page configuration
 st.set_page_config(
@@ -21,15 +39,295 @@ st.set_page_config(
 # Load environment variables
 load_dotenv()
 
-# Initialize session state
-if 'analysis_results' not in st.session_state:
-    st.session_state.analysis_results = None
-if 'test_results' not in st.session_state:
-    st.session_state.test_results = None
+
+@st.cache_resource
+def results_index():
+    """Shared manifest of saved results (backfilled from outputs/ on first use)"""
+    return ResultsIndex()
+
+
+@st.cache_resource
+def store_compactor():
+    """Background compaction of the compressed results store"""
+    return Compactor(results_index()).start()
+
+
+@st.cache_resource
+def agent_client():
+    """Shared client, so retry backoff, hedging latencies and the circuit breaker span every session"""
+    return ResilientAgentClient(hedge=hedging_enabled())
+
+
+@st.cache_resource
+def metrics_port():
+    """Serve /metrics once per process; None when the port is already taken"""
+    port = int(os.getenv('METRICS_PORT', METRICS_PORT))
+    try:
+        start_metrics_server(port)
+    except OSError:
+        return None
+    return port
+
+
+@st.cache_resource
+def session_store():
+    """Per-session results: summaries in memory, full payloads spilled to outputs/sessions/ under a quota"""
+    return SessionStore()
+
+
+def session_results():
+    """This session's handle on the shared session store"""
+    if 'results' not in st.session_state:
+        st.session_state.results = session_store().session()
+    return st.session_state.results
+
+
+@st.cache_resource
+def test_history():
+    """Columnar A/B history for the Analytics page (loaded from its cache once per process)"""
+    return TestHistory(results_index())
+
+
+@st.cache_resource
+def job_queue():
+    """Worker pool shared by every session; analyses and A/B tests run here, not in the script thread"""
+    return JobQueue(max_workers=int(os.getenv('APP_JOB_WORKERS', '4')))
+
+
+def in_trace(root, target):
+    """Job target that runs inside the trace its request started, ending (and exporting) it with the job"""
+    def run(job, *args):
+        with activate(root):
+            return target(job, *args)
+    return run
+
+
+def analysis_job(job, workflow, input_data):
+    """Run the streaming workflow, publishing the brief and each agent's fields as they arrive"""
+    brief_text = ""
+    agents, errors = {}, {}
+    job.set_progress(0, len(workflow.agent_names))
+    job.update(agent_names=workflow.agent_names)
+
+    for event in workflow.run(input_data):
+        if event['type'] == 'complete':
+            return event['result']
+        if job.cancelled():
+            return None
+
+        agent_name = event['agent']
+        if agent_name == BRIEF_STREAM:
+            if event['type'] == 'delta':
+                brief_text += event['text']
+                job.update(brief=brief_text)
+            continue
+
+        if event['type'] == 'done':
+            agent_result = event['result']
+            job.set_progress(job.progress[0] + 1, job.progress[1])
+            if not agent_result['success']:
+                attempts = describe_attempts(agent_result)
+                errors[agent_name] = agent_result.get('error', 'Unknown error') + (f" ({attempts})" if attempts else "")
+                job.update(errors=dict(errors))
+                continue
+            agents[agent_name] = agent_result['output']
+        else:
+            agents[agent_name] = event['fields']
+        job.update(agents=dict(agents))
+
+    if job.cancelled():
+        return None
+    raise RuntimeError("The workflow ended without a result")
+
+
+def ab_test_job(job, runner, run_id):
+    """Finish a checkpointed A/B run and save it unless cancelled"""
+    results = runner.resume(run_id, on_progress=job.set_progress, cancel=job.cancel_event)
+    if not results.get('cancelled'):
+        runner.mark_saved(run_id, save_test(runner.tester, results, results_index()))
+    return results
+
+
+def launch_ab_run(runner, run_id, root):
+    """Queue a checkpointed run on the worker pool (the job id is the run id), finishing the trace root"""
+    job_queue().submit('ab_test', in_trace(root, ab_test_job), runner, run_id, job_id=run_id)
+    st.session_state.ab_run_id = run_id
+
+
+def job_waiting(job):
+    """Placeholder shown while a job waits for a free worker"""
+    position = job_queue().position(job.id)
+    st.info(f"⏳ Queued for a worker ({position} ahead)" if position else "⏳ Waiting for a worker...")
+
+
+@st.fragment(run_every=0.5)
+def analysis_status():
+    """Live view of this session's analysis job: agent fields and brief as they stream in"""
+    job = job_queue().get(st.session_state.analysis_job_id)
+    if job is None:
+        st.session_state.analysis_job_id = None
+        return
+
+    if job.status == QUEUED:
+        job_waiting(job)
+    elif not job.finished:
+        partial = job.snapshot()
+        done, total = job.progress
+        st.status(f"🔄 Running multi-agent analysis... {done}/{total} agents finished ({job.elapsed():.0f}s)",
+                  expanded=False)
+
+        st.subheader("📋 Executive Summary")
+        if partial.get('brief'):
+            st.markdown(f"```\n{partial['brief']}\n```")
+        else:
+            st.info("Waiting for agent insights...")
+
+        st.subheader("🤖 Agent Insights")
+        agent_names = partial.get('agent_names', [])
+        agents, errors = partial.get('agents', {}), partial.get('errors', {})
+        for tab, agent_name in zip(st.tabs([name.replace('_', ' ').title() for name in agent_names]), agent_names):
+            with tab:
+                if agent_name in errors:
+                    st.error(f"Agent failed: {errors[agent_name]}")
+                for key, value in agents.get(agent_name, {}).items():
+                    if not key.startswith('_') and key != 'raw_response':
+                        st.markdown(f"**{key.replace('_', ' ').title()}:**")
+                        st.info(value)
+
+    if not job.finished:
+        if job.waiters > 1:
+            st.caption(f"👥 Shared with {job.waiters - 1} other request(s) for the same document")
+        if job.cancelled():
+            st.caption("Cancelling...")
+        elif st.button("⏹️ Cancel Analysis"):
+            if not job_queue().cancel(job.id):
+                # Others are still waiting on it, so this session just stops following it
+                st.session_state.analysis_job_id = None
+                st.session_state.analysis_message = ('info', "⏹️ Left the shared analysis; it continues for the other requests.")
+                st.rerun(scope="app")
+        return
+
+    # Finished: hand the result to the page and stop polling
+    st.session_state.analysis_job_id = None
+    if job.status == FAILED:
+        st.session_state.analysis_message = ('error', f"❌ Error: {job.error}")
+    elif job.status == CANCELLED:
+        st.session_state.analysis_message = ('warning', "⏹️ Analysis cancelled.")
+    else:
+        result = job_queue().collect(job.id)
+        if result is None:
+            st.session_state.analysis_message = ('error', "❌ Analysis finished without a result.")
+        elif result['success']:
+            session_results().put('analysis', result, result_summary(result))
+            st.session_state.analysis_message = ('success', "✅ Analysis complete!")
+        else:
+            st.session_state.analysis_message = ('error', f"❌ Analysis failed: {result.get('error', 'Unknown error')}")
+    st.rerun(scope="app")
+
+
+@st.fragment(run_every=1.0)
+def ab_run_status():
+    """Progress and cancel button for this session's running A/B test, refreshed every second"""
+    run_id = st.session_state.ab_run_id
+    job = job_queue().get(run_id)
+    if job is None:
+        st.session_state.ab_run_id = None
+        return
+
+    if job.status == QUEUED:
+        job_waiting(job)
+    if not job.finished:
+        done, total = job.progress
+        if job.status == RUNNING:
+            st.progress(done / total if total else 0.0, text=f"🔄 {run_id}: {done}/{total} calls complete")
+        if job.cancelled():
+            st.caption("Cancelling: waiting for calls in flight...")
+        elif st.button("⏹️ Cancel Test", help="Stop scheduling calls; finished calls are kept and the run can be resumed"):
+            job_queue().cancel(run_id)
+        return
+
+    # Finished: hand the results to the page and stop polling
+    st.session_state.ab_run_id = None
+    if job.status == FAILED:
+        st.session_state.ab_run_message = ('error', f"❌ Error: {job.error} (resume {run_id} to retry the remaining calls)")
+    elif job.status == CANCELLED:
+        st.session_state.ab_run_message = ('warning', f"⏹️ A/B test cancelled. Finished calls are kept; resume {run_id} below.")
+    else:
+        result = job_queue().collect(run_id)
+        if result is None:
+            st.session_state.ab_run_message = ('error', f"❌ A/B test finished without a result (resume {run_id} to retry)")
+        else:
+            session_results().put('ab_test', result, result_summary(result))
+            st.session_state.ab_run_message = ('success', "✅ A/B test complete!")
+    st.rerun(scope="app")
+
+
+def result_version(path, entry):
+    """Part of the cache keys below: the file's mtime, so a rewritten result isn't served stale (index time once packed)"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return entry['created_at']
+
+
+@st.cache_data(max_entries=32)
+def load_result(path, version):
+    return results_index().load(path)
+
+
+@st.cache_data(max_entries=32)
+def load_result_text(entry):
+    return results_index().load_text(entry)
+
+
+# Figures are cached as objects (cache_resource): no pickling, and st.plotly_chart skips re-validating them
+@st.cache_resource(max_entries=64)
+def ab_figures(result_id, _results):
+    """Radar and metric bar charts, built once per A/B result"""
+    return ab_test_figures(_results)
+
+
+@st.cache_resource(max_entries=64)
+def history_figure(path, version):
+    """Composite score chart of a saved A/B test"""
+    return composite_scores_figure(load_result(path, version))
+
+
+@st.cache_resource(max_entries=32, ttl=300)
+def analytics_view(version, agent, days, _history):
+    """Aggregates and figures for one Analytics filter, rebuilt when the history changes"""
+    since = time.time() - days * 86400 if days else None
+    variants = _history.select(_history.variants, agent, since)
+    rates = _history.win_rates(agent, since)
+    return {
+        'tests': variants['path'].nunique(),
+        'variants': len(variants[['agent_name', 'variant_id']].drop_duplicates()),
+        'calls': len(_history.select(_history.calls, agent, since)),
+        'rates': rates,
+        'win_rates': win_rate_figure(rates),
+        'score_boxes': score_box_figure(_history.score_boxes(agent, since)),
+        'score_trend': score_trend_figure(_history.score_trend(agent, since)),
+        'score_distribution': _history.score_distribution(agent, since),
+        'latency': _history.latency_percentiles(agent, since)
+    }
+
+
+store_compactor()
+
+
+# Initialize session state (finished results live in the session store, see session_results())
 if 'document_input' not in st.session_state:
     st.session_state.document_input = ""
 if 'context_input' not in st.session_state:
     st.session_state.context_input = ""
+if 'ab_run_id' not in st.session_state:
+    st.session_state.ab_run_id = None
+if 'ab_run_message' not in st.session_state:
+    st.session_state.ab_run_message = None
+if 'analysis_job_id' not in st.session_state:
+    st.session_state.analysis_job_id = None
+if 'analysis_message' not in st.session_state:
+    st.session_state.analysis_message = None
 
 # Custom CSS
 st.markdown("""
@@ -88,7 +386,7 @@ with st.sidebar:
 
     page = st.radio(
         "Select Mode:",
-        ["📝 Analysis", "🧪 A/B Testing", "📊 Results History", "⚙️ Configuration"],
+        ["📝 Analysis", "🧪 A/B Testing", "📊 Results History", "📈 Analytics", "⚙️ Configuration"],
         label_visibility="collapsed"
     )
 
@@ -107,15 +405,39 @@ with st.sidebar:
     # Quick Stats
     st.subheader("📈 Quick Stats")
 
-    # Count analyses
-    analysis_files = glob.glob('outputs/analysis_*.json')
-    test_files = glob.glob('outputs/tests/ab_test_*.json')
-
+    # Counts come from the results index, not a directory listing
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Analyses", len(analysis_files))
+        st.metric("Analyses", results_index().count(ANALYSIS))
     with col2:
-        st.metric("A/B Tests", len(test_files))
+        st.metric("A/B Tests", results_index().count(AB_TEST))
+
+    # Shared worker pool (all sessions)
+    jobs = job_queue().stats()
+    st.caption(f"⚙️ Jobs: {jobs[RUNNING]} running, {jobs[QUEUED]} queued on {jobs['workers']} workers"
+               + (f" · {jobs['coalesced']} duplicate requests joined" if jobs['coalesced'] else ""))
+
+    # Finished results of every session: spilled to disk, a bounded payload cache in memory
+    stored = session_store().stats()
+    st.caption(f"🗄️ Session results: {stored['sessions']} sessions, {stored['disk_bytes'] / 1024:,.0f} KB on disk, "
+               f"{stored['cache_bytes'] / 1024:,.0f} KB cached"
+               + (f" · {stored['evictions']} evicted" if stored['evictions'] else ""))
+
+    # Rolling per-agent telemetry (all sessions, last 15 minutes)
+    with st.expander("📈 Telemetry"):
+        summary = TELEMETRY.summary()
+        if summary:
+            st.dataframe(summary, hide_index=True, column_config={
+                'p50_s': st.column_config.NumberColumn("p50", format="%.2fs"),
+                'p95_s': st.column_config.NumberColumn("p95", format="%.2fs"),
+                'cached_share': st.column_config.NumberColumn("cached", format="%.2f"),
+                'cost_usd': st.column_config.NumberColumn("cost", format="$%.4f")
+            })
+        else:
+            st.caption("No agent calls in the last 15 minutes")
+        port = metrics_port()
+        if port:
+            st.caption(f"Prometheus metrics: http://127.0.0.1:{port}/metrics")
 
     st.markdown("---")
 
@@ -128,6 +450,8 @@ with st.sidebar:
 
         **Results History**: View past analyses and tests
 
+        **Analytics**: Win rates, scores and latency across all A/B tests
+
         **Configuration**: Manage prompt variants and settings
         """)
 
@@ -186,16 +510,20 @@ if page == "📝 Analysis":
     col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
 
     with col1:
-        analyze_button = st.button("🚀 Run Analysis", type="primary", use_container_width=True)
+        analyze_button = st.button(
+            "🚀 Run Analysis", type="primary", use_container_width=True,
+            disabled=st.session_state.analysis_job_id is not None
+        )
 
     with col2:
         clear_button = st.button("🗑️ Clear", use_container_width=True)
 
     with col3:
-        if st.session_state.analysis_results:
+        analysis_results = session_results().get('analysis')
+        if analysis_results:
             st.download_button(
                 "📥 Download",
-                json.dumps(st.session_state.analysis_results, indent=2),
+                json.dumps(analysis_results, indent=2),
                 file_name=f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 use_container_width=True
             )
@@ -203,7 +531,7 @@ if page == "📝 Analysis":
     if clear_button:
         st.session_state.document_input = ""
         st.session_state.context_input = ""
-        st.session_state.analysis_results = None
+        session_results().delete('analysis')
         st.rerun()
 
     if analyze_button:
@@ -212,36 +540,61 @@ if page == "📝 Analysis":
         elif not os.getenv('ANTHROPIC_API_KEY'):
             st.error("⚠️ ANTHROPIC_API_KEY not found in environment")
         else:
-            with st.spinner("🔄 Running multi-agent analysis..."):
-                try:
-                    # Initialize engine
-                    engine = WorkflowEngine()
-                    engine.initialize_agents()
-
-                    # Prepare input
-                    input_data = {
-                        'document': document,
-                        'context': context if context else ""
-                    }
-
-                    # Execute
-                    result = engine.execute_workflow(input_data)
-
-                    if result['success']:
-                        st.session_state.analysis_results = result
-                        st.success("✅ Analysis complete!")
-                    else:
-                        st.error(f"❌ Analysis failed: {result.get('error', 'Unknown error')}")
-
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-
-    # Display results
-    if st.session_state.analysis_results:
+            # Long documents are chunked and analysed map-reduce style; the run happens on the
+            # worker pool and is polled below, so reruns and other widgets don't interrupt it
+            input_data = {
+                'document': document,
+                'context': context if context else ""
+            }
+            # Identical requests from other sessions already in flight are joined, not re-run
+            # One trace per analysis: started here, continued and ended by the job
+            analysis_trace = start_trace('app.analysis', characters=len(document))
+            with within(analysis_trace):
+                with span('workflow_engine.init'):
+                    config = WorkflowEngine().config
+                workflow = workflow_for(config, input_data, client=cascading_client(config, agent_client()))
+            session_results().delete('analysis')
+            job_id = f"analysis_{uuid.uuid4().hex[:10]}"
+            st.session_state.analysis_job_id = job_queue().submit(
+                'analysis', in_trace(analysis_trace, analysis_job), workflow, input_data, job_id=job_id,
+                key=fingerprint(input_data, config)
+            )
+            if st.session_state.analysis_job_id != job_id:
+                # Joined a run already in flight, which has its own trace
+                analysis_trace.set(joined=st.session_state.analysis_job_id)
+                analysis_trace.end()
+
+    # Running analysis
+    if st.session_state.analysis_job_id is not None:
+        analysis_status()
+
+    if st.session_state.analysis_message:
+        level, message = st.session_state.analysis_message
+        getattr(st, level)(message)
+        st.session_state.analysis_message = None
+
+    # Display results (re-read: the status fragment may have just stored them)
+    results = session_results().get('analysis')
+    if (session_results().summary('analysis') or {}).get('evicted'):
+        st.info("This analysis was evicted from the session cache; open it from Results History.")
+    if results:
         st.markdown("---")
         st.header("📊 Analysis Results")
 
-        results = st.session_state.analysis_results
+        if results.get('time_to_first_insight') is not None:
+            st.caption(f"⏱️ First insight after {results['time_to_first_insight']:.1f}s · complete after {results.get('execution_time', 0):.1f}s")
+        if 'map_reduce' in results:
+            chunking = results['map_reduce']
+            st.caption(
+                f"📚 Long document (~{chunking['estimated_tokens']:,} tokens) analysed in {chunking['chunks']} chunks · "
+                f"{chunking['calls']} calls, {chunking['cache_hits']} reused from the chunk cache"
+            )
+        if 'dag' in results:
+            dag = results['dag']
+            st.caption(f"🕸️ Agent graph in {len(dag['levels'])} levels · {dag['calls']} calls, "
+                       f"{dag['cache_hits']} nodes reused from the node cache")
+            with st.expander("⏳ Critical Path"):
+                st.text(format_critical_path(results))
 
         # Executive Summary
         if 'final_brief' in results:
@@ -276,15 +629,21 @@ if page == "📝 Analysis":
                             with col1:
                                 st.metric("Execution Time", f"{agent_result.get('execution_time', 0):.2f}s")
                             with col2:
-                                st.metric("Tokens Used", agent_result.get('tokens_used', 'N/A'))
+                                st.metric("Tokens Used", sum(total_tokens(call['tokens_used']) for call in billed_calls(agent_result)) if 'tokens_used' in agent_result else 'N/A')
                             with col3:
                                 st.metric("Model", agent_result.get('model', 'N/A'))
 
+                            if describe_attempts(agent_result):
+                                st.caption(f"🔁 {describe_attempts(agent_result)}")
+                            if describe_cascade(agent_result):
+                                st.caption(f"🪜 {describe_cascade(agent_result)}")
+
                             if 'raw_response' in output:
                                 st.markdown("**Raw Response:**")
                                 st.text(output['raw_response'])
                     else:
-                        st.error(f"Agent failed: {agent_result.get('error', 'Unknown error')}")
+                        attempts = describe_attempts(agent_result)
+                        st.error(f"Agent failed: {agent_result.get('error', 'Unknown error')}" + (f" ({attempts})" if attempts else ""))
 
 elif page == "🧪 A/B Testing":
     st.header("🧪 Prompt A/B Testing")
@@ -334,6 +693,15 @@ elif page == "🧪 A/B Testing":
             help="How many times to test each variant"
         )
 
+        adaptive = st.checkbox(
+            "Stop early when the winner is clear",
+            value=False,
+            help="Allocate iterations by Thompson sampling and stop once the leader is confidently best"
+        )
+
+        if adaptive:
+            confidence = st.slider("Confidence to stop", 0.80, 0.99, 0.95, 0.01)
+
         st.info(f"📊 Will test {len(PromptTester().variants[agent_name]['variants'])} variants")
 
         # Show variants
@@ -351,13 +719,17 @@ elif page == "🧪 A/B Testing":
     col1, col2, col3 = st.columns([2, 1, 1])
 
     with col1:
-        test_button = st.button("🧪 Run A/B Test", type="primary", use_container_width=True)
+        test_button = st.button(
+            "🧪 Run A/B Test", type="primary", use_container_width=True,
+            disabled=st.session_state.ab_run_id is not None
+        )
 
     with col2:
-        if st.session_state.test_results:
+        test_results = session_results().get('ab_test')
+        if test_results:
             st.download_button(
                 "📥 Download",
-                json.dumps(st.session_state.test_results, indent=2),
+                json.dumps(test_results, indent=2),
                 file_name=f"ab_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                 use_container_width=True
             )
@@ -368,41 +740,70 @@ elif page == "🧪 A/B Testing":
         elif not os.getenv('ANTHROPIC_API_KEY'):
             st.error("⚠️ ANTHROPIC_API_KEY not found in environment")
         else:
-            with st.spinner(f"🔄 Running A/B test ({iterations} iterations × {len(PromptTester().variants[agent_name]['variants'])} variants)..."):
-                try:
-                    # Initialize tester
+            ab_trace = start_trace('app.ab_test', agent=agent_name, iterations=iterations, adaptive=adaptive)
+            with within(ab_trace):
+                # Initialize tester
+                with span('prompt_tester.init'):
                     tester = PromptTester()
+                with span('workflow_engine.init'):
+                    config = WorkflowEngine().config
 
-                    # Prepare input
-                    input_data = {
-                        'document': document,
-                        'context': context if context else ""
-                    }
+                # Prepare input
+                input_data = {
+                    'document': document,
+                    'context': context if context else ""
+                }
 
-                    # Run test
-                    results = tester.run_ab_test(
+                # Run test (shared document prefix is read from the prompt cache); every call is
+                # checkpointed and the run continues in the background across reruns
+                if adaptive:
+                    runner = AdaptiveVariantRunner(tester, config=config, confidence=confidence)
+                else:
+                    runner = VariantRunner(tester, config=config)
+                with span('checkpoint.create'):
+                    run_id = runner.start(
                         agent_name=agent_name,
                         input_data=input_data,
                         iterations=iterations
                     )
-
-                    # Save results
-                    tester.save_test_results(results)
-
-                    st.session_state.test_results = results
-                    st.success("✅ A/B test complete!")
-
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
-                    st.exception(e)
+                launch_ab_run(runner, run_id, ab_trace)
+
+    # Running test
+    if st.session_state.ab_run_id is not None:
+        ab_run_status()
+
+    if st.session_state.ab_run_message:
+        level, message = st.session_state.ab_run_message
+        getattr(st, level)(message)
+        st.session_state.ab_run_message = None
+
+    # Interrupted or cancelled runs (not ones queued or running on the worker pool)
+    active_runs = {job.id for job in job_queue().jobs('ab_test') if not job.finished}
+    resumable = [run for run in CheckpointStore().resumable() if run['run_id'] not in active_runs]
+    if resumable and st.session_state.ab_run_id is None:
+        with st.expander(f"♻️ Resume an interrupted test ({len(resumable)})"):
+            runs = {run['run_id']: run for run in resumable}
+            run_id = st.selectbox(
+                "Run",
+                list(runs),
+                format_func=lambda r: f"{runs[r]['agent_name']} · {runs[r]['created_at'][:16]} · "
+                                      f"{runs[r]['completed_calls']}/{runs[r]['total_calls']} calls done ({runs[r]['status']})"
+            )
+            if st.button("▶️ Resume Test"):
+                ab_trace = start_trace('app.ab_test', run_id=run_id, resumed=True)
+                with within(ab_trace):
+                    runner = resume_runner(PromptTester(), run_id, config=WorkflowEngine().config)
+                launch_ab_run(runner, run_id, ab_trace)
+                st.rerun()
 
     # Display results
-    if st.session_state.test_results:
+    results = session_results().get('ab_test')
+    if (session_results().summary('ab_test') or {}).get('evicted'):
+        st.info("This A/B test was evicted from the session cache; open it from Results History.")
+    if results:
         st.markdown("---")
         st.header("📊 Test Results")
 
-        results = st.session_state.test_results
-
         # Winner announcement
         st.subheader("🏆 Winner")
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -414,75 +815,54 @@ elif page == "🧪 A/B Testing":
         with col2:
             st.metric("Composite Score", f"{results['winner']['composite_score']:.3f}")
 
+        if 'cache_report' in results:
+            cache = results['cache_report']
+            with col3:
+                st.metric("Cost Saved (cache)", f"${cache['cost_saved']:.4f}")
+
+            with st.expander("💾 Prompt Cache Savings"):
+                cache_col1, cache_col2, cache_col3, cache_col4 = st.columns(4)
+                with cache_col1:
+                    st.metric("Cache Hits", f"{cache['cache_hits']}/{cache['calls']}")
+                with cache_col2:
+                    st.metric("Cached Prompt Share", f"{cache['cached_prompt_share']:.0%}")
+                with cache_col3:
+                    st.metric("Cost", f"${cache['cost']:.4f}", delta=f"-${cache['cost_saved']:.4f}", delta_color="inverse")
+                with cache_col4:
+                    st.metric("Latency Saved", f"{cache['latency_saved']:.1f}s")
+                st.caption(
+                    f"Cache writes: {cache['tokens']['cache_creation_input_tokens']} tokens · "
+                    f"cache reads: {cache['tokens']['cache_read_input_tokens']} tokens"
+                )
+
+        if 'adaptive' in results:
+            adaptive_report = results['adaptive']
+            st.caption(
+                f"⏱️ Adaptive testing: {adaptive_report['calls_made']}/{adaptive_report['calls_budget']} calls "
+                f"({adaptive_report['calls_saved']} saved) · winner best with probability "
+                f"{adaptive_report['probability_best'][adaptive_report['leader']]:.0%}"
+            )
+
         st.markdown("---")
 
         # Comparative metrics
         st.subheader("📈 Comparative Performance")
 
-        # Create comparison dataframe
-        comparison_data = []
-        for variant_id, variant_data in results['results'].items():
-            metrics = variant_data['metrics']
-            comparison_data.append({
-                'Variant': variant_data['config']['name'],
-                'Consistency': metrics.get('consistency', 0),
-                'Specificity': metrics.get('specificity_score', 0),
-                'Actionability': metrics.get('actionability_score', 0),
-                'Technical Density': metrics.get('technical_density', 0),
-                'Execution Time': metrics.get('avg_execution_time', 0)
-            })
+        # Built once per result; reruns reuse the cached figures
+        result_id = f"{session_results().session_id}/{session_results().summary('ab_test')['stored_at']}"
+        figures = ab_figures(result_id, results)
 
         # Radar chart for top metrics
-        fig = go.Figure()
-
-        for data in comparison_data:
-            fig.add_trace(go.Scatterpolar(
-                r=[
-                    data['Consistency'],
-                    data['Specificity'],
-                    data['Actionability'],
-                    data['Technical Density'],
-                    1.0 - min(data['Execution Time'] / 10.0, 1.0)  # Normalize execution time
-                ],
-                theta=['Consistency', 'Specificity', 'Actionability', 'Technical Density', 'Speed'],
-                fill='toself',
-                name=data['Variant']
-            ))
-
-        fig.update_layout(
-            polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
-            showlegend=True,
-            title="Performance Comparison (All Metrics)"
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(figures['radar'], use_container_width=True)
 
         # Bar chart comparison
         st.subheader("📊 Metric Rankings")
 
-        metric_tabs = st.tabs(["Consistency", "Specificity", "Actionability", "Technical Density"])
+        metric_tabs = st.tabs(list(METRIC_TABS))
 
-        metric_names = ['consistency', 'specificity_score', 'actionability_score', 'technical_density']
-
-        for tab, metric_name in zip(metric_tabs, metric_names):
+        for tab, metric_name in zip(metric_tabs, METRIC_TABS.values()):
             with tab:
-                metric_data = []
-                for variant_id, variant_data in results['results'].items():
-                    metric_data.append({
-                        'Variant': variant_data['config']['name'],
-                        'Score': variant_data['metrics'].get(metric_name, 0)
-                    })
-
-                fig = px.bar(
-                    metric_data,
-                    x='Variant',
-                    y='Score',
-                    title=f"{metric_name.replace('_', ' ').title()} Comparison",
-                    color='Score',
-                    color_continuous_scale='Blues'
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(figures['metrics'][metric_name], use_container_width=True)
 
         # Detailed results
         st.markdown("---")
@@ -520,30 +900,48 @@ elif page == "📊 Results History":
     # Type selector
     result_type = st.radio("Result Type:", ["Analyses", "A/B Tests"], horizontal=True)
 
-    if result_type == "Analyses":
-        # List analysis files
-        analysis_files = sorted(glob.glob('outputs/analysis_*.json'), reverse=True)
+    index = results_index()
+    kind = ANALYSIS if result_type == "Analyses" else AB_TEST
+    total = index.count(kind)
+    page_size = 50
+
+    col1, col2 = st.columns([3, 1])
+    with col2:
+        if st.button("🔄 Rescan outputs", help="Index result files saved outside this app"):
+            added = index.sync()
+            st.toast(f"Indexed {added} new results")
+            total = index.count(kind)
 
-        if not analysis_files:
+    page_count = max(1, (total + page_size - 1) // page_size)
+    with col1:
+        page_number = st.number_input(
+            f"Page (of {page_count})", min_value=1, max_value=page_count, value=1
+        ) if page_count > 1 else 1
+
+    rows = index.page(kind, page_number - 1, page_size)
+    labels = {row['path']: row for row in rows}
+
+    if result_type == "Analyses":
+        if not total:
             st.info("📭 No analyses found. Run an analysis first!")
         else:
-            st.markdown(f"**Found {len(analysis_files)} analyses**")
+            st.markdown(f"**Found {total} analyses**")
 
-            # File selector
+            # File selector (labels come from the index, no file access)
             selected_file = st.selectbox(
                 "Select Analysis",
-                analysis_files,
-                format_func=lambda x: datetime.fromtimestamp(os.path.getmtime(x)).strftime('%Y-%m-%d %H:%M:%S')
+                list(labels),
+                format_func=lambda x: datetime.fromtimestamp(labels[x]['created_at']).strftime('%Y-%m-%d %H:%M:%S')
             )
 
             if selected_file:
-                with open(selected_file, 'r') as f:
-                    result = json.load(f)
+                entry = labels[selected_file]
+                result = load_result(selected_file, result_version(selected_file, entry))
 
                 # Display metadata
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Date", datetime.fromtimestamp(os.path.getmtime(selected_file)).strftime('%Y-%m-%d'))
+                    st.metric("Date", datetime.fromtimestamp(entry['created_at']).strftime('%Y-%m-%d'))
                 with col2:
                     st.metric("Agents", len(result.get('phase1_results', {})))
                 with col3:
@@ -552,38 +950,41 @@ elif page == "📊 Results History":
                 st.markdown("---")
 
                 # Display brief if available
-                brief_file = selected_file.replace('.json', '_brief.txt')
-                if os.path.exists(brief_file):
-                    with open(brief_file, 'r') as f:
-                        st.text_area("Executive Summary", f.read(), height=400)
+                brief = load_result_text(entry)
+                if brief is not None:
+                    st.text_area("Executive Summary", brief, height=400)
 
-                # Download button
-                with open(selected_file, 'r') as f:
+                # Download / delete buttons
+                col1, col2 = st.columns(2)
+
+                with col1:
                     st.download_button(
                         "📥 Download Full Results",
-                        f.read(),
+                        json.dumps(result, indent=2),
                         file_name=os.path.basename(selected_file)
                     )
 
-    else:  # A/B Tests
-        # List test files
-        test_files = sorted(glob.glob('outputs/tests/ab_test_*.json'), reverse=True)
+                with col2:
+                    if st.button("🗑️ Delete Analysis", key=f"delete_{selected_file}"):
+                        index.remove(selected_file)
+                        st.rerun()
 
-        if not test_files:
+    else:  # A/B Tests
+        if not total:
             st.info("📭 No A/B tests found. Run a test first!")
         else:
-            st.markdown(f"**Found {len(test_files)} tests**")
+            st.markdown(f"**Found {total} tests**")
 
-            # File selector
+            # File selector (labels come from the index, no file access)
             selected_file = st.selectbox(
                 "Select Test",
-                test_files,
-                format_func=lambda x: f"{os.path.basename(x).split('_')[2]} - {datetime.fromtimestamp(os.path.getmtime(x)).strftime('%Y-%m-%d %H:%M')}"
+                list(labels),
+                format_func=lambda x: f"{labels[x]['agent_name']} - {datetime.fromtimestamp(labels[x]['created_at']).strftime('%Y-%m-%d %H:%M')}"
             )
 
             if selected_file:
-                with open(selected_file, 'r') as f:
-                    result = json.load(f)
+                entry = labels[selected_file]
+                result = load_result(selected_file, result_version(selected_file, entry))
 
                 # Display winner
                 st.subheader("🏆 Winner")
@@ -596,43 +997,81 @@ elif page == "📊 Results History":
 
                 st.markdown("---")
 
-                # Quick comparison chart
-                variant_scores = []
-                for variant_id, score in result['winner']['all_scores'].items():
-                    variant_name = result['results'][variant_id]['config']['name']
-                    variant_scores.append({'Variant': variant_name, 'Score': score})
-
-                fig = px.bar(
-                    variant_scores,
-                    x='Variant',
-                    y='Score',
-                    title="Composite Scores",
-                    color='Score',
-                    color_continuous_scale='Viridis'
-                )
-
-                st.plotly_chart(fig, use_container_width=True)
+                # Quick comparison chart (cached per saved result)
+                st.plotly_chart(history_figure(selected_file, result_version(selected_file, entry)), use_container_width=True)
 
-                # Download buttons
-                col1, col2 = st.columns(2)
+                # Download / delete buttons
+                col1, col2, col3 = st.columns(3)
 
                 with col1:
-                    with open(selected_file, 'r') as f:
+                    st.download_button(
+                        "📥 Download JSON",
+                        json.dumps(result, indent=2),
+                        file_name=os.path.basename(selected_file)
+                    )
+
+                with col2:
+                    report = load_result_text(entry)
+                    if report is not None:
                         st.download_button(
-                            "📥 Download JSON",
-                            f.read(),
-                            file_name=os.path.basename(selected_file)
+                            "📥 Download Report",
+                            report,
+                            file_name=os.path.basename(selected_file).replace('.json', '_report.txt')
                         )
 
-                with col2:
-                    report_file = selected_file.replace('.json', '_report.txt')
-                    if os.path.exists(report_file):
-                        with open(report_file, 'r') as f:
-                            st.download_button(
-                                "📥 Download Report",
-                                f.read(),
-                                file_name=os.path.basename(report_file)
-                            )
+                with col3:
+                    if st.button("🗑️ Delete Test", key=f"delete_{selected_file}"):
+                        index.remove(selected_file)
+                        st.rerun()
+
+elif page == "📈 Analytics":
+    st.header("📈 Analytics")
+    st.markdown("Which variants win across every saved A/B test.")
+
+    history = test_history()
+    with st.spinner("Loading new test results..."):
+        history.refresh()
+
+    if not history.test_count:
+        st.info("📭 No A/B tests found. Run a test first!")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            agent = st.selectbox("Agent", ["All agents"] + history.agents())
+        with col2:
+            days = st.selectbox("Period", [None, 7, 30, 90], format_func=lambda d: "All time" if d is None else f"Last {d} days")
+
+        agent = None if agent == "All agents" else agent
+        # Aggregated in pandas and cached until the history changes; the browser gets summaries, not every test
+        view = analytics_view(history.version, agent, days, history)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Tests", view['tests'])
+        with col2:
+            st.metric("Variants", view['variants'])
+        with col3:
+            st.metric("Calls", view['calls'])
+
+        st.markdown("---")
+
+        # Win rates
+        st.subheader("🏆 Win Rates")
+        st.plotly_chart(view['win_rates'], use_container_width=True)
+        st.dataframe(view['rates'], use_container_width=True, hide_index=True)
+
+        # Score distributions
+        st.subheader("📊 Composite Score Distribution")
+        st.plotly_chart(view['score_boxes'], use_container_width=True)
+        st.dataframe(view['score_distribution'], use_container_width=True, hide_index=True)
+
+        # Score over time
+        st.subheader("📉 Composite Score Over Time")
+        st.plotly_chart(view['score_trend'], use_container_width=True)
+
+        # Latency
+        st.subheader("⏱️ Latency Percentiles (per call)")
+        st.dataframe(view['latency'], use_container_width=True, hide_index=True)
 
 elif page == "⚙️ Configuration":
     st.header("⚙️ Configuration")
@@ -0,0 +1,724 @@
+"""
+Benchmark the orchestration layer against the local mock model server.
+
+Starts an in-process MockModelServer, points the Anthropic client at it and
+measures throughput of the streaming workflow or the A/B variant runner. The
+targets use the self-contained config and prompt variants below, so neither
+WorkflowEngine nor PromptTester (config/) is needed, nor an API key or network access.
+
+    python benchmark.py --target workflow --runs 20 --concurrency 4
+    python benchmark.py --target tester --iterations 3 --latency-mean 0.2
+    python benchmark.py --target workflow --mode replay --cassette cassettes/shiseido.json
+    python benchmark.py --target ab-cache --iterations 3 --cache-min-tokens 0
+    python benchmark.py --target resilience --runs 20 --error-rate 0.2 --slow-rate 0.05
+    python benchmark.py --target queue --runs 40 --workers 4 --concurrency 2 --kill-one
+    python benchmark.py --target cascade --runs 20 --concurrency 4 --weak-draft-rate 0.3
+    python benchmark.py --target pipeline --runs 20 --latency-stddev 0.5 --cache-min-tokens 0
+"""
+
+import argparse
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from orchestrator.mock_server import MockModelServer
+
+
+SAMPLE_INPUT = {
+    'document': """
+    Shiseido Future Solution LX - Premium Anti-Aging Serum
+
+    "Unlock Timeless Beauty with 20 Years of Research"
+
+    Our revolutionary serum combines exclusive RetinSphere Technology
+    with Japanese botanical extracts to deliver visible results in just
+    30 days. Dermatologist-tested and clinically proven.
+
+    96% of women experienced smoother, more radiant skin.
+
+    Limited Edition Launch - Available exclusively at select retailers.
+
+    $450 / 50ml
+    """,
+    'context': """
+    Target Audience: Affluent women aged 45-60
+    Product Category: Premium anti-aging skincare
+    Price Point: $450
+    """
+}
+
+
+# Self-contained workflow config for every workflow target (no WorkflowEngine needed)
+RESILIENCE_CONFIG = {
+    'agents': {
+        name: {
+            'system_prompt': f"You are the {name.replace('_', ' ')} of a marketing analysis team. "
+                             "Answer under short labelled headings such as 'KEY STRENGTH:'.",
+            'parameters': {'max_tokens': 400}
+        }
+        for name in ('strategic_analyst', 'audience_evaluator', 'competitive_intel')
+    },
+    'synthesis': {
+        'system_prompt': "Combine the analyses into an executive brief with EXECUTIVE SUMMARY:, "
+                         "KEY FINDINGS: and RECOMMENDATIONS: sections.",
+        'parameters': {'max_tokens': 600}
+    }
+}
+
+# Self-contained prompt variants for --target tester / ab-cache (no PromptTester needed)
+BENCHMARK_VARIANTS = {
+    agent_name: {'variants': {
+        'concise': {
+            'name': 'Concise',
+            'hypothesis': 'Short answers are more actionable',
+            'expected_performance': 'Higher actionability',
+            'temperature': 0.2,
+            'system_prompt': f"You are a {agent_name.replace('_', ' ')}. Give three short labelled findings."
+        },
+        'detailed': {
+            'name': 'Detailed',
+            'hypothesis': 'Longer answers are more specific',
+            'expected_performance': 'Higher specificity',
+            'temperature': 0.5,
+            'system_prompt': f"You are a {agent_name.replace('_', ' ')}. Give a detailed analysis with "
+                             "labelled sections and specific numbers."
+        }
+    }}
+    for agent_name in RESILIENCE_CONFIG['agents']
+}
+
+
+class BenchmarkTester:
+    """Stands in for PromptTester: the variant runners only read .variants"""
+    variants = BENCHMARK_VARIANTS
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict:
+    """Mean and tail percentiles (seconds) for a list of latencies"""
+    return {
+        'count': len(latencies),
+        'mean': sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies) if latencies else 0.0
+    }
+
+
+def point_client_at(server: MockModelServer):
+    """Route every Anthropic client created from now on to the mock server"""
+    os.environ['ANTHROPIC_BASE_URL'] = server.base_url
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'mock-key')
+
+
+def run_workflow_once(input_data: Dict) -> Dict:
+    from orchestrator.streaming import StreamingWorkflow
+
+    return StreamingWorkflow(RESILIENCE_CONFIG).execute(input_data)
+
+
+def run_tester_once(input_data: Dict, agent_name: str, iterations: int, runs_dir: str) -> Dict:
+    from orchestrator.checkpoints import CheckpointStore
+    from orchestrator.variant_runner import VariantRunner
+
+    runner = VariantRunner(BenchmarkTester(), config=RESILIENCE_CONFIG, checkpoints=CheckpointStore(runs_dir))
+    return runner.run_ab_test(agent_name=agent_name, input_data=input_data, iterations=iterations)
+
+
+def run_cache_comparison(args, input_data: Dict) -> Dict:
+    """
+    Run the same A/B test with and without the cached document prefix on
+    fresh mock servers and check the cache accounting is consistent.
+    """
+    from orchestrator.checkpoints import CheckpointStore
+    from orchestrator.pricing import token_breakdown
+    from orchestrator.variant_runner import VariantRunner
+
+    runs = {}
+    for cache_prefix in (False, True):
+        server = MockModelServer(
+            latency=args.latency,
+            latency_mean=args.latency_mean,
+            latency_stddev=args.latency_stddev,
+            output_tokens=args.output_tokens,
+            cache_min_tokens=args.cache_min_tokens,
+            seed=args.seed
+        )
+        with server:
+            point_client_at(server)
+            runner = VariantRunner(BenchmarkTester(), config=RESILIENCE_CONFIG, cache_prefix=cache_prefix,
+                                   max_workers=args.concurrency, checkpoints=CheckpointStore(tempfile.mkdtemp()))
+            start = time.time()
+            results = runner.run_ab_test(agent_name=args.agent, input_data=input_data, iterations=args.iterations)
+            runs['cached' if cache_prefix else 'uncached'] = {
+                'wall_time': time.time() - start,
+                'cache_report': results['cache_report'],
+                'server': server.snapshot_stats()
+            }
+
+    def prompt_tokens(report):
+        tokens = token_breakdown(report['tokens'])
+        return tokens['input_tokens'] + tokens['cache_creation_input_tokens'] + tokens['cache_read_input_tokens']
+
+    cached, uncached = runs['cached']['cache_report'], runs['uncached']['cache_report']
+    runs['checks'] = {
+        'uncached_run_has_no_cache_traffic': (
+            uncached['tokens']['cache_creation_input_tokens'] == 0 and uncached['tokens']['cache_read_input_tokens'] == 0
+        ),
+        'cached_run_reads_cache': cached['cache_hits'] > 0,
+        'prompt_tokens_match': prompt_tokens(cached) == prompt_tokens(uncached)
+    }
+    return runs
+
+
+def run_resilience_comparison(args, input_data: Dict) -> Dict:
+    """
+    Run the streaming workflow against a fault-injecting mock server with the
+    plain AgentClient and with ResilientAgentClient (retries, hedging, circuit
+    breaker), on identically seeded servers.
+    """
+    from orchestrator.agent_client import AgentClient
+    from orchestrator.resilience import ResilientAgentClient
+    from orchestrator.streaming import StreamingWorkflow
+
+    runs = {}
+    for label in ('baseline', 'resilient'):
+        server = MockModelServer(
+            latency=args.latency,
+            latency_mean=args.latency_mean,
+            latency_stddev=args.latency_stddev,
+            output_tokens=args.output_tokens,
+            error_rate=args.error_rate,
+            slow_rate=args.slow_rate,
+            slow_factor=args.slow_factor,
+            stream_chunk_delay=0.002,
+            seed=args.seed
+        )
+        with server:
+            point_client_at(server)
+            if label == 'baseline':
+                client = AgentClient()
+            else:
+                client = ResilientAgentClient(hedge=True, backoff_initial=0.1, hedge_min_samples=5)
+            workflow = StreamingWorkflow(RESILIENCE_CONFIG, client=client)
+
+            def timed(_):
+                start = time.time()
+                result = workflow.execute(input_data)
+                agent_failures = sum(1 for r in result['phase1_results'].values() if not r['success'])
+                return time.time() - start, result['success'], agent_failures
+
+            wall_start = time.time()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                outcomes = list(pool.map(timed, range(args.runs)))
+
+            runs[label] = {
+                'wall_time': time.time() - wall_start,
+                'failures': sum(1 for _, success, _ in outcomes if not success),
+                'agent_failures': sum(failed for _, _, failed in outcomes),
+                'latency': summarize_latencies([elapsed for elapsed, _, _ in outcomes]),
+                'server': server.snapshot_stats(),
+                'resilience': client.report() if label == 'resilient' else None
+            }
+
+    return runs
+
+
+def run_cascade_comparison(args, input_data: Dict) -> Dict:
+    """
+    Run the streaming workflow over args.runs documents with every agent on its
+    configured model and with the draft-then-escalate cascade, on identically
+    seeded servers, and compare latency, large-model tokens and cost per agent.
+    """
+    from orchestrator.cascade import CascadeAgentClient, CascadePolicy, cascade_savings
+    from orchestrator.map_reduce import ChunkCache
+    from orchestrator.pricing import cache_report
+    from orchestrator.resilience import ResilientAgentClient
+    from orchestrator.streaming import StreamingWorkflow
+
+    documents = [dict(input_data, document=f"{input_data['document']}\n(Variant {i + 1})") for i in range(args.runs)]
+    runs = {}
+    for label in ('baseline', 'cascade'):
+        server = MockModelServer(
+            latency=args.latency,
+            latency_mean=args.latency_mean,
+            latency_stddev=args.latency_stddev,
+            output_tokens=args.output_tokens,
+            error_rate=args.error_rate,
+            weak_draft_rate=args.weak_draft_rate,
+            stream_chunk_delay=0.002,
+            seed=args.seed
+        )
+        with server:
+            point_client_at(server)
+            client = ResilientAgentClient(backoff_initial=0.1)
+            if label == 'cascade':
+                client = CascadeAgentClient(RESILIENCE_CONFIG, client=client,
+                                            default_policy=CascadePolicy(min_score=args.min_score))
+            workflow = StreamingWorkflow(RESILIENCE_CONFIG, client=client)
+
+            wall_start = time.time()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                results = list(pool.map(workflow.execute, documents))
+            runs[label] = {
+                'wall_time': time.time() - wall_start,
+                'results': results,
+                'latency': summarize_latencies([r['execution_time'] for r in results]),
+                'server': server.snapshot_stats()
+            }
+
+    agents = {
+        agent_name: cascade_savings(
+            [r['phase1_results'][agent_name] for r in runs['cascade']['results']],
+            [r['phase1_results'][agent_name] for r in runs['baseline']['results']]
+        )
+        for agent_name in RESILIENCE_CONFIG['agents']
+    }
+
+    # Escalated results served again from the map-reduce / DAG node cache must cost nothing
+    escalated = [call for r in runs['cascade']['results'] for call in r['phase1_results'].values()
+                 if call.get('cascade', {}).get('escalated')]
+    cache = ChunkCache(tempfile.mkdtemp())
+    for i, call in enumerate(escalated):
+        cache.put({'call': i}, call)
+    hits = [cache.get({'call': i}) for i in range(len(escalated))]
+    checks = {
+        'escalated_calls_bill_their_draft': bool(escalated) and cache_report(escalated)['cost'] > sum(
+            cache_report([dict(call, cascade=None)])['cost'] for call in escalated),
+        'cached_escalated_hits_cost_nothing': cache_report(hits)['cost'] == 0.0
+    }
+
+    for run in runs.values():
+        del run['results']
+    return {'runs': runs, 'agents': agents, 'checks': checks}
+
+
+def run_pipeline_comparison(args, input_data: Dict) -> Dict:
+    """
+    Run the streaming workflow over args.runs documents with the synthesis
+    started after the last agent and with it pipelined (prompt cached as
+    agents finish), on identically seeded servers, and compare the time to
+    the first brief token, the synthesis time and the end-to-end latency.
+    """
+    from orchestrator.pricing import cache_report, total_tokens
+    from orchestrator.resilience import ResilientAgentClient
+    from orchestrator.streaming import BRIEF_STREAM, StreamingWorkflow
+
+    documents = [dict(input_data, document=f"{input_data['document']}\n(Variant {i + 1})") for i in range(args.runs)]
+
+    def timed_run(workflow: StreamingWorkflow, document: Dict) -> Dict:
+        start = time.time()
+        first_brief = last_agent = None
+        for event in workflow.run(document):
+            if event['type'] == 'complete':
+                result = event['result']
+            elif event['agent'] == BRIEF_STREAM:
+                if first_brief is None:
+                    first_brief = time.time() - start
+            elif event['type'] == 'done':
+                last_agent = time.time() - start
+        synthesis = result.get('synthesis', {})
+        warm = result.get('synthesis_pipeline', {}).get('warm_results', [])
+        return {
+            'latency': result['execution_time'],
+            'first_brief_token': first_brief or 0.0,
+            'after_last_agent': (first_brief or 0.0) - (last_agent or 0.0),
+            'synthesis_cache_read': (synthesis.get('tokens_used') or {}).get('cache_read_input_tokens', 0),
+            'synthesis_input': total_tokens(synthesis.get('tokens_used')),
+            'warm_calls': result.get('synthesis_pipeline', {}).get('warm_calls', 0),
+            'cost': cache_report(list(result['phase1_results'].values()) + [synthesis] + warm)['cost']
+        }
+
+    runs = {}
+    for label in ('baseline', 'pipelined'):
+        server = MockModelServer(
+            latency=args.latency,
+            latency_mean=args.latency_mean,
+            latency_stddev=args.latency_stddev,
+            output_tokens=args.output_tokens,
+            error_rate=args.error_rate,
+            cache_min_tokens=args.cache_min_tokens,
+            stream_chunk_delay=0.002,
+            seed=args.seed
+        )
+        with server:
+            point_client_at(server)
+            workflow = StreamingWorkflow(RESILIENCE_CONFIG, client=ResilientAgentClient(backoff_initial=0.1),
+                                         pipeline_synthesis=label == 'pipelined')
+
+            wall_start = time.time()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                timings = list(pool.map(lambda document: timed_run(workflow, document), documents))
+            runs[label] = {
+                'wall_time': time.time() - wall_start,
+                'latency': summarize_latencies([t['latency'] for t in timings]),
+                'first_brief_token': summarize_latencies([t['first_brief_token'] for t in timings]),
+                'after_last_agent': summarize_latencies([t['after_last_agent'] for t in timings]),
+                'synthesis_cache_read': sum(t['synthesis_cache_read'] for t in timings),
+                'synthesis_input': sum(t['synthesis_input'] for t in timings),
+                'warm_calls': sum(t['warm_calls'] for t in timings),
+                'cost': sum(t['cost'] for t in timings),
+                'server': server.snapshot_stats()
+            }
+    return {'runs': runs}
+
+
+def run_queue_benchmark(args, input_data: Dict) -> Dict:
+    """
+    Enqueue args.runs analysis jobs on a fresh work queue and drain it with
+    args.workers local worker processes (worker.py) against the mock server.
+    With --kill-one the first worker is killed mid-run, and its leased jobs
+    must be picked up by the others once their visibility timeout lapses.
+    """
+    from orchestrator.work_queue import DONE, LEASED, WorkQueue
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='queue_bench_'), 'work_queue.db')
+    queue = WorkQueue(db_path, visibility_timeout=args.visibility_timeout)
+    queue.enqueue_many('analysis', [dict(input_data, save=False)] * args.runs)
+
+    server = MockModelServer(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        requests_per_minute=args.rpm,
+        seed=args.seed
+    )
+    worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+
+    with server:
+        point_client_at(server)
+        command = [sys.executable, worker_script, '--db', db_path,
+                   '--visibility-timeout', str(args.visibility_timeout),
+                   'run', '--concurrency', str(args.concurrency), '--poll', '0.1', '--exit-when-empty']
+
+        wall_start = time.time()
+        workers = [subprocess.Popen(command, stdout=subprocess.DEVNULL) for _ in range(args.workers)]
+        killed = None
+        if args.kill_one and len(workers) > 1:
+            # Kill the first worker as soon as it holds a lease
+            owner = f":{workers[0].pid}:"
+            while workers[0].poll() is None and not any(owner in (job['lease_owner'] or '')
+                                                        for job in queue.jobs(LEASED)):
+                time.sleep(0.05)
+            workers[0].send_signal(signal.SIGKILL)
+            killed = workers[0].pid
+        for worker in workers:
+            worker.wait()
+        wall_time = time.time() - wall_start
+
+        server_stats = server.snapshot_stats()
+
+    done = queue.jobs(DONE, limit=args.runs)
+    per_worker = {}
+    for job in done:
+        process = job['lease_owner'].rsplit(':', 1)[0]
+        per_worker[process] = per_worker.get(process, 0) + 1
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'target': args.target,
+        'runs': args.runs,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'killed_worker': killed,
+        'wall_time': wall_time,
+        'throughput_per_sec': len(done) / wall_time if wall_time else 0.0,
+        'queue': queue.stats(),
+        'retried': sum(1 for job in done if job['attempts'] > 1),
+        'per_worker': per_worker,
+        'latency': summarize_latencies([job['updated_at'] - job['created_at'] for job in done]),
+        'model_calls': server_stats
+    }
+
+
+def run_benchmark(args) -> Dict:
+    input_data = SAMPLE_INPUT
+    if args.document:
+        with open(args.document, 'r') as f:
+            input_data = {'document': f.read(), 'context': ''}
+
+    if args.target == 'ab-cache':
+        return {'timestamp': datetime.now().isoformat(), 'target': args.target,
+                'comparison': run_cache_comparison(args, input_data)}
+
+    if args.target == 'resilience':
+        return {'timestamp': datetime.now().isoformat(), 'target': args.target, 'runs': args.runs,
+                'comparison': run_resilience_comparison(args, input_data)}
+
+    if args.target == 'queue':
+        return run_queue_benchmark(args, input_data)
+
+    if args.target == 'cascade':
+        return {'timestamp': datetime.now().isoformat(), 'target': args.target, 'runs': args.runs,
+                'comparison': run_cascade_comparison(args, input_data)}
+
+    if args.target == 'pipeline':
+        return {'timestamp': datetime.now().isoformat(), 'target': args.target, 'runs': args.runs,
+                'comparison': run_pipeline_comparison(args, input_data)}
+
+    if args.target == 'workflow':
+        task = lambda: run_workflow_once(input_data)
+    else:
+        # Benchmark runs are checkpointed like any A/B run, but not next to the real ones
+        runs_dir = tempfile.mkdtemp(prefix='benchmark_runs_')
+        task = lambda: run_tester_once(input_data, args.agent, args.iterations, runs_dir)
+
+    latencies = []
+    errors = []
+
+    def timed():
+        start = time.time()
+        try:
+            result = task()
+            error = None if result.get('success', True) else result.get('error', 'Unknown error')
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        return time.time() - start, error
+
+    server = MockModelServer(
+        mode=args.mode,
+        cassette=args.cassette,
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        requests_per_minute=args.rpm,
+        seed=args.seed
+    )
+
+    with server:
+        point_client_at(server)
+
+        wall_start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for elapsed, error in pool.map(lambda _: timed(), range(args.runs)):
+                latencies.append(elapsed)
+                if error:
+                    errors.append(error)
+        wall_time = time.time() - wall_start
+
+        server_stats = server.snapshot_stats()
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'target': args.target,
+        'runs': args.runs,
+        'concurrency': args.concurrency,
+        'server': {
+            'mode': args.mode,
+            'latency': args.latency,
+            'latency_mean': args.latency_mean,
+            'latency_stddev': args.latency_stddev,
+            'error_rate': args.error_rate,
+            'rpm': args.rpm,
+            'seed': args.seed
+        },
+        'wall_time': wall_time,
+        'throughput_per_sec': args.runs / wall_time if wall_time else 0.0,
+        'failures': len(errors),
+        'sample_errors': sorted(set(errors))[:5],
+        'latency': summarize_latencies(latencies),
+        'model_calls': server_stats
+    }
+
+
+def print_cache_comparison(report: Dict):
+    comparison = report['comparison']
+
+    print(f"\n{'='*70}")
+    print("BENCHMARK: prompt cache on vs off")
+    print(f"{'='*70}\n")
+    for label in ('uncached', 'cached'):
+        run = comparison[label]
+        cache = run['cache_report']
+        print(f"{label.title():10s} wall {run['wall_time']:.2f}s  cost ${cache['cost']:.4f}  "
+              f"cache hits {cache['cache_hits']}/{cache['calls']}")
+    print()
+    for check, passed in comparison['checks'].items():
+        print(f"  {'✓' if passed else '✗'} {check.replace('_', ' ')}")
+    print()
+
+
+def print_resilience_comparison(report: Dict):
+    comparison = report['comparison']
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARK: resilience layer off vs on ({report['runs']} workflow runs)")
+    print(f"{'='*70}\n")
+    for label in ('baseline', 'resilient'):
+        run = comparison[label]
+        latency = run['latency']
+        print(f"{label.title():10s} failed runs {run['failures']}  failed agents {run['agent_failures']}  "
+              f"p50/p95/max {latency['p50']:.2f}s / {latency['p95']:.2f}s / {latency['max']:.2f}s  "
+              f"({run['server']['requests']} requests, {run['server']['errors']} injected errors, "
+              f"{run['server']['slow']} stragglers)")
+
+    print("\nPer agent (resilient):")
+    for agent_name, counts in comparison['resilient']['resilience']['agents'].items():
+        print(f"  {agent_name:20s} " + '  '.join(f"{key} {value}" for key, value in counts.items()))
+    print()
+
+
+def print_cascade_comparison(report: Dict):
+    comparison = report['comparison']
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARK: model cascade off vs on ({report['runs']} documents)")
+    print(f"{'='*70}\n")
+    for label in ('baseline', 'cascade'):
+        run = comparison['runs'][label]
+        latency = run['latency']
+        print(f"{label.title():10s} workflow p50/p95 {latency['p50']:.2f}s / {latency['p95']:.2f}s  "
+              f"wall {run['wall_time']:.1f}s  ({run['server']['requests']} requests, "
+              f"{run['server']['weak']} weak drafts)")
+
+    print(f"\n{'Agent':20s} {'Escalated':>9s} {'Latency':>17s} {'Large-model tokens':>22s} {'Cost':>21s}")
+    for agent_name, agent in comparison['agents'].items():
+        print(f"{agent_name:20s} {agent['escalation_rate']:>9.0%} "
+              f"{agent['baseline_latency']:>7.2f}s -> {agent['latency']:.2f}s "
+              f"{agent['baseline_tokens']:>10,} -> {agent['large_model_tokens']:<9,} "
+              f"${agent['baseline_cost']:.4f} -> ${agent['cost']:.4f}")
+    print()
+    for check, passed in comparison['checks'].items():
+        print(f"  {'✓' if passed else '✗'} {check.replace('_', ' ')}")
+    print()
+
+
+def print_pipeline_comparison(report: Dict):
+    comparison = report['comparison']
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARK: synthesis after phase 1 vs pipelined ({report['runs']} documents)")
+    print(f"{'='*70}\n")
+    print(f"{'':10s} {'First brief token':>19s} {'After last agent':>18s} {'Workflow':>17s} "
+          f"{'Cached synthesis input':>24s} {'Cost':>9s}")
+    for label in ('baseline', 'pipelined'):
+        run = comparison['runs'][label]
+        cached = run['synthesis_cache_read'] / run['synthesis_input'] if run['synthesis_input'] else 0.0
+        print(f"{label.title():10s} {run['first_brief_token']['p50']:>8.2f}s / {run['first_brief_token']['p95']:.2f}s "
+              f"{run['after_last_agent']['p50']:>8.2f}s / {run['after_last_agent']['p95']:.2f}s "
+              f"{run['latency']['p50']:>7.2f}s / {run['latency']['p95']:.2f}s "
+              f"{cached:>23.0%} {run['cost']:>9.4f}")
+    print(f"\n(p50 / p95, cost in USD including cache-warming calls; pipelined made {comparison['runs']['pipelined']['warm_calls']} cache-warming calls)\n")
+
+
+def print_queue_report(report: Dict):
+    queue = report['queue']
+    latency = report['latency']
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARK: work queue ({report['runs']} analysis jobs, {report['workers']} worker processes "
+          f"x {report['concurrency']} threads)")
+    print(f"{'='*70}\n")
+    print(f"Wall time:        {report['wall_time']:.2f}s")
+    print(f"Throughput:       {report['throughput_per_sec']:.2f} jobs/s")
+    print(f"Jobs:             {queue['done']} done, {queue['dead']} dead, {queue['queued'] + queue['leased']} unfinished, "
+          f"{report['retried']} needed a retry")
+    if report['killed_worker']:
+        print(f"Killed worker:    pid {report['killed_worker']} (its leases expired and were taken over)")
+    print(f"Enqueue -> done:  p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  max {latency['max']:.2f}s")
+    print("Jobs per worker:  " + '  '.join(f"{name} {count}" for name, count in sorted(report['per_worker'].items())))
+    print(f"Model calls:      {report['model_calls']['requests']} ({report['model_calls']['errors']} errors)")
+    print()
+
+
+def print_report(report: Dict):
+    if report['target'] == 'queue':
+        print_queue_report(report)
+        return
+    if report['target'] == 'cascade':
+        print_cascade_comparison(report)
+        return
+    if report['target'] == 'pipeline':
+        print_pipeline_comparison(report)
+        return
+    if report['target'] == 'ab-cache':
+        print_cache_comparison(report)
+        return
+    if report['target'] == 'resilience':
+        print_resilience_comparison(report)
+        return
+
+    latency = report['latency']
+    calls = report['model_calls']
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARK: {report['target']} ({report['runs']} runs, concurrency {report['concurrency']})")
+    print(f"{'='*70}\n")
+    print(f"Wall time:        {report['wall_time']:.2f}s")
+    print(f"Throughput:       {report['throughput_per_sec']:.2f} runs/s")
+    print(f"Failures:         {report['failures']}")
+    for error in report['sample_errors']:
+        print(f"  - {error}")
+    print(f"Latency p50/p95:  {latency['p50']:.2f}s / {latency['p95']:.2f}s (max {latency['max']:.2f}s)")
+    print(f"Model calls:      {calls['requests']} ({calls['errors']} errors, {calls['rate_limited']} rate limited)")
+    print(f"Tokens in/out:    {calls['input_tokens']} / {calls['output_tokens']}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workflow and A/B runners against the mock server")
+    parser.add_argument('--target', choices=['workflow', 'tester', 'ab-cache', 'resilience', 'queue', 'cascade', 'pipeline'],
+                        default='workflow')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes for --target queue")
+    parser.add_argument('--visibility-timeout', type=float, default=10.0,
+                        help="Lease length for --target queue")
+    parser.add_argument('--kill-one', action='store_true', help="Kill one worker mid-run (--target queue)")
+    parser.add_argument('--agent', default='strategic_analyst', choices=list(BENCHMARK_VARIANTS),
+                        help="Agent for --target tester / ab-cache")
+    parser.add_argument('--iterations', type=int, default=3, help="Iterations per variant for --target tester")
+    parser.add_argument('--document', help="Benchmark with this document instead of the built-in sample")
+    parser.add_argument('--mode', choices=['mock', 'replay'], default='mock')
+    parser.add_argument('--cassette', help="Cassette file for replay mode")
+    parser.add_argument('--latency', default='lognormal')
+    parser.add_argument('--latency-mean', type=float, default=0.5)
+    parser.add_argument('--latency-stddev', type=float, default=0.2)
+    parser.add_argument('--output-tokens', type=int, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fraction of mock responses that straggle")
+    parser.add_argument('--slow-factor', type=float, default=10.0, help="Latency multiplier for stragglers")
+    parser.add_argument('--weak-draft-rate', type=float, default=0.3,
+                        help="Fraction of small-model answers the mock makes unusable (--target cascade)")
+    parser.add_argument('--min-score', type=float, default=0.35, help="Cascade quality threshold (--target cascade)")
+    parser.add_argument('--rpm', type=int)
+    parser.add_argument('--cache-min-tokens', type=int, default=1024, help="Smallest prefix the mock server caches")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', action='store_true', help="Write the report to outputs/benchmarks/")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+
+    if args.save:
+        os.makedirs('outputs/benchmarks', exist_ok=True)
+        path = f"outputs/benchmarks/benchmark_{args.target}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {path}\n")
+
+
+if __name__ == "__main__":
+    main()
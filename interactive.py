@@ -2,7 +2,91 @@ import os
 from dotenv import load_dotenv
 from orchestrator.workflow_engine import WorkflowEngine
 from orchestrator.prompt_tester import PromptTester
+from orchestrator.streaming import BRIEF_STREAM
+from orchestrator.map_reduce import MapReduceWorkflow, workflow_for
+from orchestrator.dag import format_critical_path
+from orchestrator.variant_runner import VariantRunner, format_cache_report
+from orchestrator.adaptive_runner import AdaptiveVariantRunner, format_adaptive_report, resume_runner
+from orchestrator.checkpoints import CheckpointStore
+from orchestrator.results_index import ANALYSIS, ResultsIndex, save_analysis, save_test
+from orchestrator.resilience import ResilientAgentClient, describe_attempts, hedging_enabled
+from orchestrator.pricing import billed_calls, cache_report, total_tokens
+from orchestrator.single_flight import SingleFlight, fingerprint
+from orchestrator.cascade import DEFAULT_DRAFT_MODEL, cascading_client, describe_cascade
+from orchestrator.tracing import bind, current_span, span, trace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import glob
 import json
+import threading
+import time
+from datetime import datetime
+
+
+DOCUMENT_EXTENSIONS = ('.txt', '.md')
+CONTEXT_SUFFIX = '.context'
+
+
+def read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def load_batch(source, context_path=None):
+    """
+    Documents for a batch run, as [{'name', 'document', 'context'}], from either
+    - a directory of .txt/.md files, each optionally with a <stem>.context<ext> beside it
+      (brief.context.txt for brief.txt, notes.context.md for notes.md), or
+    - a JSONL manifest of {"document" or "path", "context" or "context_path", "name"} lines
+    context_path, if given, is the context for documents that have none of their own.
+    """
+    default_context = read_text(context_path) if context_path else ''
+    documents = []
+
+    if os.path.isdir(source):
+        for path in sorted(glob.glob(os.path.join(source, '*'))):
+            stem, extension = os.path.splitext(path)
+            if extension not in DOCUMENT_EXTENSIONS or stem.endswith(CONTEXT_SUFFIX):
+                continue
+            own_context = f"{stem}{CONTEXT_SUFFIX}{extension}"
+            documents.append({
+                'name': os.path.basename(path),
+                'document': read_text(path),
+                'context': read_text(own_context) if os.path.exists(own_context) else default_context
+            })
+        return documents
+
+    base_dir = os.path.dirname(source)
+    with open(source, 'r') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'document' in entry:
+                document = entry['document']
+            else:
+                document = read_text(os.path.join(base_dir, entry['path']))
+            if 'context' in entry:
+                context = entry['context']
+            elif 'context_path' in entry:
+                context = read_text(os.path.join(base_dir, entry['context_path']))
+            else:
+                context = default_context
+            documents.append({
+                'name': entry.get('name') or entry.get('path') or f"line {number}",
+                'document': document,
+                'context': context
+            })
+    return documents
+
+
+def result_calls(result):
+    """Every model call behind a workflow result (agents, synthesis and its cache-warming calls)"""
+    calls = list(result.get('phase1_results', {}).values())
+    if result.get('synthesis'):
+        calls.append(result['synthesis'])
+    calls.extend(result.get('synthesis_pipeline', {}).get('warm_results', []))
+    return calls
 
 
 class InteractiveConsole:
@@ -15,8 +99,15 @@ class InteractiveConsole:
             print("Error: ANTHROPIC_API_KEY not found in environment")
             exit(1)
 
-        self.engine = WorkflowEngine()
-        self.tester = PromptTester()
+        # Config load and agent init (a trace of its own with AGENT_TRACING=1)
+        with trace('interactive.startup'):
+            with span('workflow_engine.init'):
+                self.engine = WorkflowEngine()
+            with span('prompt_tester.init'):
+                self.tester = PromptTester()
+            with span('results_index.open'):
+                self.index = ResultsIndex()
+        self.client = ResilientAgentClient(hedge=hedging_enabled())
         self.current_input = {}
 
     def start(self):
@@ -45,6 +136,8 @@ class InteractiveConsole:
                     self.run_analysis()
                 elif command == 'test':
                     self.run_ab_test()
+                elif command == 'resume':
+                    self.resume_ab_test()
                 elif command == 'config':
                     self.show_config()
                 elif command == 'history':
@@ -75,7 +168,8 @@ Analysis Commands:
   clear      - Clear current input
 
 Testing Commands:
-  test       - Run A/B test on prompt variants
+  test       - Run A/B test on prompt variants (Ctrl+C cancels, keeping finished calls)
+  resume     - Finish an interrupted or cancelled A/B test
   config     - Show current agent configuration
 
 Utility Commands:
@@ -150,6 +244,7 @@ Utility Commands:
         except Exception as e:
             print(f"\nError loading file: {str(e)}\n")
 
+    @trace('interactive.analysis')
     def run_analysis(self):
         """Run full multi-agent analysis"""
         if not self.current_input.get('document'):
@@ -157,20 +252,29 @@ Utility Commands:
             return
 
         print("\nStarting analysis...\n")
+        current_span().set(characters=len(self.current_input['document']))
 
-        result = self.engine.execute_workflow(self.current_input)
+        result = self.stream_workflow(self.current_input)
 
         if result['success']:
             # Save output
-            brief_path = self.engine.save_output(result)
+            saved_as = save_analysis(self.engine, result, self.index)
 
-            # Display brief
+            # The brief has already been streamed above
             print("\n" + "="*70)
             print("ANALYSIS COMPLETE")
             print("="*70 + "\n")
-
-            with open(brief_path, 'r') as f:
-                print(f.read())
+            print(f"First insight after {result['time_to_first_insight']:.1f}s, "
+                  f"complete after {result['execution_time']:.1f}s")
+            if 'map_reduce' in result:
+                stats = result['map_reduce']
+                print(f"Analysed in {stats['chunks']} chunks: {stats['calls']} calls, "
+                      f"{stats['cache_hits']} reused from the chunk cache")
+            if 'dag' in result:
+                stats = result['dag']
+                print(f"Agent graph: {stats['calls']} calls, {stats['cache_hits']} nodes reused from the node cache")
+                print(format_critical_path(result))
+            print(f"Saved to results history as {os.path.basename(saved_as)}\n")
 
             # Show individual agent insights
             self.show_agent_details(result)
@@ -178,6 +282,60 @@ Utility Commands:
         else:
             print(f"\n✗ Analysis failed: {result.get('error', 'Unknown error')}\n")
 
+    def stream_workflow(self, input_data):
+        """Run the workflow, printing each agent's output line by line as it streams"""
+        workflow = workflow_for(self.engine.config, input_data, client=cascading_client(self.engine.config, self.client))
+        if isinstance(workflow, MapReduceWorkflow):
+            print("Long document: analysing it in chunks (map-reduce); agent output appears once merged.\n")
+        pending = {}
+        brief_started = False
+        result = None
+
+        for event in workflow.run(input_data):
+            if event['type'] == 'complete':
+                result = event['result']
+                continue
+
+            agent_name = event['agent']
+
+            if agent_name == BRIEF_STREAM:
+                # Only the synthesis is streaming at this point, so print it verbatim
+                if not brief_started:
+                    print("\n" + "="*70)
+                    print("EXECUTIVE BRIEF")
+                    print("="*70 + "\n")
+                    brief_started = True
+                if event['type'] == 'delta':
+                    print(event['text'], end='', flush=True)
+                else:
+                    print()
+                continue
+
+            # Agents stream concurrently; prefix complete lines with the agent name
+            label = agent_name.upper().replace('_', ' ')
+            if event.get('escalated'):
+                # The draft was rejected; the configured model's answer streams next
+                print(f"[{label}] ↑ escalating: {event['reason']}")
+                pending.pop(agent_name, None)
+            if event['type'] == 'delta':
+                pending[agent_name] = pending.get(agent_name, '') + event['text']
+                *lines, pending[agent_name] = pending[agent_name].split('\n')
+                for line in lines:
+                    if line.strip():
+                        print(f"[{label}] {line}")
+            else:
+                if pending.get(agent_name, '').strip():
+                    print(f"[{label}] {pending.pop(agent_name)}")
+                agent_result = event['result']
+                attempts = '; '.join(note for note in (describe_attempts(agent_result), describe_cascade(agent_result)) if note)
+                attempts = f" ({attempts})" if attempts else ""
+                if agent_result['success']:
+                    print(f"[{label}] ✓ done in {agent_result['execution_time']:.1f}s{attempts}")
+                else:
+                    print(f"[{label}] ✗ failed: {agent_result.get('error', 'Unknown error')}{attempts}")
+
+        return result
+
     def show_agent_details(self, result):
         """Show detailed agent outputs"""
         print("\n" + "="*70)
@@ -201,6 +359,7 @@ Utility Commands:
 
                     print()
 
+    @trace('interactive.ab_test')
     def run_ab_test(self):
         """Run A/B test on prompt variants"""
         if not self.current_input.get('document'):
@@ -231,17 +390,77 @@ Utility Commands:
         iterations = input("Number of iterations per variant (default 3): ").strip()
         iterations = int(iterations) if iterations.isdigit() else 3
 
-        print(f"\nRunning A/B test on {agent_name} with {iterations} iterations per variant...")
+        adaptive = input("Stop early once the winner is clear? (y/N): ").strip().lower() == 'y'
+
+        print(f"\nRunning A/B test on {agent_name} with up to {iterations} iterations per variant...")
         print("This may take several minutes...\n")
 
-        results = self.tester.run_ab_test(
+        if adaptive:
+            runner = AdaptiveVariantRunner(self.tester, config=self.engine.config)
+        else:
+            runner = VariantRunner(self.tester, config=self.engine.config)
+        run_id = runner.start(
             agent_name=agent_name,
             input_data=self.current_input,
             iterations=iterations
         )
 
+        self.execute_run(runner, run_id)
+
+    @trace('interactive.resume_ab_test')
+    def resume_ab_test(self):
+        """Pick an interrupted or cancelled A/B test and finish it"""
+        runs = CheckpointStore().resumable()
+        if not runs:
+            print("\nNo A/B tests to resume.\n")
+            return
+
+        print("\nResumable A/B tests:")
+        for i, run in enumerate(runs[:10], 1):
+            print(f"  {i}. {run['run_id']} ({run['status']}, {run['completed_calls']}/{run['total_calls']} calls done)")
+        print()
+
+        choice = input("Select test to resume: ").strip()
+        if not choice.isdigit() or not 1 <= int(choice) <= min(len(runs), 10):
+            print("\nInvalid choice.\n")
+            return
+
+        run_id = runs[int(choice) - 1]['run_id']
+        self.execute_run(resume_runner(self.tester, run_id, config=self.engine.config), run_id)
+
+    def execute_run(self, runner, run_id):
+        """Run a checkpointed A/B test; Ctrl+C stops scheduling calls and keeps the finished ones"""
+        print(f"Run {run_id} - press Ctrl+C to cancel (finished calls are kept, 'resume' continues it)\n")
+
+        cancel = threading.Event()
+        outcome = {}
+
+        def target():
+            try:
+                outcome['results'] = runner.resume(run_id, cancel=cancel)
+            except Exception as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=bind(target), daemon=True)
+        thread.start()
+        while thread.is_alive():
+            try:
+                thread.join(timeout=0.5)
+            except KeyboardInterrupt:
+                if not cancel.is_set():
+                    print("\nCancelling: waiting for calls in flight...")
+                    cancel.set()
+
+        if 'error' in outcome:
+            raise outcome['error']
+
+        results = outcome['results']
+        if results.get('cancelled'):
+            print(f"\nA/B test cancelled. Type 'resume' to finish {run_id} later.\n")
+            return
+
         # Save results
-        self.tester.save_test_results(results)
+        runner.mark_saved(run_id, save_test(self.tester, results, self.index))
 
         # Display summary
         print("\n" + "="*70)
@@ -256,6 +475,86 @@ Utility Commands:
             print(f"  {variant_id}: {score:.3f}")
 
         print()
+        print(format_cache_report(results['cache_report']))
+        if 'adaptive' in results:
+            print(format_adaptive_report(results['adaptive']))
+        print()
+
+    @trace('interactive.batch')
+    def run_batch(self, documents, concurrency=4):
+        """Analyse many documents concurrently without prompts, saving each brief like 'analyze' does"""
+        print("\n" + "="*70)
+        print(f"BATCH ANALYSIS: {len(documents)} documents, concurrency {concurrency}")
+        print("="*70 + "\n")
+
+        # Repeated documents in the batch are analysed (and saved) once
+        flights = SingleFlight()
+
+        def run(input_data):
+            start = time.time()
+            with span('analysis', characters=len(input_data['document'])):
+                saved_as = None
+                try:
+                    result = workflow_for(self.engine.config, input_data, client=cascading_client(self.engine.config, self.client)).execute(input_data)
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+                result['execution_time'] = result.get('execution_time', time.time() - start)
+                if result['success']:
+                    # A failed save fails this document only, not the rest of the batch
+                    try:
+                        saved_as = save_analysis(self.engine, result, self.index)
+                    except Exception as e:
+                        result = dict(result, success=False, error=f"Analysis ran but could not be saved: {e}")
+            return result, saved_as
+
+        def analyse(doc):
+            input_data = {'document': doc['document'], 'context': doc['context']}
+            return flights.do(fingerprint(input_data, self.engine.config), run, input_data)
+
+        outcomes = []
+        wall_start = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = {pool.submit(bind(analyse), doc): doc for doc in documents}
+            for done, future in enumerate(as_completed(futures), 1):
+                doc = futures[future]
+                (result, saved_as), shared = future.result()
+                outcomes.append((doc, result, shared))
+                tokens = sum(total_tokens(billed.get('tokens_used')) for call in result_calls(result) for billed in billed_calls(call))
+                progress = f"[{done}/{len(documents)}] {doc['name']}"
+                if not result['success']:
+                    note = " (shared with a document already running)" if shared else ""
+                    print(f"{progress} ✗ {result.get('error', 'Unknown error')}{note}")
+                elif shared:
+                    print(f"{progress} ✓ same as a document already running -> {os.path.basename(saved_as or '-')}")
+                else:
+                    print(f"{progress} ✓ {result['execution_time']:.1f}s, {tokens:,} tokens "
+                          f"-> {os.path.basename(saved_as)}")
+        wall_time = time.time() - wall_start
+
+        self.show_batch_summary(outcomes, wall_time)
+
+    def show_batch_summary(self, outcomes, wall_time):
+        """Aggregate timing and token usage for a batch run"""
+        succeeded = [result for _, result, _ in outcomes if result['success']]
+        runs = [result for _, result, shared in outcomes if not shared]
+        times = sorted(result['execution_time'] for result in runs if result['success'])
+        report = cache_report([call for result in runs for call in result_calls(result)])
+        tokens = report['tokens']
+
+        print("\n" + "="*70)
+        print("BATCH COMPLETE")
+        print("="*70 + "\n")
+        print(f"Documents:        {len(succeeded)}/{len(outcomes)} analysed, {len(outcomes) - len(succeeded)} failed"
+              f" ({len(outcomes) - len(runs)} duplicates shared a run)")
+        print(f"Wall time:        {wall_time:.1f}s ({len(outcomes) / max(wall_time, 1e-9):.2f} documents/s)")
+        if times:
+            print(f"Per document:     mean {sum(times) / len(times):.1f}s, "
+                  f"median {times[len(times) // 2]:.1f}s, max {times[-1]:.1f}s")
+        print(f"Model calls:      {report['calls']} ({report['cache_hits']} read the prompt cache)")
+        print(f"Tokens:           {tokens['input_tokens']:,} in, {tokens['output_tokens']:,} out, "
+              f"{tokens['cache_read_input_tokens']:,} cache reads, {tokens['cache_creation_input_tokens']:,} cache writes")
+        print(f"Cost:             ${report['cost']:.4f} (saved ${report['cost_saved']:.4f} by caching)")
+        print()
 
     def show_config(self):
         """Display current configuration"""
@@ -268,48 +567,68 @@ Utility Commands:
             print(f"  Model: {config['parameters']['model']}")
             print(f"  Temperature: {config['parameters']['temperature']}")
             print(f"  Max Tokens: {config['parameters']['max_tokens']}")
+            if config.get('cascade') and config['cascade'].get('enabled', True):
+                print(f"  Cascade: drafts on {config['cascade'].get('draft_model', DEFAULT_DRAFT_MODEL)}")
+            if config.get('depends_on'):
+                print(f"  Depends on: {', '.join(config['depends_on'])}")
             print()
 
     def show_history(self):
         """Show recent analysis history"""
-        import glob
-
-        output_files = sorted(glob.glob('outputs/analysis_*_brief.txt'), reverse=True)
+        recent = self.index.page(ANALYSIS, 0, 5)
 
-        if not output_files:
+        if not recent:
             print("\nNo analysis history found.\n")
             return
 
         print("\n" + "="*70)
-        print("RECENT ANALYSES")
+        print(f"RECENT ANALYSES ({self.index.count(ANALYSIS)} total)")
         print("="*70 + "\n")
 
-        for i, filepath in enumerate(output_files[:5], 1):
-            filename = os.path.basename(filepath)
-            timestamp = filename.replace('analysis_', '').replace('_brief.txt', '')
-
-            # Format timestamp
-            date_part = timestamp[:8]
-            time_part = timestamp[9:]
-            formatted = f"{date_part[:4]}-{date_part[4:6]}-{date_part[6:8]} {time_part[:2]}:{time_part[2:4]}:{time_part[4:6]}"
+        for i, entry in enumerate(recent, 1):
+            formatted = datetime.fromtimestamp(entry['created_at']).strftime('%Y-%m-%d %H:%M:%S')
 
             print(f"{i}. {formatted}")
-            print(f"   File: {filepath}")
+            print(f"   {os.path.basename(entry['path'])}: {entry['summary'] or '(no brief)'}")
             print()
 
         choice = input("View an analysis? (1-5 or Enter to skip): ").strip()
 
-        if choice.isdigit() and 1 <= int(choice) <= min(5, len(output_files)):
-            filepath = output_files[int(choice) - 1]
+        if choice.isdigit() and 1 <= int(choice) <= len(recent):
+            entry = recent[int(choice) - 1]
 
             print("\n" + "="*70)
-            with open(filepath, 'r') as f:
-                print(f.read())
+            print(self.index.load_text(entry) or self.index.load(entry['path']).get('final_brief', ''))
             print("="*70 + "\n")
 
 
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Multi-agent consultant intelligence system")
+    commands = parser.add_subparsers(dest='command')
+    batch = commands.add_parser('batch', help="Analyse a directory or JSONL manifest of documents without prompts")
+    batch.add_argument('source', help="Directory of .txt/.md files or a JSONL manifest")
+    batch.add_argument('--context', help="Context file for documents without their own")
+    batch.add_argument('--concurrency', type=positive_int, default=4, help="Documents analysed at once")
+    args = parser.parse_args()
+
     console = InteractiveConsole()
+
+    if args.command == 'batch':
+        documents = load_batch(args.source, args.context)
+        if not documents:
+            print(f"No documents found in {args.source}")
+            return
+        console.run_batch(documents, concurrency=args.concurrency)
+        return
+
     console.start()
 
 
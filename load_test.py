@@ -0,0 +1,409 @@
+"""
+Load test: how many concurrent analysts one box can serve.
+
+Simulates N concurrent sessions against the local mock model server,
+ramping N until a service-level objective breaks. No API key or network
+access is needed.
+
+    python load_test.py --target app --levels 1,2,4,8,16,32 --sessions 3 --slo-p95 30 --save
+    python load_test.py --target analyzer --levels 1,8,32,128 --sessions 20 --save
+    python load_test.py --compare outputs/load_tests/load_app_20260101_120000.json --target app --save
+
+Targets:
+    app        what app.py runs for each analysis request: workflow_for with the cascading,
+               resilient client, queued on one JobQueue of APP_JOB_WORKERS workers shared by
+               every session, the session polling its job until it finishes
+    analyzer   marketing_analyzer.py's analysis (orchestrator.document_analysis), one
+               thread per session like Streamlit's script threads
+
+At each level, `concurrency` virtual users each run --sessions analyses back
+to back. Each level reports:
+- throughput
+- p50/p95/p99 latency, plus time to first insight and queue wait for app
+- error rate
+- memory growth per session: RSS after a gc, divided by the sessions run, which
+  is approximate (allocator caching and thread stacks show up as growth, freed
+  memory often doesn't); with --tracemalloc, the Python heap still allocated
+  after a gc, which is exact but slows every session
+- the model calls made
+
+The ramp stops at the first level that breaks an SLO, and the last passing
+level is reported as the capacity. With --compare, each level is shown next
+to the same level of an earlier saved report.
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmark import RESILIENCE_CONFIG, SAMPLE_INPUT, point_client_at, summarize_latencies
+from orchestrator.mock_server import MockModelServer
+
+
+LOAD_TESTS_DIR = 'outputs/load_tests'
+
+DEFAULT_LEVELS = '1,2,4,8,16,32'
+
+
+def rss_mb() -> float:
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def session_memory_mb() -> float:
+    """Python heap still allocated while tracemalloc is tracing, otherwise RSS (approximate)"""
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0] / 1e6
+    return rss_mb()
+
+
+def session_input(index: int, documents: int) -> Dict:
+    """The sample document made distinct per session (or one of `documents` variants when set)"""
+    variant = index % documents if documents else index
+    return {'document': f"{SAMPLE_INPUT['document']}\n    Reference: analyst session {variant}",
+            'context': SAMPLE_INPUT['context']}
+
+
+# ----------------------------------------------------------------------
+# Sessions
+# ----------------------------------------------------------------------
+
+class AppSessions:
+    """app.py's analysis path: one shared client and job queue, a job per request"""
+
+    def __init__(self, args):
+        from orchestrator.cascade import cascading_client
+        from orchestrator.jobs import JobQueue
+        from orchestrator.resilience import ResilientAgentClient, hedging_enabled
+        from orchestrator.session_store import SessionStore
+
+        self.config = RESILIENCE_CONFIG
+        self.client = cascading_client(self.config, ResilientAgentClient(hedge=hedging_enabled()))
+        self.jobs = JobQueue(max_workers=args.app_workers)
+        self.store = SessionStore()
+        self.poll = args.poll
+        self.timeout = args.session_timeout
+
+    def run(self, input_data: Dict) -> Dict:
+        from orchestrator.map_reduce import workflow_for
+        from orchestrator.session_store import result_summary
+        from orchestrator.single_flight import fingerprint
+
+        submitted = time.time()
+        workflow = workflow_for(self.config, input_data, client=self.client)
+        job_id = self.jobs.submit('analysis', lambda job: workflow.execute(input_data),
+                                  key=fingerprint(input_data, self.config))
+        job = self.jobs.get(job_id)
+        while not job.finished:
+            if time.time() - submitted > self.timeout:
+                self.jobs.cancel(job_id)
+                return {'error': f"timed out after {self.timeout:.0f}s"}
+            time.sleep(self.poll)
+
+        # Handed over as the page does: collected from the job, kept in the session store
+        outcome = {'queue_wait': (job.started_at or job.finished_at) - submitted}
+        result = self.jobs.collect(job_id)
+        if job.error or result is None:
+            outcome['error'] = job.error or job.status
+        elif not result['success']:
+            outcome['error'] = result.get('error', 'Unknown error')
+        else:
+            self.store.session().put('analysis', result, result_summary(result))
+            outcome['first_insight'] = result.get('time_to_first_insight')
+        return outcome
+
+    def stats(self) -> Dict:
+        return self.jobs.stats()
+
+
+class AnalyzerSessions:
+    """marketing_analyzer.py's rule-based analysis, computed on the session's own thread"""
+
+    def __init__(self, args):
+        from orchestrator.document_analysis import PERSONAS
+
+        self.personas = list(PERSONAS)
+
+    def run(self, input_data: Dict) -> Dict:
+        from orchestrator.document_analysis import analyze_document
+
+        analyze_document(input_data['document'], self.personas, price_point='$450')
+        return {}
+
+    def stats(self) -> Dict:
+        return {}
+
+
+TARGETS = {'app': AppSessions, 'analyzer': AnalyzerSessions}
+
+
+# ----------------------------------------------------------------------
+# Ramp
+# ----------------------------------------------------------------------
+
+def slo_breaches(level: Dict, args) -> List[str]:
+    breaches = []
+    if level['latency']['p95'] > args.slo_p95:
+        breaches.append(f"p95 {level['latency']['p95']:.2f}s > {args.slo_p95:.2f}s")
+    if args.slo_p99 is not None and level['latency']['p99'] > args.slo_p99:
+        breaches.append(f"p99 {level['latency']['p99']:.2f}s > {args.slo_p99:.2f}s")
+    if level['error_rate'] > args.slo_error_rate:
+        breaches.append(f"error rate {level['error_rate']:.1%} > {args.slo_error_rate:.1%}")
+    return breaches
+
+
+def run_level(sessions, concurrency: int, args, first_index: int, server: MockModelServer) -> Dict:
+    """concurrency users, each running args.sessions sessions back to back"""
+    lock = threading.Lock()
+    outcomes = []
+    counter = [first_index]
+
+    def user(_):
+        for _ in range(args.sessions):
+            with lock:
+                index = counter[0]
+                counter[0] += 1
+            start = time.time()
+            try:
+                outcome = sessions.run(session_input(index, args.documents))
+            except Exception as e:
+                outcome = {'error': f"{type(e).__name__}: {e}"}
+            outcome['latency'] = time.time() - start
+            with lock:
+                outcomes.append(outcome)
+            if args.think:
+                time.sleep(args.think)
+
+    gc.collect()
+    rss_before = rss_mb()
+    memory_before = session_memory_mb()
+    calls_before = server.snapshot_stats()
+
+    wall_start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='user') as pool:
+        list(pool.map(user, range(concurrency)))
+    wall_time = time.time() - wall_start
+
+    gc.collect()
+    rss_after = rss_mb()
+    memory_after = session_memory_mb()
+    calls_after = server.snapshot_stats()
+
+    errors = [outcome['error'] for outcome in outcomes if outcome.get('error')]
+    ok = [outcome for outcome in outcomes if not outcome.get('error')]
+    level = {
+        'concurrency': concurrency,
+        'sessions': len(outcomes),
+        'wall_time': wall_time,
+        'throughput_per_sec': len(ok) / wall_time if wall_time else 0.0,
+        'latency': summarize_latencies([outcome['latency'] for outcome in ok]),
+        'errors': len(errors),
+        'error_rate': len(errors) / len(outcomes) if outcomes else 0.0,
+        'sample_errors': sorted(set(errors))[:5],
+        'rss_mb_before': rss_before,
+        'rss_mb_after': rss_after,
+        'memory_measure': 'tracemalloc' if tracemalloc.is_tracing() else 'rss',
+        'memory_per_session_kb': (memory_after - memory_before) * 1e3 / len(outcomes) if outcomes else 0.0,
+        'model_calls': {key: calls_after[key] - calls_before.get(key, 0) for key in calls_after
+                        if isinstance(calls_after[key], (int, float))},
+        'sessions_stats': sessions.stats()
+    }
+    if any('first_insight' in outcome for outcome in ok):
+        level['first_insight'] = summarize_latencies([outcome['first_insight'] for outcome in ok
+                                                      if outcome.get('first_insight') is not None])
+        level['queue_wait'] = summarize_latencies([outcome['queue_wait'] for outcome in ok])
+    level['breaches'] = slo_breaches(level, args)
+    return level
+
+
+def run_load_test(args, on_level: Optional[Callable[[Dict], None]] = None) -> Dict:
+    levels = [int(level) for level in args.levels.split(',')]
+    server = MockModelServer(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        requests_per_minute=args.rpm,
+        cache_min_tokens=args.cache_min_tokens,
+        stream_chunk_delay=0.002,
+        seed=args.seed
+    )
+
+    results = []
+    if args.tracemalloc:
+        tracemalloc.start()
+    with server:
+        point_client_at(server)
+        sessions = TARGETS[args.target](args)
+
+        # One untimed session first, so imports and client setup don't count as growth
+        sessions.run(session_input(0, args.documents))
+        gc.collect()
+        rss_start = rss_mb()
+
+        first_index = 1
+        for concurrency in levels:
+            level = run_level(sessions, concurrency, args, first_index, server)
+            first_index += level['sessions']
+            results.append(level)
+            if on_level:
+                on_level(level)
+            if level['breaches'] and not args.keep_going:
+                break
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    passing = [level['concurrency'] for level in results if not level['breaches']]
+    broken = [level['concurrency'] for level in results if level['breaches']]
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'target': args.target,
+        'settings': {
+            'levels': levels,
+            'sessions_per_user': args.sessions,
+            'documents': args.documents,
+            'think': args.think,
+            'app_workers': args.app_workers if args.target == 'app' else None,
+            'latency': args.latency,
+            'latency_mean': args.latency_mean,
+            'latency_stddev': args.latency_stddev,
+            'error_rate': args.error_rate,
+            'rpm': args.rpm,
+            'seed': args.seed,
+            'tracemalloc': args.tracemalloc
+        },
+        'slo': {'p95': args.slo_p95, 'p99': args.slo_p99, 'error_rate': args.slo_error_rate},
+        'levels': results,
+        'capacity': max(passing) if passing else None,
+        'broke_at': min(broken) if broken else None,
+        'rss_mb_start': rss_start,
+        'rss_mb_end': rss_mb()
+    }
+
+
+# ----------------------------------------------------------------------
+# Reports
+# ----------------------------------------------------------------------
+
+def format_memory(level: Dict) -> str:
+    """Memory per session, with ~ marking the approximate RSS measure"""
+    approximate = '~' if level.get('memory_measure', 'rss') == 'rss' else ''
+    return f"{approximate}{level['memory_per_session_kb']:.1f}KB"
+
+
+def format_level(level: Dict) -> str:
+    latency = level['latency']
+    status = 'ok' if not level['breaches'] else 'SLO: ' + '; '.join(level['breaches'])
+    return (f"{level['concurrency']:>5d} {level['sessions']:>8d} {level['throughput_per_sec']:>8.2f}/s "
+            f"{latency['p50']:>7.2f}s {latency['p95']:>7.2f}s {latency['p99']:>7.2f}s "
+            f"{level['error_rate']:>6.1%} {format_memory(level):>11s}  {status}")
+
+
+LEVEL_HEADER = (f"{'Users':>5s} {'Sessions':>8s} {'Throughput':>10s} {'p50':>8s} {'p95':>8s} {'p99':>8s} "
+                f"{'Errors':>6s} {'Mem/sess':>11s}")
+
+
+def print_load_report(report: Dict, baseline: Optional[Dict] = None):
+    print(f"\n{'='*70}")
+    print(f"LOAD TEST: {report['target']} (SLO p95 <= {report['slo']['p95']:.1f}s, "
+          f"errors <= {report['slo']['error_rate']:.1%})")
+    print(f"{'='*70}\n")
+    print(LEVEL_HEADER)
+    for level in report['levels']:
+        print(format_level(level))
+        for error in level['sample_errors']:
+            print(f"        - {error}")
+        if 'first_insight' in level:
+            print(f"        first insight p95 {level['first_insight']['p95']:.2f}s, "
+                  f"queue wait p95 {level['queue_wait']['p95']:.2f}s, "
+                  f"{level['model_calls'].get('requests', 0)} model calls")
+
+    print()
+    if report['capacity'] is None:
+        print("Capacity: no level met the SLOs")
+    else:
+        print(f"Capacity: {report['capacity']} concurrent sessions"
+              + (f" (SLOs broke at {report['broke_at']})" if report['broke_at'] else " (no level broke the SLOs)"))
+    print(f"Memory:   {report['rss_mb_start']:.0f}MB -> {report['rss_mb_end']:.0f}MB RSS"
+          + ("" if report['settings'].get('tracemalloc') else " (~ per session: RSS growth, approximate; "
+                                                              "use --tracemalloc for the Python heap)"))
+
+    if baseline:
+        print(f"\nCompared with {baseline['timestamp'][:19]} (capacity {baseline['capacity']}):")
+        before = {level['concurrency']: level for level in baseline['levels']}
+        for level in report['levels']:
+            old = before.get(level['concurrency'])
+            if old is None:
+                continue
+            print(f"  {level['concurrency']:>4d} users: throughput {old['throughput_per_sec']:.2f} -> "
+                  f"{level['throughput_per_sec']:.2f}/s, p95 {old['latency']['p95']:.2f} -> "
+                  f"{level['latency']['p95']:.2f}s, errors {old['error_rate']:.1%} -> {level['error_rate']:.1%}, "
+                  f"mem/session {format_memory(old)} -> {format_memory(level)}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent sessions against the mock server until SLOs break")
+    parser.add_argument('--target', choices=list(TARGETS), default='app')
+    parser.add_argument('--levels', default=DEFAULT_LEVELS, help="Comma-separated concurrent users per step")
+    parser.add_argument('--sessions', type=int, default=3, help="Analyses each user runs per level")
+    parser.add_argument('--documents', type=int, default=0,
+                        help="Distinct documents shared by all sessions (0: every session's is unique)")
+    parser.add_argument('--think', type=float, default=0.0, help="Seconds a user waits between analyses")
+    parser.add_argument('--app-workers', type=int, default=int(os.getenv('APP_JOB_WORKERS', '4')),
+                        help="Shared job workers (--target app, like APP_JOB_WORKERS)")
+    parser.add_argument('--poll', type=float, default=0.25, help="Seconds between a session's job polls")
+    parser.add_argument('--session-timeout', type=float, default=300.0)
+    parser.add_argument('--slo-p95', type=float, default=30.0, help="p95 session latency objective (seconds)")
+    parser.add_argument('--slo-p99', type=float, help="Optional p99 latency objective (seconds)")
+    parser.add_argument('--slo-error-rate', type=float, default=0.01)
+    parser.add_argument('--keep-going', action='store_true', help="Run every level even after an SLO breaks")
+    parser.add_argument('--latency', default='lognormal')
+    parser.add_argument('--latency-mean', type=float, default=0.5)
+    parser.add_argument('--latency-stddev', type=float, default=0.2)
+    parser.add_argument('--output-tokens', type=int, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, help="Mock server rate limit (requests per minute)")
+    parser.add_argument('--cache-min-tokens', type=int, default=1024, help="Smallest prefix the mock server caches")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--compare', help="Earlier saved report to compare each level with")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="Measure memory per session as Python heap growth (exact, but slows sessions down)")
+    parser.add_argument('--save', action='store_true', help=f"Write the report to {LOAD_TESTS_DIR}/")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    print(f"Ramping {args.target} sessions over {args.levels} concurrent users...")
+    report = run_load_test(args, on_level=lambda level: print(format_level(level)))
+    print_load_report(report, baseline)
+
+    if args.save:
+        os.makedirs(LOAD_TESTS_DIR, exist_ok=True)
+        path = os.path.join(LOAD_TESTS_DIR, f"load_{args.target}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {path}\n")
+
+
+if __name__ == "__main__":
+    main()
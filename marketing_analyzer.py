@@ -2,16 +2,12 @@ import streamlit as st
 import os
 from datetime import datetime
 import json
+from collections import deque
 from pathlib import Path
 
-# NLP and Analysis imports
-try:
-    from textblob import TextBlob
-except ImportError:
-    TextBlob = None
-
-import re
-from collections import Counter
+from orchestrator.document_analysis import DEFAULT_PERSONAS, PERSONAS, SENTIMENT_AVAILABLE, analyze_document
+from orchestrator.session_store import MAX_ENTRIES, SessionStore
+from orchestrator.tracing import trace
 
 # Page config
 st.set_page_config(
@@ -57,11 +53,23 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
+
+@st.cache_resource
+def session_store():
+    """Analysis history of every session: summaries in memory, full analyses spilled to outputs/sessions/"""
+    return SessionStore()
+
+
+# Initialize session state (both histories are bounded; old analyses are evicted from the store)
 if 'feedback_data' not in st.session_state:
-    st.session_state.feedback_data = []
+    st.session_state.feedback_data = deque(maxlen=MAX_ENTRIES)
+if 'feedback_given' not in st.session_state:
+    # feedback_data only keeps the last MAX_ENTRIES, so the count is kept separately
+    st.session_state.feedback_given = 0
 if 'analysis_history' not in st.session_state:
-    st.session_state.analysis_history = []
+    st.session_state.analysis_history = session_store().session()
+if 'analyses_run' not in st.session_state:
+    st.session_state.analyses_run = 0
 
 # Title
 st.markdown('<div class="main-title">📊 Marketing Document Analyzer</div>', unsafe_allow_html=True)
@@ -73,37 +81,11 @@ with st.sidebar:
     st.header("🎭 Analysis Personas")
     st.markdown("Select which perspectives to analyze your document:")
 
-    personas = {
-        "Strategic Consultant": {
-            "icon": "🎯",
-            "description": "Expert marketing strategist analyzing positioning and competitive advantage",
-            "focus": ["Strategy", "Positioning", "Differentiation"]
-        },
-        "Target Customer": {
-            "icon": "👤",
-            "description": "Your ideal customer's perspective on the message",
-            "focus": ["Appeal", "Clarity", "Trust"]
-        },
-        "Skeptical Buyer": {
-            "icon": "🤔",
-            "description": "Critical consumer looking for red flags and concerns",
-            "focus": ["Objections", "Credibility", "Value"]
-        },
-        "SEO Specialist": {
-            "icon": "🔍",
-            "description": "Digital marketing expert analyzing online performance",
-            "focus": ["Keywords", "Readability", "Engagement"]
-        },
-        "Brand Strategist": {
-            "icon": "✨",
-            "description": "Brand expert evaluating tone, voice, and positioning",
-            "focus": ["Voice", "Emotion", "Differentiation"]
-        }
-    }
+    personas = PERSONAS
 
     selected_personas = []
     for persona_name, persona_info in personas.items():
-        if st.checkbox(f"{persona_info['icon']} {persona_name}", value=persona_name in ["Strategic Consultant", "Target Customer", "Skeptical Buyer"]):
+        if st.checkbox(f"{persona_info['icon']} {persona_name}", value=persona_name in DEFAULT_PERSONAS):
             selected_personas.append(persona_name)
 
     st.markdown("---")
@@ -111,8 +93,33 @@ with st.sidebar:
 
     st.markdown("---")
     st.header("📚 Quick Stats")
-    st.metric("Analyses Run", len(st.session_state.analysis_history))
-    st.metric("Feedback Given", len(st.session_state.feedback_data))
+    st.metric("Analyses Run", st.session_state.analyses_run)
+    st.metric("Feedback Given", st.session_state.feedback_given)
+
+    # Earlier analyses of this session, read back from the session store
+    history = st.session_state.analysis_history.summaries()
+    if history:
+        with st.expander(f"🕘 Recent Analyses ({len(history)})"):
+            recent = {key: summary for key, summary, _ in reversed(history)}
+            selected_key = st.selectbox(
+                "Analysis",
+                list(recent),
+                format_func=lambda key: f"{recent[key]['timestamp'][11:19]} · {recent[key]['document_length']} chars · "
+                                        f"{len(recent[key]['personas'])} personas"
+            )
+            past = st.session_state.analysis_history.get(selected_key)
+            if past is None:
+                st.caption("The full analysis was evicted from the session store; only its summary is kept.")
+            else:
+                st.caption(f"Personas: {', '.join(past['personas'])}")
+                st.metric("Heuristics Present", f"{past['analysis']['heuristic_score']}/{len(past['analysis']['heuristics'])}")
+                st.download_button(
+                    "💾 Download Analysis",
+                    data=json.dumps(past, indent=2),
+                    file_name=f"{selected_key}.json",
+                    mime="application/json",
+                    use_container_width=True
+                )
 
 # Main content
 col1, col2 = st.columns([2, 1])
@@ -168,15 +175,24 @@ if analyze_button:
     elif not selected_personas:
         st.error("⚠️ Please select at least one persona from the sidebar")
     else:
-        with st.spinner("🔄 Analyzing your document..."):
+        with st.spinner("🔄 Analyzing your document..."), \
+                trace('marketing_analyzer.analysis', characters=len(document), personas=len(selected_personas)):
+
+            # All of the analysis is computed up front; the rest of this block only renders it
+            analysis = analyze_document(document, selected_personas, price_point=price_point,
+                                        include_sentiment=include_nlp and include_sentiment)
 
-            # Store in history
+            # Store in history: the record stays in memory, the full analysis is spilled to disk
             analysis_record = {
                 'timestamp': datetime.now().isoformat(),
                 'document_length': len(document),
                 'personas': selected_personas
             }
-            st.session_state.analysis_history.append(analysis_record)
+            st.session_state.analyses_run += 1
+            st.session_state.analysis_history.put(f"analysis_{st.session_state.analyses_run}",
+                                                  dict(analysis_record, analysis=analysis), analysis_record)
+            metrics = analysis['metrics']
+            sentiment_score = analysis['sentiment_score']
 
             st.success("✅ Analysis Complete!")
             st.markdown("---")
@@ -186,31 +202,23 @@ if analyze_button:
                 st.subheader("📊 Document Metrics")
 
                 # Basic metrics
-                words = document.split()
-                sentences = document.split('.')
-
                 metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
 
                 with metric_col1:
-                    st.metric("Word Count", len(words))
+                    st.metric("Word Count", metrics['word_count'])
 
                 with metric_col2:
-                    st.metric("Sentences", len(sentences))
+                    st.metric("Sentences", metrics['sentence_count'])
 
                 with metric_col3:
-                    avg_word_length = sum(len(word) for word in words) / len(words) if words else 0
-                    st.metric("Avg Word Length", f"{avg_word_length:.1f}")
+                    st.metric("Avg Word Length", f"{metrics['avg_word_length']:.1f}")
 
                 with metric_col4:
-                    reading_time = len(words) / 200  # Average reading speed
-                    st.metric("Read Time", f"{reading_time:.1f} min")
+                    st.metric("Read Time", f"{metrics['reading_time']:.1f} min")
 
                 # Sentiment Analysis
-                if include_sentiment and TextBlob:
-                    try:
-                        blob = TextBlob(document)
-                        sentiment_score = blob.sentiment.polarity
-
+                if include_sentiment and SENTIMENT_AVAILABLE:
+                    if sentiment_score is not None:
                         st.markdown("### 😊 Sentiment Analysis")
 
                         sent_col1, sent_col2 = st.columns([1, 2])
@@ -226,13 +234,12 @@ if analyze_button:
                         with sent_col2:
                             st.progress((sentiment_score + 1) / 2)  # Normalize to 0-1
                             st.caption(f"Sentiment Score: {sentiment_score:.2f} (Range: -1 to +1)")
-                    except:
+                    else:
                         st.info("Install textblob for sentiment analysis: `pip install textblob`")
 
                 # Keyword extraction
                 st.markdown("### 🔑 Top Keywords")
-                words_clean = [word.lower() for word in words if len(word) > 4 and word.isalpha()]
-                keyword_counts = Counter(words_clean).most_common(10)
+                keyword_counts = analysis['keywords']
 
                 keyword_col1, keyword_col2 = st.columns(2)
 
@@ -251,34 +258,8 @@ if analyze_button:
                 st.subheader("🎯 Marketing Heuristics Checklist")
                 st.caption("Based on proven marketing principles")
 
-                heuristics = {
-                    "Clear Value Proposition": {
-                        "check": any(word in document.lower() for word in ['benefit', 'save', 'improve', 'increase', 'reduce', 'transform']),
-                        "tip": "Clearly state what benefit the customer gets"
-                    },
-                    "Specific Claims": {
-                        "check": bool(re.search(r'\d+%|\$\d+|\d+ (days|hours|minutes)', document)),
-                        "tip": "Use specific numbers and data points"
-                    },
-                    "Call to Action": {
-                        "check": any(word in document.lower() for word in ['buy', 'get', 'start', 'try', 'download', 'sign up', 'contact', 'learn more']),
-                        "tip": "Include a clear next step for the reader"
-                    },
-                    "Urgency/Scarcity": {
-                        "check": any(word in document.lower() for word in ['limited', 'now', 'today', 'exclusive', 'only', 'hurry']),
-                        "tip": "Create urgency (but don't overdo it)"
-                    },
-                    "Social Proof": {
-                        "check": any(word in document.lower() for word in ['customers', 'users', 'clients', 'testimonial', 'review', 'rated', 'trusted']),
-                        "tip": "Include customer testimonials or statistics"
-                    },
-                    "Credibility Markers": {
-                        "check": any(word in document.lower() for word in ['proven', 'tested', 'certified', 'guarantee', 'expert', 'professional']),
-                        "tip": "Build trust with credentials or guarantees"
-                    }
-                }
-
-                score = sum(1 for h in heuristics.values() if h['check'])
+                heuristics = analysis['heuristics']
+                score = analysis['heuristic_score']
                 total = len(heuristics)
 
                 st.progress(score / total)
@@ -310,101 +291,7 @@ if analyze_button:
                     st.markdown(f"**Focus Areas:** {', '.join(persona_info['focus'])}")
                     st.markdown("---")
 
-                    # Generate persona-specific insights
-                    if persona_name == "Strategic Consultant":
-                        insights = [
-                            {
-                                "title": "🎯 Positioning Strategy",
-                                "insight": "The document positions the offering as a premium solution, but could strengthen differentiation by highlighting unique features.",
-                                "action": "Add 1-2 specific features that competitors don't offer"
-                            },
-                            {
-                                "title": "💪 Key Strength",
-                                "insight": f"Strong use of {'benefit-focused' if 'benefit' in document.lower() else 'feature-focused'} language. The messaging clearly communicates value.",
-                                "action": "Maintain this approach and apply consistently across all channels"
-                            },
-                            {
-                                "title": "⚠️ Key Weakness",
-                                "insight": "Missing clear competitive advantage. Why choose you over alternatives?",
-                                "action": "Add explicit comparison or unique selling proposition"
-                            }
-                        ]
-
-                    elif persona_name == "Target Customer":
-                        insights = [
-                            {
-                                "title": "👀 First Impression",
-                                "insight": f"The {'clear headline' if len(document.split('\\n')[0]) < 60 else 'lengthy opening'} {'captures' if len(document.split('\\n')[0]) < 60 else 'may lose'} attention quickly.",
-                                "action": "Consider A/B testing the opening line for maximum impact"
-                            },
-                            {
-                                "title": "💭 Clarity Score",
-                                "insight": f"Message clarity is {'high' if avg_word_length < 6 else 'moderate'} - average word length of {avg_word_length:.1f} letters.",
-                                "action": "Use simpler language where possible for broader appeal"
-                            },
-                            {
-                                "title": "🤝 Trust Factors",
-                                "insight": f"{'Strong' if any(word in document.lower() for word in ['guarantee', 'proven', 'trusted']) else 'Limited'} trust signals present.",
-                                "action": "Add guarantees, testimonials, or credibility markers"
-                            }
-                        ]
-
-                    elif persona_name == "Skeptical Buyer":
-                        insights = [
-                            {
-                                "title": "🚩 Red Flags",
-                                "insight": f"{'Few' if len(re.findall(r'amazing|incredible|revolutionary|best', document.lower())) < 2 else 'Multiple'} hyperbolic claims detected.",
-                                "action": "Replace superlatives with specific, measurable benefits"
-                            },
-                            {
-                                "title": "❓ Unanswered Questions",
-                                "insight": f"Price {'is' if price_point else 'is NOT'} mentioned - transparency {'good' if price_point else 'lacking'}.",
-                                "action": "Be upfront about pricing to build trust"
-                            },
-                            {
-                                "title": "🛡️ Risk Reversal",
-                                "insight": f"{'Good' if 'guarantee' in document.lower() or 'refund' in document.lower() else 'No'} risk reversal present.",
-                                "action": "Add money-back guarantee or free trial to reduce purchase risk"
-                            }
-                        ]
-
-                    elif persona_name == "SEO Specialist":
-                        insights = [
-                            {
-                                "title": "🔍 Keyword Optimization",
-                                "insight": f"Top keyword '{keyword_counts[0][0] if keyword_counts else 'N/A'}' appears {keyword_counts[0][1] if keyword_counts else 0} times.",
-                                "action": "Ensure primary keywords appear in headline and first 100 words"
-                            },
-                            {
-                                "title": "📱 Readability",
-                                "insight": f"{'Short' if len(sentences) > 10 else 'Long'} sentences - average {len(words)/len(sentences):.1f} words per sentence.",
-                                "action": "Aim for 15-20 words per sentence for online readability"
-                            },
-                            {
-                                "title": "🎯 Meta Description Ready",
-                                "insight": f"First {'100' if len(document) > 100 else len(document)} characters could serve as meta description.",
-                                "action": "Extract this for your SEO meta description"
-                            }
-                        ]
-
-                    else:  # Brand Strategist
-                        insights = [
-                            {
-                                "title": "🎨 Brand Voice",
-                                "insight": f"Tone is {'professional' if avg_word_length > 5 else 'casual'} with {'positive' if sentiment_score > 0 else 'neutral'} sentiment.",
-                                "action": "Ensure this aligns with your overall brand personality"
-                            },
-                            {
-                                "title": "💫 Emotional Resonance",
-                                "insight": f"{'Strong' if sentiment_score > 0.3 else 'Moderate'} emotional appeal detected.",
-                                "action": "Consider adding more emotional triggers for engagement"
-                            },
-                            {
-                                "title": "🎭 Differentiation",
-                                "insight": f"{'Unique' if len(set(words_clean)) / len(words_clean) > 0.5 else 'Generic'} language - vocabulary diversity {len(set(words_clean)) / len(words_clean):.1%}.",
-                                "action": "Use distinctive language that competitors don't use"
-                            }
-                        ]
+                    insights = analysis['personas'][persona_name]
 
                     # Display insights
                     for i, insight_data in enumerate(insights, 1):
@@ -431,6 +318,7 @@ if analyze_button:
                         'rating': 'positive',
                         'personas': selected_personas
                     })
+                    st.session_state.feedback_given += 1
                     st.success("Thanks! We'll keep doing this!")
 
             with feedback_col2:
@@ -440,6 +328,7 @@ if analyze_button:
                         'rating': 'neutral',
                         'personas': selected_personas
                     })
+                    st.session_state.feedback_given += 1
                     st.info("Thanks! We'll work on improving!")
 
             with feedback_col3:
@@ -449,6 +338,7 @@ if analyze_button:
                         'rating': 'negative',
                         'personas': selected_personas
                     })
+                    st.session_state.feedback_given += 1
                     st.warning("Thanks for the feedback!")
 
             with st.expander("💬 Add Detailed Feedback (Optional)"):
@@ -476,10 +366,10 @@ if analyze_button:
                     },
                     'personas_analyzed': selected_personas,
                     'metrics': {
-                        'word_count': len(words),
-                        'sentence_count': len(sentences),
-                        'avg_word_length': avg_word_length,
-                        'sentiment_score': sentiment_score if 'sentiment_score' in locals() else None,
+                        'word_count': metrics['word_count'],
+                        'sentence_count': metrics['sentence_count'],
+                        'avg_word_length': metrics['avg_word_length'],
+                        'sentiment_score': sentiment_score,
                         'heuristic_score': f"{score}/{total}" if 'score' in locals() else None
                     }
                 }
@@ -498,9 +388,9 @@ if analyze_button:
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 DOCUMENT METRICS
-- Word Count: {len(words)}
-- Sentences: {len(sentences)}
-- Reading Time: {reading_time:.1f} minutes
+- Word Count: {metrics['word_count']}
+- Sentences: {metrics['sentence_count']}
+- Reading Time: {metrics['reading_time']:.1f} minutes
 
 PERSONAS ANALYZED
 {', '.join(selected_personas)}
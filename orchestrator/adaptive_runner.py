@@ -0,0 +1,249 @@
+"""
+Adaptive A/B testing with early stopping.
+
+Instead of spending exactly `iterations` calls on every variant, calls are
+allocated where they help decide the winner:
+
+    thompson - each call goes to the variant drawn best from its posterior
+               over per-call composite scores
+    halving  - successive halving: every surviving variant is run to the
+               round's iteration count, then the bottom half is dropped
+
+Both stop as soon as the leader's probability of being best reaches
+`confidence` (after every variant has `min_iterations` calls), and never
+exceed the fixed-mode budget of iterations x variants. Calls are
+checkpointed like VariantRunner's, so an adaptive run can be cancelled and
+resumed too. The result keeps the PromptTester format and adds an
+'adaptive' block with the calls made and saved. The run stops on the
+posterior over per-call scores, so the winner is that posterior's leader (the
+variant most likely best); all_scores still holds every variant's composite.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from orchestrator.agent_client import AgentClient
+from orchestrator.checkpoints import CheckpointStore
+from orchestrator.metrics import composite_score, variant_metrics
+from orchestrator.variant_runner import VariantRunner
+
+
+STRATEGIES = ('thompson', 'halving')
+
+# Score variance assumed before there is enough data to estimate it
+PRIOR_VARIANCE = 0.05
+
+
+def call_score(result: Dict, ground_truth: Optional[Dict] = None) -> float:
+    """Composite score of a single call (failures score 0)"""
+    if not result or not result.get('success'):
+        return 0.0
+    return composite_score(variant_metrics([result], ground_truth))
+
+
+def probability_best(scores: Dict[str, List[float]], samples: int = 2000,
+                     rng: Optional[np.random.Generator] = None) -> Dict[str, float]:
+    """
+    Monte Carlo probability that each variant has the highest mean score,
+    using a normal posterior per variant with a variance pooled across variants.
+    """
+    rng = rng or np.random.default_rng()
+    observed = [s for values in scores.values() for s in values]
+    prior_mean = float(np.mean(observed)) if observed else 0.5
+    variance = float(np.var(observed)) if len(observed) > 1 else PRIOR_VARIANCE
+    variance = max(variance, 1e-4)
+
+    draws = np.column_stack([
+        rng.normal(np.mean(values), math.sqrt(variance / len(values)), samples) if values
+        else rng.normal(prior_mean, math.sqrt(variance), samples)
+        for values in scores.values()
+    ])
+    wins = np.bincount(draws.argmax(axis=1), minlength=len(scores)) / samples
+
+    return {variant_id: float(p) for variant_id, p in zip(scores, wins)}
+
+
+class AdaptiveVariantRunner(VariantRunner):
+    """VariantRunner that stops spending calls once the winner is clear"""
+
+    def __init__(self, tester, config: Optional[Dict] = None, client: Optional[AgentClient] = None,
+                 cache_prefix: bool = True, max_workers: int = 4, strategy: str = 'thompson',
+                 confidence: float = 0.95, min_iterations: int = 2, samples: int = 2000,
+                 seed: Optional[int] = None, checkpoints: Optional[CheckpointStore] = None):
+        super().__init__(tester, config=config, client=client, cache_prefix=cache_prefix,
+                         max_workers=max_workers, checkpoints=checkpoints)
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy} (expected one of {', '.join(STRATEGIES)})")
+
+        self.strategy = strategy
+        self.confidence = confidence
+        self.min_iterations = min_iterations
+        self.samples = samples
+        self.rng = np.random.default_rng(seed)
+
+    def settings(self) -> Dict:
+        return {
+            'type': 'adaptive',
+            'cache_prefix': self.cache_prefix,
+            'strategy': self.strategy,
+            'confidence': self.confidence,
+            'min_iterations': self.min_iterations
+        }
+
+    def resume(self, run_id: str, on_progress: Optional[Callable[[int, int], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Dict:
+        """Run (or continue) a checkpointed run adaptively and return results in the PromptTester format"""
+        run = self.checkpoints.open(run_id)
+        header = run.header
+        agent_name, variants, iterations = header['agent_name'], header['variants'], header['iterations']
+        ground_truth = header['ground_truth']
+
+        # Checkpointed successes count towards the budget; failed calls are not kept
+        outputs = {variant_id: [] for variant_id in header['variant_ids']}
+        scores = {variant_id: [] for variant_id in header['variant_ids']}
+        next_index = {variant_id: 0 for variant_id in header['variant_ids']}
+        for (variant_id, index), result in sorted(run.calls.items(), key=lambda item: item[0][1]):
+            next_index[variant_id] = max(next_index[variant_id], index + 1)
+            if result and result.get('success'):
+                outputs[variant_id].append(result)
+                scores[variant_id].append(call_score(result, ground_truth))
+
+        budget = iterations * len(variants)
+        min_iterations = min(self.min_iterations, iterations)
+        lock = threading.Lock()
+        start = time.time()
+
+        def cancelled() -> bool:
+            return cancel is not None and cancel.is_set()
+
+        def run_one(variant_id: str):
+            with lock:
+                index = next_index[variant_id]
+                next_index[variant_id] += 1
+            result = self.call(run, agent_name, variants[variant_id], header['input_data'], variant_id, index)
+            with lock:
+                outputs[variant_id].append(result)
+                scores[variant_id].append(call_score(result, ground_truth))
+                done = sum(len(calls) for calls in outputs.values())
+            if on_progress:
+                on_progress(done, budget)
+
+        def run_all(variant_ids: List[str]):
+            self.schedule(variant_ids, run_one, cancel, warm_first=False)
+
+        # The first call writes the shared prefix to the cache; the rest read it
+        if not cancelled() and not any(outputs.values()):
+            run_one(next(iter(variants)))
+
+        if self.strategy == 'halving':
+            probabilities = self.successive_halving(scores, run_all, iterations, min_iterations, cancelled)
+        else:
+            probabilities = self.thompson(scores, run_all, iterations, min_iterations, cancelled)
+
+        results = self.assemble(agent_name, variants, outputs, iterations, ground_truth, time.time() - start)
+
+        calls_made = sum(len(calls) for calls in outputs.values())
+        # The winner is decided by the statistic the run stopped on, not the variant-level composite
+        leader = max(probabilities, key=probabilities.get)
+        results['winner'] = dict(
+            results['winner'],
+            variant_id=leader,
+            variant_name=variants[leader]['name'],
+            composite_score=results['winner']['all_scores'][leader]
+        )
+        results['adaptive'] = {
+            'strategy': self.strategy,
+            'confidence': self.confidence,
+            'leader': leader,
+            'leader_probability': probabilities[leader],
+            'probability_best': probabilities,
+            'stopped_early': calls_made < budget,
+            'calls_made': calls_made,
+            'calls_budget': budget,
+            'calls_saved': budget - calls_made,
+            'iterations_per_variant': {variant_id: len(calls) for variant_id, calls in outputs.items()}
+        }
+
+        return self.finish(run, results, cancelled=cancelled())
+
+    def confident(self, probabilities: Dict[str, float]) -> bool:
+        return max(probabilities.values()) >= self.confidence
+
+    def thompson(self, scores: Dict[str, List[float]], run_all: Callable, iterations: int,
+                 min_iterations: int, cancelled: Callable[[], bool] = lambda: False) -> Dict[str, float]:
+        """Allocate calls one round (max_workers calls) at a time by Thompson sampling"""
+        while True:
+            probabilities = probability_best(scores, self.samples, self.rng)
+            counts = {variant_id: len(values) for variant_id, values in scores.items()}
+
+            if cancelled() or (min(counts.values()) >= min_iterations and self.confident(probabilities)):
+                return probabilities
+
+            round_jobs = []
+            for _ in range(self.max_workers):
+                eligible = [v for v in counts if counts[v] < iterations]
+                if not eligible:
+                    break
+
+                # Every variant gets its minimum before sampling takes over
+                under = [v for v in eligible if counts[v] < min_iterations]
+                if under:
+                    choice = min(under, key=counts.get)
+                else:
+                    draws = probability_best({v: scores[v] for v in eligible}, 1, self.rng)
+                    choice = max(draws, key=draws.get)
+
+                round_jobs.append(choice)
+                counts[choice] += 1
+
+            if not round_jobs:
+                return probabilities
+            run_all(round_jobs)
+
+    def successive_halving(self, scores: Dict[str, List[float]], run_all: Callable, iterations: int,
+                           min_iterations: int, cancelled: Callable[[], bool] = lambda: False) -> Dict[str, float]:
+        """Run surviving variants to a doubling iteration target, dropping the bottom half each round"""
+        active = list(scores)
+        target = max(1, min_iterations)
+
+        while True:
+            run_all([v for v in active for _ in range(target - len(scores[v]))])
+
+            probabilities = probability_best(scores, self.samples, self.rng)
+            if cancelled() or target >= iterations or len(active) == 1 or self.confident(probabilities):
+                return probabilities
+
+            active.sort(key=lambda v: np.mean(scores[v]), reverse=True)
+            active = active[:math.ceil(len(active) / 2)]
+            target = min(iterations, target * 2)
+
+
+def resume_runner(tester, run_id: str, config: Optional[Dict] = None, client: Optional[AgentClient] = None,
+                  checkpoints: Optional[CheckpointStore] = None) -> VariantRunner:
+    """Runner matching the settings a checkpointed run was started with"""
+    checkpoints = checkpoints or CheckpointStore()
+    settings = checkpoints.open(run_id).header.get('runner', {})
+    options = {'config': config, 'client': client, 'cache_prefix': settings.get('cache_prefix', True),
+               'checkpoints': checkpoints}
+
+    if settings.get('type') == 'adaptive':
+        return AdaptiveVariantRunner(tester, strategy=settings['strategy'], confidence=settings['confidence'],
+                                     min_iterations=settings['min_iterations'], **options)
+    return VariantRunner(tester, **options)
+
+
+def format_adaptive_report(report: Dict) -> str:
+    leader_p = report['leader_probability']
+    status = "stopped early" if report['stopped_early'] else "ran full budget"
+    return (
+        f"Adaptive ({report['strategy']}): {status}, {report['calls_made']}/{report['calls_budget']} calls "
+        f"({report['calls_saved']} saved)\n"
+        f"  Winner {report['leader']} is best with probability {leader_p:.1%} "
+        f"(threshold {report['confidence']:.0%})\n"
+        f"  Calls per variant: "
+        + ', '.join(f"{v}={n}" for v, n in report['iterations_per_variant'].items())
+    )
@@ -0,0 +1,323 @@
+"""
+Direct Messages API access for workflow agents.
+
+Builds agent and synthesis requests from the WorkflowEngine config, runs them
+either as a single call or as a token stream, and parses the labelled
+sections of an answer (e.g. "KEY STRENGTH: ...") into the same structured
+`output` dict the apps already display. The parser is incremental so partial
+fields can be shown while a response is still arriving.
+
+Every request starts with the same document/context block, marked as a
+prompt-cache breakpoint, followed by the agent- or variant-specific system
+prompt. All agents and A/B variants for one document therefore share a
+cached prefix, and tokens_used records the cache reads and writes per call.
+Every attempt is also recorded in orchestrator.telemetry, and traced as an
+agent.call / agent.stream span when a trace is running (orchestrator.tracing).
+"""
+
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+import anthropic
+
+from orchestrator.telemetry import TELEMETRY
+from orchestrator.tracing import span, start_span
+
+
+DEFAULT_MODEL = 'claude-sonnet-4-20250514'
+
+SHARED_PREAMBLE = "You are part of a multi-agent marketing analysis team. This is the material under review."
+
+AGENT_INSTRUCTION = "Analyse the document above from your perspective, using short labelled headings such as 'KEY STRENGTH:'."
+
+# A labelled section starts a line: "KEY STRENGTH:", "**Key Strength:**", "## Key Strength:"
+HEADING_PATTERN = re.compile(
+    r'^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?([A-Za-z][A-Za-z&/\- ]{1,48}?)(?:\*\*)?[ \t]*:(?:\*\*)?[ \t]*',
+    re.MULTILINE
+)
+
+MAX_HEADING_WORDS = 5
+
+
+def field_key(heading: str) -> str:
+    """'Key Strength' -> 'key_strength'"""
+    return re.sub(r'[^a-z0-9]+', '_', heading.strip().lower()).strip('_')
+
+
+class StructuredOutputParser:
+    """Incrementally splits a response into labelled fields as text arrives"""
+
+    def __init__(self):
+        self.text = ''
+        self.headings = []  # (key, heading start, body start)
+        self.scanned = 0
+
+    def feed(self, delta: str) -> Dict:
+        """Append a chunk of text and return the fields parsed so far"""
+        self.text += delta
+
+        # A heading is only recognisable once its colon has arrived, so rescan
+        # from the start of the line where the previous scan stopped
+        line_start = self.text.rfind('\n', 0, self.scanned) + 1
+        last_end = self.headings[-1][2] if self.headings else 0
+
+        for match in HEADING_PATTERN.finditer(self.text, line_start):
+            if match.start() < last_end:
+                continue
+            heading = match.group(1)
+            if len(heading.split()) > MAX_HEADING_WORDS:
+                continue
+            self.headings.append((field_key(heading), match.start(), match.end()))
+            last_end = match.end()
+
+        self.scanned = len(self.text)
+        return self.fields()
+
+    def fields(self) -> Dict:
+        if not self.headings:
+            text = self.text.strip()
+            return {'analysis': text} if text else {}
+
+        fields = {}
+        for i, (key, _, body_start) in enumerate(self.headings):
+            body_end = self.headings[i + 1][1] if i + 1 < len(self.headings) else len(self.text)
+            value = self.text[body_start:body_end].lstrip("* \t").strip()
+            fields[key] = f"{fields[key]}\n{value}" if key in fields else value
+
+        return fields
+
+
+def parse_structured_output(text: str) -> Dict:
+    """Parse a complete response into labelled fields plus the raw text"""
+    output = StructuredOutputParser().feed(text)
+    output['raw_response'] = text
+    return output
+
+
+def format_input(input_data: Dict) -> str:
+    """Render the document and optional context as the user turn"""
+    message = f"DOCUMENT:\n{input_data.get('document', '').strip()}"
+    if input_data.get('context'):
+        message += f"\n\nCONTEXT:\n{input_data['context'].strip()}"
+    return message
+
+
+def shared_prefix(input_data: Dict, cache_prefix: bool = True) -> List[Dict]:
+    """System blocks common to every request about this document"""
+    block = {'type': 'text', 'text': f"{SHARED_PREAMBLE}\n\n{format_input(input_data)}"}
+    if cache_prefix:
+        block['cache_control'] = {'type': 'ephemeral'}
+    return [block]
+
+
+def usage_tokens(usage) -> Dict:
+    """tokens_used breakdown for one call, including prompt-cache traffic"""
+    tokens = {
+        'input_tokens': usage.input_tokens,
+        'output_tokens': usage.output_tokens,
+        'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', None) or 0,
+        'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', None) or 0
+    }
+    tokens['total'] = sum(tokens.values())
+    return tokens
+
+
+def configured_prompt(section: Dict, label: str) -> str:
+    """The system prompt of an engine config section; the engine's prompts are used as-is, never made up"""
+    system_prompt = section.get('system_prompt') or section.get('parameters', {}).get('system_prompt')
+    if not system_prompt:
+        raise ValueError(f"No system_prompt for {label} in the workflow config")
+    return system_prompt
+
+
+def model_parameters(config: Dict, agent_name: str) -> Dict:
+    """Model, temperature and max_tokens for one agent from the engine config"""
+    parameters = config['agents'][agent_name].get('parameters', {})
+    return {
+        'model': parameters.get('model', DEFAULT_MODEL),
+        'temperature': parameters.get('temperature', 0.3),
+        'max_tokens': parameters.get('max_tokens', 1500)
+    }
+
+
+def agent_parameters(config: Dict, agent_name: str) -> Dict:
+    """Model parameters and system prompt for one agent from the engine config"""
+    return dict(model_parameters(config, agent_name),
+                system_prompt=configured_prompt(config['agents'][agent_name], agent_name))
+
+
+def synthesis_prompt(config: Dict) -> str:
+    """The engine config's synthesis (executive brief) system prompt"""
+    return configured_prompt(config.get('synthesis', {}), 'synthesis')
+
+
+def phase1_agents(config: Dict) -> List[str]:
+    """Agents that analyse the document directly (everything outside phase 2)"""
+    return [name for name, agent_config in config['agents'].items() if agent_config.get('phase', 1) == 1]
+
+
+def build_agent_request(params: Dict, input_data: Dict, cache_prefix: bool = True) -> Dict:
+    return {
+        'model': params['model'],
+        'max_tokens': params['max_tokens'],
+        'temperature': params['temperature'],
+        'system': shared_prefix(input_data, cache_prefix) + [{'type': 'text', 'text': params['system_prompt']}],
+        'messages': [{'role': 'user', 'content': AGENT_INSTRUCTION}]
+    }
+
+
+def format_analyses(results: Dict) -> List[str]:
+    """'### Agent Name' plus its labelled sections, for each successful result"""
+    analyses = []
+    for agent_name, result in results.items():
+        if not result.get('success'):
+            continue
+        sections = [
+            f"{key.replace('_', ' ').upper()}: {value}"
+            for key, value in result['output'].items()
+            if not key.startswith('_') and key != 'raw_response'
+        ]
+        analyses.append(f"### {agent_name.replace('_', ' ').title()}\n" + '\n'.join(sections))
+    return analyses
+
+
+def build_synthesis_request(config: Dict, input_data: Dict, phase1_results: Dict,
+                            cache_prefix: bool = True, cache_analyses: int = 0) -> Dict:
+    """
+    Request that turns the phase-1 agent outputs into the final brief.
+
+    With cache_analyses, each analysis is its own content block and the block
+    of analysis number cache_analyses carries the one prompt-cache breakpoint,
+    caching the prompt up to and including it, so a synthesis prompt built
+    from results in arrival order can be cached before the last agent
+    finishes (see StreamingWorkflow pipeline_synthesis).
+    """
+    synthesis = config.get('synthesis', {}).get('parameters', {})
+    first_agent = next(iter(config['agents'].values()), {}).get('parameters', {})
+
+    analyses = format_analyses(phase1_results)
+    content = "AGENT ANALYSES:\n\n" + '\n\n'.join(analyses)
+    if cache_analyses and analyses:
+        # Separators lead each block so a block's text is the same whether or not more follow
+        content = [{'type': 'text', 'text': ("AGENT ANALYSES:\n\n" if i == 0 else '\n\n') + analysis}
+                   for i, analysis in enumerate(analyses)]
+        content[min(cache_analyses, len(content)) - 1]['cache_control'] = {'type': 'ephemeral'}
+
+    return {
+        'model': synthesis.get('model', first_agent.get('model', DEFAULT_MODEL)),
+        'max_tokens': synthesis.get('max_tokens', 2000),
+        'temperature': synthesis.get('temperature', 0.3),
+        'system': shared_prefix(input_data, cache_prefix) + [{'type': 'text', 'text': synthesis_prompt(config)}],
+        'messages': [{
+            'role': 'user',
+            'content': content
+        }]
+    }
+
+
+def result_attributes(result: Dict) -> Dict:
+    """Trace span attributes of a call result"""
+    tokens = result.get('tokens_used') or {}
+    return {
+        'success': bool(result.get('success')),
+        'error_type': result.get('error_type'),
+        'input_tokens': tokens.get('input_tokens'),
+        'output_tokens': tokens.get('output_tokens'),
+        'cache_read_tokens': tokens.get('cache_read_input_tokens')
+    }
+
+
+class AgentClient:
+    """Runs agent requests against the Messages API and shapes results like phase1_results"""
+
+    def __init__(self, client: Optional[anthropic.Anthropic] = None):
+        self.client = client or anthropic.Anthropic()
+
+    def call(self, agent_name: str, request: Dict) -> Dict:
+        """Single blocking call"""
+        start = time.time()
+
+        with span('agent.call', agent=agent_name, model=request['model']) as call_span:
+            try:
+                response = self.client.messages.create(**request)
+            except anthropic.APIError as e:
+                result = self.failure(request, start, e)
+            else:
+                text = ''.join(block.text for block in response.content if block.type == 'text')
+                with span('agent.parse', characters=len(text)):
+                    result = self.success(request, start, text, response.usage)
+            call_span.set(**result_attributes(result))
+
+        TELEMETRY.record_call(agent_name, result)
+        return result
+
+    def stream(self, agent_name: str, request: Dict) -> Iterator[Dict]:
+        """
+        Stream a call, yielding events as tokens arrive:
+            {'type': 'delta', 'agent', 'text', 'fields'} for every chunk
+            {'type': 'done', 'agent', 'result'} once at the end
+        """
+        start = time.time()
+        parser = StructuredOutputParser()
+        first_token = None
+        # Not made current: the consumer's code runs between our yields
+        stream_span = start_span('agent.stream', agent=agent_name, model=request['model'])
+
+        try:
+            with self.client.messages.stream(**request) as stream:
+                for delta in stream.text_stream:
+                    if first_token is None:
+                        first_token = time.time() - start
+                    yield {
+                        'type': 'delta',
+                        'agent': agent_name,
+                        'text': delta,
+                        'fields': parser.feed(delta)
+                    }
+                message = stream.get_final_message()
+        except anthropic.APIError as e:
+            result = self.failure(request, start, e)
+            stream_span.set(**result_attributes(result))
+            stream_span.end()
+            TELEMETRY.record_call(agent_name, result)
+            yield {'type': 'done', 'agent': agent_name, 'result': result}
+            return
+
+        parse_span = stream_span.child('agent.parse', characters=len(parser.text))
+        result = self.success(request, start, parser.text, message.usage)
+        parse_span.end()
+        result['time_to_first_token'] = first_token
+        stream_span.set(time_to_first_token=first_token, **result_attributes(result))
+        stream_span.end()
+        TELEMETRY.record_call(agent_name, result)
+        yield {'type': 'done', 'agent': agent_name, 'result': result}
+
+    @staticmethod
+    def success(request: Dict, start: float, text: str, usage) -> Dict:
+        return {
+            'success': True,
+            'output': parse_structured_output(text),
+            'execution_time': time.time() - start,
+            'tokens_used': usage_tokens(usage),
+            'model': request['model']
+        }
+
+    @staticmethod
+    def failure(request: Dict, start: float, error: Exception) -> Dict:
+        result = {
+            'success': False,
+            'error': str(error),
+            'error_type': type(error).__name__,
+            'execution_time': time.time() - start,
+            'model': request['model']
+        }
+
+        # Kept so callers can tell transient failures (429/5xx/connection) from bad requests
+        if getattr(error, 'status_code', None):
+            result['status_code'] = error.status_code
+        response = getattr(error, 'response', None)
+        if response is not None and response.headers.get('retry-after'):
+            result['retry_after'] = response.headers['retry-after']
+
+        return result
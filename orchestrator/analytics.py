@@ -0,0 +1,298 @@
+"""
+Cross-test analytics over the saved A/B test history.
+
+Every saved A/B test is flattened into two columnar tables:
+
+    variants - one row per test x variant (composite score, metrics, winner flag)
+    calls    - one row per iteration call (latency, success)
+
+The tables are cached under outputs/analytics/ (Parquet when pyarrow is
+installed, pickle otherwise) and refreshed incrementally against the results
+index: only tests saved since the last refresh are read from the store, and
+tests removed from the index are dropped. The paths already read are kept in
+a third table, so tests that contribute no rows are not read again. One
+TestHistory may be shared between threads (the app shares one across
+sessions); refresh() is serialised by a lock. Win rates, score distributions and
+latency percentiles per variant are then plain pandas group-bys, as are the
+box-plot statistics and the bucketed score trend the Analytics charts are
+drawn from (orchestrator.charts), so the browser never gets one point per test.
+
+    history = TestHistory()
+    history.refresh()
+    history.win_rates(agent='strategic_analyst')
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from orchestrator.metrics import COMPOSITE_WEIGHTS, composite_score
+from orchestrator.results_index import AB_TEST, ResultsIndex
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DIR = 'outputs/analytics'
+
+METRIC_COLUMNS = list(COMPOSITE_WEIGHTS) + ['avg_execution_time', 'success_rate']
+
+VARIANT_COLUMNS = ['path', 'created_at', 'agent_name', 'variant_id', 'variant_name',
+                   'composite_score', 'is_winner', 'iterations', 'adaptive', 'batch'] + METRIC_COLUMNS
+
+CALL_COLUMNS = ['path', 'created_at', 'agent_name', 'variant_id', 'variant_name', 'execution_time', 'success']
+
+CATEGORY_COLUMNS = ['agent_name', 'variant_id', 'variant_name']
+
+TEST_COLUMNS = ['path']
+
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+TREND_MAX_POINTS = 2000
+
+
+def test_rows(path: str, created_at: float, results: Dict) -> Tuple[List[Dict], List[Dict]]:
+    """Variant and call rows for one saved A/B test"""
+    agent_name = results.get('agent_name')
+    winner = results.get('winner', {})
+    all_scores = winner.get('all_scores', {})
+    variants, calls = [], []
+
+    for variant_id, data in results.get('results', {}).items():
+        metrics = data.get('metrics', {})
+        variant_name = data.get('config', {}).get('name', variant_id)
+        outputs = [call for call in data.get('outputs', []) if call]
+
+        row = {
+            'path': path,
+            'created_at': created_at,
+            'agent_name': agent_name,
+            'variant_id': variant_id,
+            'variant_name': variant_name,
+            'composite_score': all_scores.get(variant_id, composite_score(metrics)),
+            'is_winner': variant_id == winner.get('variant_id'),
+            'iterations': len(outputs),
+            'adaptive': 'adaptive' in results,
+            'batch': 'batch_run_id' in results
+        }
+        row.update({name: metrics.get(name) for name in METRIC_COLUMNS})
+        variants.append(row)
+
+        for call in outputs:
+            calls.append({
+                'path': path,
+                'created_at': created_at,
+                'agent_name': agent_name,
+                'variant_id': variant_id,
+                'variant_name': variant_name,
+                'execution_time': call.get('execution_time'),
+                'success': bool(call.get('success'))
+            })
+
+    return variants, calls
+
+
+def as_table(rows: List[Dict], columns: List[str]) -> pd.DataFrame:
+    table = pd.DataFrame(rows, columns=columns)
+    for column in CATEGORY_COLUMNS:
+        table[column] = table[column].astype('category')
+    return table
+
+
+class TestHistory:
+    """Columnar, incrementally refreshed table of every saved A/B test"""
+
+    def __init__(self, index: Optional[ResultsIndex] = None, cache_dir: str = ANALYTICS_DIR):
+        self.index = index or ResultsIndex()
+        self.cache_dir = cache_dir
+        self.extension = '.parquet' if pyarrow else '.pkl'
+
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.variants = self.read_cache('variants', VARIANT_COLUMNS)
+        self.calls = self.read_cache('calls', CALL_COLUMNS)
+        # Every test read so far, including ones without variant rows (caches from before
+        # this table existed only know the tests that have rows)
+        self.processed = set(self.read_cache('tests', TEST_COLUMNS)['path']) | set(self.variants['path'])
+        # Bumped whenever refresh() changes the tables; a cache key for anything derived from them
+        self.version = 0
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def cache_path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, f"{name}{self.extension}")
+
+    def read_cache(self, name: str, columns: List[str]) -> pd.DataFrame:
+        path = self.cache_path(name)
+        if os.path.exists(path):
+            try:
+                return pd.read_parquet(path) if pyarrow else pd.read_pickle(path)
+            except Exception as e:
+                logger.warning("Rebuilding analytics cache (%s): %s", name, e)
+        return pd.DataFrame(columns=columns) if name == 'tests' else as_table([], columns)
+
+    def write_cache(self, name: str, table: pd.DataFrame):
+        path = self.cache_path(name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if pyarrow:
+            table.to_parquet(tmp_path, index=False)
+        else:
+            table.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def refresh(self) -> Dict:
+        """Add tests saved since the last refresh and drop ones no longer indexed"""
+        with self.lock:
+            entries = self.index.entries(AB_TEST)
+
+            new_entries = [entry for entry in entries if entry['path'] not in self.processed]
+            removed = self.processed - {entry['path'] for entry in entries}
+
+            if not new_entries and not removed:
+                return {'added': 0, 'removed': 0, 'skipped': 0}
+
+            variant_rows, call_rows, read, skipped = [], [], [], []
+            # Loose files one at a time and each segment in one read, so a bad file only loses itself
+            groups = {}
+            for entry in new_entries:
+                groups.setdefault(entry.get('segment') or entry['path'], []).append(entry)
+            for group in groups.values():
+                try:
+                    for entry, results in self.index.load_many(group):
+                        variants, calls = test_rows(entry['path'], entry['created_at'], results)
+                        variant_rows.extend(variants)
+                        call_rows.extend(calls)
+                        read.append(entry['path'])
+                except (FileNotFoundError, ValueError, KeyError) as e:
+                    # Gone or unparseable for good: recorded as processed so it isn't read again
+                    logger.warning("Skipping %d test(s) in analytics: %s", len(group), e)
+                    skipped.extend(entry['path'] for entry in group if entry['path'] not in read)
+                except OSError as e:
+                    logger.warning("Analytics will retry %d test(s) on the next refresh: %s", len(group), e)
+
+            if not read and not skipped and not removed:
+                # Nothing loaded: the tables, the cache and so the version stay as they were
+                return {'added': 0, 'removed': 0, 'skipped': 0}
+
+            self.variants = self.merge(self.variants, variant_rows, removed, VARIANT_COLUMNS)
+            self.calls = self.merge(self.calls, call_rows, removed, CALL_COLUMNS)
+            self.processed = (self.processed - removed) | set(read) | set(skipped)
+
+            self.write_cache('variants', self.variants)
+            self.write_cache('calls', self.calls)
+            self.write_cache('tests', pd.DataFrame({'path': sorted(self.processed)}, columns=TEST_COLUMNS))
+            self.version += 1
+
+            return {'added': len(read), 'removed': len(removed), 'skipped': len(skipped)}
+
+    @staticmethod
+    def merge(table: pd.DataFrame, rows: List[Dict], removed: set, columns: List[str]) -> pd.DataFrame:
+        if removed:
+            table = table[~table['path'].isin(removed)]
+        if rows:
+            # Concatenating categoricals with different categories falls back to object
+            tables = [table.astype({c: 'object' for c in CATEGORY_COLUMNS}), as_table(rows, columns)]
+            # An empty table's columns are untyped; keep the new rows' float/bool dtypes
+            table = pd.concat([t for t in tables if len(t)], ignore_index=True).infer_objects()
+            for column in CATEGORY_COLUMNS:
+                table[column] = table[column].astype('category')
+        return table.reset_index(drop=True)
+
+    # ------------------------------------------------------------------
+    # Aggregates
+    # ------------------------------------------------------------------
+
+    @property
+    def test_count(self) -> int:
+        return self.variants['path'].nunique()
+
+    def agents(self) -> List[str]:
+        return sorted(self.variants['agent_name'].dropna().unique())
+
+    @staticmethod
+    def select(table: pd.DataFrame, agent: Optional[str] = None, since: Optional[float] = None) -> pd.DataFrame:
+        if agent:
+            table = table[table['agent_name'] == agent]
+        if since is not None:
+            table = table[table['created_at'] >= since]
+        return table
+
+    def win_rates(self, agent: Optional[str] = None, since: Optional[float] = None) -> pd.DataFrame:
+        """Tests entered, wins, win rate and mean composite score per variant"""
+        table = self.select(self.variants, agent, since)
+        rates = table.groupby(CATEGORY_COLUMNS, observed=True).agg(
+            tests=('path', 'nunique'),
+            wins=('is_winner', 'sum'),
+            mean_score=('composite_score', 'mean')
+        ).reset_index()
+        rates['win_rate'] = rates['wins'] / rates['tests']
+        return rates.sort_values(['agent_name', 'win_rate', 'mean_score'], ascending=[True, False, False],
+                                 ignore_index=True)
+
+    def score_distribution(self, agent: Optional[str] = None, since: Optional[float] = None,
+                           metric: str = 'composite_score') -> pd.DataFrame:
+        """Mean, spread and quartiles of a score per variant"""
+        table = self.select(self.variants, agent, since)
+        grouped = table.groupby(CATEGORY_COLUMNS, observed=True)[metric]
+        quantiles = grouped.quantile([0.1, 0.25, 0.5, 0.75, 0.9]).unstack()
+        quantiles.columns = ['p10', 'p25', 'p50', 'p75', 'p90']
+        return grouped.agg(['count', 'mean', 'std', 'min', 'max']).join(quantiles).reset_index()
+
+    def latency_percentiles(self, agent: Optional[str] = None, since: Optional[float] = None,
+                            percentiles: Sequence[int] = DEFAULT_PERCENTILES) -> pd.DataFrame:
+        """Per-call latency percentiles of successful calls per variant"""
+        table = self.select(self.calls, agent, since)
+        table = table[table['success']]
+        grouped = table.groupby(CATEGORY_COLUMNS, observed=True)['execution_time']
+        latency = grouped.quantile([p / 100 for p in percentiles]).unstack()
+        latency.columns = [f"p{p}" for p in percentiles]
+        return grouped.agg(calls='count', mean='mean').join(latency).reset_index()
+
+    def score_boxes(self, agent: Optional[str] = None, since: Optional[float] = None,
+                    metric: str = 'composite_score') -> pd.DataFrame:
+        """Quartiles, mean and Tukey whiskers (furthest scores within 1.5 IQR) per variant"""
+        table = self.select(self.variants, agent, since)[CATEGORY_COLUMNS + [metric]].dropna()
+        grouped = table.groupby(CATEGORY_COLUMNS, observed=True)[metric]
+        boxes = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+        boxes.columns = ['q1', 'median', 'q3']
+        boxes = grouped.agg(['count', 'mean']).join(boxes).reset_index()
+
+        table = table.merge(boxes[CATEGORY_COLUMNS + ['q1', 'q3']], on=CATEGORY_COLUMNS)
+        spread = 1.5 * (table['q3'] - table['q1'])
+        inside = table[(table[metric] >= table['q1'] - spread) & (table[metric] <= table['q3'] + spread)]
+        fences = inside.groupby(CATEGORY_COLUMNS, observed=True)[metric].agg(lowerfence='min', upperfence='max')
+        return boxes.merge(fences.reset_index(), on=CATEGORY_COLUMNS)
+
+    def score_trend(self, agent: Optional[str] = None, since: Optional[float] = None,
+                    max_points: int = TREND_MAX_POINTS) -> pd.DataFrame:
+        """
+        Composite score over time per variant; above max_points rows, the mean
+        per time bucket (tests = how many scores each point averages).
+        """
+        table = self.select(self.variants, agent, since)[['created_at', 'agent_name', 'variant_name',
+                                                          'composite_score']].dropna()
+        if len(table) > max_points:
+            series = table.groupby(['agent_name', 'variant_name'], observed=True).ngroups
+            buckets = max(max_points // max(series, 1), 1)
+            span = table['created_at'].max() - table['created_at'].min()
+            width = span / buckets if span else 1.0
+            table = table.assign(created_at=table['created_at'].min() + (
+                (table['created_at'] - table['created_at'].min()) // width) * width)
+            table = table.groupby(['agent_name', 'variant_name', 'created_at'], observed=True).agg(
+                composite_score=('composite_score', 'mean'),
+                tests=('composite_score', 'size')
+            ).reset_index()
+        else:
+            table = table.assign(tests=1)
+        table['created_at'] = pd.to_datetime(table['created_at'], unit='s')
+        return table.sort_values('created_at', ignore_index=True)
@@ -0,0 +1,320 @@
+"""
+Batch submission mode for large A/B test runs.
+
+Packs every document x variant x iteration request into Message Batches jobs
+(half price, asynchronous), persists the run state to outputs/batches/ so a
+restarted process can pick up where it left off, polls with exponential
+backoff and reassembles the answers into the usual PromptTester results,
+saved through save_test_results (and added to the results index).
+
+    batch = BatchPromptTester(PromptTester())
+    run_id = batch.submit('strategic_analyst', [{'input_data': {...}}], iterations=10)
+    batch.wait(run_id)
+    batch.collect(run_id)
+
+    # After a restart
+    batch.resume()
+
+Before each batches.create the ids of the requests being sent are saved as
+the run's pending chunk. If the process dies before the batch id is recorded,
+resume looks the batch up in batches.list (created after the marker, same
+request count, and the same custom ids once its results are available)
+instead of submitting the chunk twice.
+
+Progress goes to the orchestrator.batch_tester logger.
+"""
+
+import glob
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import anthropic
+
+from orchestrator.agent_client import AgentClient
+from orchestrator.results_index import ResultsIndex, save_test
+from orchestrator.telemetry import TELEMETRY, labelled
+from orchestrator.variant_runner import VariantRunner
+
+
+BATCH_STATE_DIR = 'outputs/batches'
+
+# Allowed clock difference between this machine and the API when matching a pending chunk
+CLOCK_SKEW = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+
+def custom_id(test_index: int, variant_index: int, iteration: int) -> str:
+    return f"t{test_index}-v{variant_index}-i{iteration}"
+
+
+def parse_custom_id(value: str) -> Tuple[int, int, int]:
+    test, variant, iteration = value.split('-')
+    return int(test[1:]), int(variant[1:]), int(iteration[1:])
+
+
+class BatchPromptTester:
+    """Runs PromptTester A/B tests through the Message Batches API, resumably"""
+
+    def __init__(self, tester, config: Optional[Dict] = None, client: Optional[anthropic.Anthropic] = None,
+                 state_dir: str = BATCH_STATE_DIR, max_batch_size: int = 10000, cache_prefix: bool = True,
+                 poll_initial: float = 5.0, poll_max: float = 300.0):
+        self.tester = tester
+        self.runner = VariantRunner(tester, config=config, cache_prefix=cache_prefix)
+        self.client = client or anthropic.Anthropic()
+        self.state_dir = state_dir
+        self.max_batch_size = max_batch_size
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.index = ResultsIndex()
+
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Run state
+    # ------------------------------------------------------------------
+
+    def state_path(self, run_id: str) -> str:
+        return os.path.join(self.state_dir, f"{run_id}.json")
+
+    def load_state(self, run_id: str) -> Dict:
+        with open(self.state_path(run_id), 'r') as f:
+            return json.load(f)
+
+    def save_state(self, state: Dict):
+        path = self.state_path(state['run_id'])
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def pending_runs(self) -> List[str]:
+        """Run ids that have not been fully collected yet"""
+        run_ids = []
+        for path in sorted(glob.glob(os.path.join(self.state_dir, 'batch_*.json'))):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if state['status'] != 'complete':
+                run_ids.append(state['run_id'])
+        return run_ids
+
+    # ------------------------------------------------------------------
+    # Submit / poll / collect
+    # ------------------------------------------------------------------
+
+    def build_requests(self, state: Dict) -> List[Dict]:
+        """Batch requests for a run, in a fixed order so submission can resume midway"""
+        requests = []
+        for t, test in enumerate(state['tests']):
+            for v, variant_id in enumerate(state['variant_ids']):
+                variant_config = state['variants'][variant_id]
+                for i in range(state['iterations']):
+                    requests.append({
+                        'custom_id': custom_id(t, v, i),
+                        'params': self.runner.build_request(state['agent_name'], variant_config, test['input_data'])
+                    })
+        return requests
+
+    def submit(self, agent_name: str, tests: List[Dict], iterations: int = 3) -> str:
+        """
+        Submit a run. Each test is {'input_data': {...}, 'ground_truth': {...} (optional)}.
+        Returns the run id used to poll, collect or resume it.
+        """
+        if iterations < 1:
+            raise ValueError(f"iterations must be at least 1, got {iterations}")
+        variants = self.tester.variants[agent_name]['variants']
+        run_id = f"batch_{agent_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+        # Persist before submitting anything so a crash mid-submit can be resumed
+        state = {
+            'run_id': run_id,
+            'agent_name': agent_name,
+            'iterations': iterations,
+            'variant_ids': list(variants),
+            'variants': variants,
+            'tests': tests,
+            'created_at': datetime.now().isoformat(),
+            'status': 'submitting',
+            'submitted': 0,
+            'pending': None,
+            'batches': [],
+            'saved': []
+        }
+        self.save_state(state)
+        self.submit_pending(state)
+
+        return run_id
+
+    def submit_pending(self, state: Dict):
+        """Submit whatever part of the run has not been sent yet"""
+        requests = self.build_requests(state)
+
+        if state.get('pending'):
+            batch = self.find_pending_batch(state)
+            if batch:
+                logger.info("Recovered batch %s (%d requests) submitted before a restart",
+                            batch.id, len(state['pending']['custom_ids']))
+                self.record_batch(state, batch, len(state['pending']['custom_ids']))
+            else:
+                state['pending'] = None
+                self.save_state(state)
+
+        while state['submitted'] < len(requests):
+            chunk = requests[state['submitted']:state['submitted'] + self.max_batch_size]
+
+            # Mark the chunk as in flight, so a crash before its id is saved can be reconciled
+            state['pending'] = {
+                'custom_ids': [request['custom_id'] for request in chunk],
+                'created_after': datetime.now(timezone.utc).isoformat()
+            }
+            self.save_state(state)
+
+            batch = self.client.messages.batches.create(requests=chunk)
+            self.record_batch(state, batch, len(chunk))
+            logger.info("Submitted batch %s (%d requests)", batch.id, len(chunk))
+
+        state['status'] = 'submitted'
+        self.save_state(state)
+
+    def record_batch(self, state: Dict, batch, size: int):
+        state['batches'].append({'id': batch.id, 'requests': size, 'status': batch.processing_status})
+        state['submitted'] += size
+        state['pending'] = None
+        self.save_state(state)
+
+    def find_pending_batch(self, state: Dict):
+        """The batch created for the run's pending chunk, if batches.create got that far"""
+        pending = state['pending']
+        created_after = datetime.fromisoformat(pending['created_after']) - CLOCK_SKEW
+        known = {batch['id'] for batch in state['batches']}
+
+        # Newest first: stop at the first batch older than the marker
+        for batch in self.client.messages.batches.list(limit=100):
+            if batch.created_at < created_after:
+                return None
+            if batch.id in known or sum(batch.request_counts.model_dump().values()) != len(pending['custom_ids']):
+                continue
+            if batch.processing_status != 'ended' or self.batch_custom_ids(batch.id) == set(pending['custom_ids']):
+                return batch
+        return None
+
+    def batch_custom_ids(self, batch_id: str) -> set:
+        return {entry.custom_id for entry in self.client.messages.batches.results(batch_id)}
+
+    def wait(self, run_id: str, timeout: Optional[float] = None) -> Dict:
+        """Poll until every batch in the run has ended, backing off exponentially with jitter"""
+        state = self.load_state(run_id)
+        delay = self.poll_initial
+        start = time.time()
+
+        while True:
+            for batch in state['batches']:
+                if batch['status'] == 'ended':
+                    continue
+                info = self.client.messages.batches.retrieve(batch['id'])
+                batch['status'] = info.processing_status
+                batch['request_counts'] = info.request_counts.model_dump()
+
+            self.save_state(state)
+
+            remaining = [b for b in state['batches'] if b['status'] != 'ended']
+            if not remaining:
+                return state
+
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(f"{len(remaining)} batches of {run_id} still processing")
+
+            done = sum(b.get('request_counts', {}).get('succeeded', 0) for b in state['batches'])
+            logger.info("%d batches processing (%d/%d requests done), next check in %.1fs",
+                        len(remaining), done, state['submitted'], delay)
+
+            time.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(delay * 2, self.poll_max)
+
+    def collect(self, run_id: str) -> List[Dict]:
+        """Download results and save one A/B test result per document (skips ones already saved)"""
+        state = self.load_state(run_id)
+        iterations = state['iterations']
+        outputs = [
+            {variant_id: [None] * iterations for variant_id in state['variant_ids']}
+            for _ in state['tests']
+        ]
+
+        for batch in state['batches']:
+            for entry in self.client.messages.batches.results(batch['id']):
+                t, v, i = parse_custom_id(entry.custom_id)
+                outputs[t][state['variant_ids'][v]][i] = self.entry_result(entry)
+
+        missing = {'success': False, 'error': 'missing from batch results', 'execution_time': 0.0, 'batch': True}
+        for variant_outputs in outputs:
+            for variant_id, calls in variant_outputs.items():
+                variant_outputs[variant_id] = [call or dict(missing) for call in calls]
+
+        all_results = []
+        for t, test in enumerate(state['tests']):
+            results = self.runner.assemble(
+                state['agent_name'],
+                state['variants'],
+                outputs[t],
+                iterations,
+                test.get('ground_truth')
+            )
+            results['batch_run_id'] = run_id
+            results['input'] = test['input_data']
+            all_results.append(results)
+
+            if t not in state['saved']:
+                # Recorded once, with the save, so collecting a run again doesn't count its calls twice
+                for variant_id, calls in outputs[t].items():
+                    with labelled(variant=variant_id):
+                        for call in calls:
+                            TELEMETRY.record_call(state['agent_name'], call)
+                save_test(self.tester, results, self.index)
+                state['saved'].append(t)
+                self.save_state(state)
+
+        state['status'] = 'complete'
+        self.save_state(state)
+        return all_results
+
+    @staticmethod
+    def entry_result(entry) -> Dict:
+        """One batch result line in the phase1_results shape"""
+        result = entry.result
+
+        if result.type == 'succeeded':
+            message = result.message
+            text = ''.join(block.text for block in message.content if block.type == 'text')
+            call = AgentClient.success({'model': message.model}, time.time(), text, message.usage)
+            call['execution_time'] = 0.0
+            call['batch'] = True
+            return call
+
+        error = result.error.error.message if result.type == 'errored' else result.type
+        return {'success': False, 'error': error, 'execution_time': 0.0, 'batch': True}
+
+    def run(self, agent_name: str, tests: List[Dict], iterations: int = 3) -> List[Dict]:
+        run_id = self.submit(agent_name, tests, iterations)
+        logger.info("Submitted run %s", run_id)
+        self.wait(run_id)
+        return self.collect(run_id)
+
+    def resume(self, run_id: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """Finish one run, or every unfinished run found in the state directory"""
+        collected = {}
+        for pending_id in ([run_id] if run_id else self.pending_runs()):
+            state = self.load_state(pending_id)
+            logger.info("Resuming %s (%s)", pending_id, state['status'])
+
+            if state['status'] == 'submitting':
+                self.submit_pending(state)
+            self.wait(pending_id)
+            collected[pending_id] = self.collect(pending_id)
+
+        return collected
@@ -0,0 +1,246 @@
+"""
+Cost/latency-aware model cascade for workflow agents.
+
+Each cascaded agent is first run on a small, fast draft model. The draft is
+kept if it passes validation (the call succeeded, the answer has labelled
+sections, and the required fields are present) and its quality score
+(metrics.output_quality, the PromptTester composite for a single output) is
+at least min_score. Otherwise the request is sent again to the agent's
+configured model.
+
+Agents opt in through a 'cascade' block in their config:
+
+    "strategic_analyst": {
+        "parameters": {"model": "claude-sonnet-4-20250514", ...},
+        "cascade": {"draft_model": "claude-3-5-haiku-20241022", "min_score": 0.35,
+                    "required_fields": ["key_strength", "key_weakness"]}
+    }
+
+or every agent at once with AGENT_CASCADE=1 (default policy). Results gain a
+'cascade' block (draft model, score, escalated and why, draft time and
+tokens), and report() sums the latency, tokens and cost per agent. Compare
+with the uncascaded workflow on the mock server with:
+
+    python benchmark.py --target cascade --runs 20 --weak-draft-rate 0.3
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from orchestrator.agent_client import AgentClient
+from orchestrator.metrics import output_quality
+from orchestrator.pricing import billed_calls, call_cost, total_tokens
+
+
+DEFAULT_DRAFT_MODEL = 'claude-3-5-haiku-20241022'
+
+# Set AGENT_CASCADE=1 (e.g. in .env) to cascade every agent with the default policy
+CASCADE_ENV = 'AGENT_CASCADE'
+
+COUNTERS = ['calls', 'accepted', 'escalated', 'draft_time', 'final_time',
+            'draft_tokens', 'final_tokens', 'cost']
+
+
+def cascade_enabled() -> bool:
+    return os.getenv(CASCADE_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+class CascadePolicy:
+    """When a draft answer is good enough to keep"""
+
+    def __init__(self, draft_model: str = DEFAULT_DRAFT_MODEL, min_score: float = 0.35,
+                 required_fields: Sequence[str] = (), min_fields: int = 2):
+        self.draft_model = draft_model
+        self.min_score = min_score
+        self.required_fields = list(required_fields)
+        self.min_fields = min_fields
+
+    @classmethod
+    def from_config(cls, agent_config: Dict, default: Optional['CascadePolicy'] = None) -> Optional['CascadePolicy']:
+        settings = agent_config.get('cascade')
+        if settings is None:
+            return default
+        if settings is False or settings.get('enabled') is False:
+            return None
+        return cls(**{key: value for key, value in settings.items() if key != 'enabled'})
+
+    def check(self, result: Dict) -> Tuple[bool, str, float]:
+        """(accept, reason, quality score) for a draft result"""
+        if not result.get('success'):
+            return False, f"draft failed: {result.get('error', 'Unknown error')}", 0.0
+
+        fields = [key for key in result['output'] if not key.startswith('_') and key not in ('raw_response', 'analysis')]
+        if len(fields) < self.min_fields:
+            return False, f"only {len(fields)} labelled section(s)", 0.0
+
+        missing = [field for field in self.required_fields if field not in result['output']]
+        if missing:
+            return False, f"missing {', '.join(missing)}", 0.0
+
+        score = output_quality(result)
+        if score < self.min_score:
+            return False, f"quality {score:.2f} < {self.min_score:.2f}", score
+        return True, f"quality {score:.2f}", score
+
+
+class CascadeAgentClient:
+    """Agent client that drafts on a small model and escalates to the configured one when needed"""
+
+    def __init__(self, config: Dict, client: Optional[AgentClient] = None,
+                 default_policy: Optional[CascadePolicy] = None):
+        self.client = client or AgentClient()
+        self.policies = {
+            name: CascadePolicy.from_config(agent_config, default_policy)
+            for name, agent_config in config['agents'].items()
+        }
+        self.counts: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def policy(self, agent_name: str, request: Dict) -> Optional[CascadePolicy]:
+        policy = self.policies.get(agent_name)
+        # Nothing to gain when the agent already runs on the draft model
+        if policy is None or policy.draft_model == request['model']:
+            return None
+        return policy
+
+    def draft_request(self, policy: CascadePolicy, request: Dict) -> Dict:
+        return dict(request, model=policy.draft_model)
+
+    def settle(self, agent_name: str, policy: CascadePolicy, start: float, draft: Dict,
+               final: Optional[Dict], reason: str, score: float) -> Dict:
+        """
+        Final result with its cascade block, and the per-agent counts updated.
+        An escalated result keeps the final model's tokens_used; the draft's are
+        in cascade.draft_tokens_used, which pricing.billed_calls (and so
+        cache_report) adds at the draft model's prices.
+        """
+        result = final if final is not None else draft
+        result['cascade'] = {
+            'draft_model': policy.draft_model,
+            'score': score,
+            'escalated': final is not None,
+            'reason': reason,
+            'draft_time': draft['execution_time'],
+            'draft_tokens_used': draft.get('tokens_used')
+        }
+        result['execution_time'] = time.time() - start
+
+        self.count(
+            agent_name,
+            calls=1,
+            accepted=0 if final is not None else 1,
+            escalated=1 if final is not None else 0,
+            draft_time=draft['execution_time'],
+            final_time=final['execution_time'] if final is not None else 0.0,
+            draft_tokens=total_tokens(draft.get('tokens_used')),
+            final_tokens=total_tokens(final.get('tokens_used')) if final is not None else 0,
+            cost=call_cost(draft.get('model'), draft.get('tokens_used')) + (
+                call_cost(final.get('model'), final.get('tokens_used')) if final is not None else 0.0
+            )
+        )
+        return result
+
+    def count(self, agent_name: str, **increments):
+        with self.lock:
+            counts = self.counts.setdefault(agent_name, dict.fromkeys(COUNTERS, 0))
+            for key, value in increments.items():
+                counts[key] += value
+
+    def report(self) -> Dict:
+        """Calls, escalations, time, tokens and cost per cascaded agent"""
+        with self.lock:
+            return {name: dict(counts) for name, counts in self.counts.items()}
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def call(self, agent_name: str, request: Dict) -> Dict:
+        policy = self.policy(agent_name, request)
+        if policy is None:
+            return self.client.call(agent_name, request)
+
+        start = time.time()
+        draft = self.client.call(agent_name, self.draft_request(policy, request))
+        accept, reason, score = policy.check(draft)
+        final = None if accept else self.client.call(agent_name, request)
+        return self.settle(agent_name, policy, start, draft, final, reason, score)
+
+    def stream(self, agent_name: str, request: Dict) -> Iterator[Dict]:
+        """
+        Stream the draft as it arrives; if it is rejected, the configured
+        model's answer is streamed next, its first delta marked 'escalated'
+        (its 'fields' replace the draft's, as every delta's do)
+        """
+        policy = self.policy(agent_name, request)
+        if policy is None:
+            yield from self.client.stream(agent_name, request)
+            return
+
+        start = time.time()
+        draft = None
+        for event in self.client.stream(agent_name, self.draft_request(policy, request)):
+            if event['type'] == 'done':
+                draft = event['result']
+            else:
+                yield event
+
+        accept, reason, score = policy.check(draft)
+        final = None
+        if not accept:
+            escalated = False
+            for event in self.client.stream(agent_name, request):
+                if event['type'] == 'done':
+                    final = event['result']
+                    continue
+                if not escalated:
+                    event = dict(event, escalated=True, reason=reason)
+                    escalated = True
+                yield event
+
+        yield {'type': 'done', 'agent': agent_name,
+               'result': self.settle(agent_name, policy, start, draft, final, reason, score)}
+
+
+def describe_cascade(result: Dict) -> str:
+    """'drafted on claude-3-5-haiku, kept (quality 0.52)' style note ('' when not cascaded)"""
+    cascade = result.get('cascade')
+    if not cascade:
+        return ''
+    if cascade['escalated']:
+        return f"escalated from {cascade['draft_model']}: {cascade['reason']}"
+    return f"drafted on {cascade['draft_model']}, kept ({cascade['reason']})"
+
+
+def cascade_savings(cascaded: List[Dict], baseline: List[Dict]) -> Dict:
+    """Latency, large-model tokens and cost of cascaded vs baseline results for one agent"""
+    def mean(values):
+        return sum(values) / len(values) if values else 0.0
+
+    def cost(result):
+        return sum(call_cost(call.get('model'), call.get('tokens_used')) for call in billed_calls(result))
+
+    def large_tokens(result):
+        if result.get('cascade') and not result['cascade']['escalated']:
+            return 0
+        return total_tokens(result.get('tokens_used'))
+
+    escalated = [r for r in cascaded if r.get('cascade', {}).get('escalated')]
+    return {
+        'calls': len(cascaded),
+        'escalation_rate': len(escalated) / len(cascaded) if cascaded else 0.0,
+        'latency': mean([r['execution_time'] for r in cascaded]),
+        'baseline_latency': mean([r['execution_time'] for r in baseline]),
+        'large_model_tokens': sum(large_tokens(r) for r in cascaded),
+        'baseline_tokens': sum(total_tokens(r.get('tokens_used')) for r in baseline),
+        'cost': sum(cost(r) for r in cascaded),
+        'baseline_cost': sum(cost(r) for r in baseline)
+    }
+
+
+def cascading_client(config: Dict, client: Optional[AgentClient] = None):
+    """client wrapped in a CascadeAgentClient when any agent is cascaded ('cascade' config blocks or AGENT_CASCADE=1)"""
+    cascade = CascadeAgentClient(config, client=client, default_policy=CascadePolicy() if cascade_enabled() else None)
+    return cascade if any(cascade.policies.values()) else cascade.client
@@ -0,0 +1,153 @@
+"""
+Plotly figures for the A/B Testing, Results History and Analytics pages.
+
+The pages used to rebuild every chart with plotly.express on every rerun,
+which costs ~100ms per figure before anything is drawn. These builders use
+graph_objects directly (a few ms) and are meant to be cached by the caller
+per result id, so a rerun only serialises an existing figure:
+
+    @st.cache_resource(max_entries=64)
+    def figures_for(result_id, _results):
+        return ab_test_figures(_results)
+
+Figures are shared between sessions by that cache; don't mutate them.
+
+History charts take aggregates computed in pandas (orchestrator.analytics):
+the box plot gets per-variant quartiles and whiskers instead of every score,
+and the score trend is bucketed to at most max_points before plotting. Traces
+with more than WEBGL_POINTS points are drawn with WebGL (Scattergl).
+"""
+
+from typing import Dict, List
+
+import pandas as pd
+import plotly.graph_objects as go
+
+WEBGL_POINTS = 1000
+
+RADAR_AXES = ['Consistency', 'Specificity', 'Actionability', 'Technical Density', 'Speed']
+
+# Tab label -> metric key, as shown under "Metric Rankings"
+METRIC_TABS = {
+    'Consistency': 'consistency',
+    'Specificity': 'specificity_score',
+    'Actionability': 'actionability_score',
+    'Technical Density': 'technical_density'
+}
+
+
+def scatter_type(points: int):
+    """Scattergl above WEBGL_POINTS points, SVG Scatter below"""
+    return go.Scattergl if points > WEBGL_POINTS else go.Scatter
+
+
+def radar_values(metrics: Dict) -> List[float]:
+    return [
+        metrics.get('consistency', 0),
+        metrics.get('specificity_score', 0),
+        metrics.get('actionability_score', 0),
+        metrics.get('technical_density', 0),
+        1.0 - min(metrics.get('avg_execution_time', 0) / 10.0, 1.0)  # Normalize execution time
+    ]
+
+
+def score_bar(names: List[str], scores: List[float], title: str, colorscale: str) -> go.Figure:
+    """Bar per variant coloured by its score (what px.bar(color='Score') drew)"""
+    fig = go.Figure(go.Bar(
+        x=names,
+        y=scores,
+        marker=dict(color=scores, colorscale=colorscale, showscale=True, colorbar=dict(title='Score')),
+        hovertemplate='Variant=%{x}<br>Score=%{y:.3f}<extra></extra>'
+    ))
+    fig.update_layout(title=title, xaxis_title='Variant', yaxis_title='Score')
+    return fig
+
+
+def ab_test_figures(results: Dict) -> Dict:
+    """Radar chart and one bar chart per ranked metric for an A/B test result"""
+    variants = list(results['results'].values())
+    names = [variant['config']['name'] for variant in variants]
+
+    polar = go.Scatterpolargl if len(variants) * len(RADAR_AXES) > WEBGL_POINTS else go.Scatterpolar
+    radar = go.Figure([
+        polar(r=radar_values(variant['metrics']), theta=RADAR_AXES, fill='toself', name=name)
+        for name, variant in zip(names, variants)
+    ])
+    radar.update_layout(
+        polar=dict(radialaxis=dict(visible=True, range=[0, 1])),
+        showlegend=True,
+        title="Performance Comparison (All Metrics)"
+    )
+
+    metrics = {
+        metric_name: score_bar(names, [variant['metrics'].get(metric_name, 0) for variant in variants],
+                               f"{metric_name.replace('_', ' ').title()} Comparison", 'Blues')
+        for metric_name in METRIC_TABS.values()
+    }
+    return {'radar': radar, 'metrics': metrics}
+
+
+def composite_scores_figure(results: Dict) -> go.Figure:
+    """Composite score per variant of a saved A/B test"""
+    scores = results['winner']['all_scores']
+    names = [results['results'][variant_id]['config']['name'] for variant_id in scores]
+    return score_bar(names, list(scores.values()), "Composite Scores", 'Viridis')
+
+
+# ----------------------------------------------------------------------
+# History (aggregated by orchestrator.analytics.TestHistory)
+# ----------------------------------------------------------------------
+
+def grouped_by_agent(table: pd.DataFrame):
+    """(agent, rows) pairs; one trace per agent like px's color='agent_name'"""
+    return [(agent, rows) for agent, rows in table.groupby('agent_name', observed=True)]
+
+
+def win_rate_figure(rates: pd.DataFrame) -> go.Figure:
+    fig = go.Figure([
+        go.Bar(
+            x=rows['variant_name'].astype(str),
+            y=rows['win_rate'],
+            name=str(agent),
+            customdata=rows[['tests', 'wins', 'mean_score']].to_numpy(),
+            hovertemplate=('Variant=%{x}<br>Win Rate=%{y:.0%}<br>tests=%{customdata[0]}'
+                           '<br>wins=%{customdata[1]}<br>mean_score=%{customdata[2]:.3f}<extra></extra>')
+        )
+        for agent, rows in grouped_by_agent(rates)
+    ])
+    fig.update_layout(barmode='group', xaxis_title='Variant', yaxis_title='Win Rate', legend_title='Agent')
+    fig.update_yaxes(tickformat='.0%')
+    return fig
+
+
+def score_box_figure(boxes: pd.DataFrame) -> go.Figure:
+    """Box plot drawn from precomputed quartiles and whiskers, however many tests there are"""
+    fig = go.Figure([
+        go.Box(
+            x=rows['variant_name'].astype(str),
+            q1=rows['q1'], median=rows['median'], q3=rows['q3'],
+            lowerfence=rows['lowerfence'], upperfence=rows['upperfence'], mean=rows['mean'],
+            name=str(agent)
+        )
+        for agent, rows in grouped_by_agent(boxes)
+    ])
+    fig.update_layout(boxmode='group', xaxis_title='Variant', yaxis_title='Composite Score', legend_title='Agent')
+    return fig
+
+
+def score_trend_figure(trend: pd.DataFrame) -> go.Figure:
+    """Composite score over time per variant (bucketed means when the history is large)"""
+    trace = scatter_type(len(trend))
+    fig = go.Figure([
+        trace(
+            x=rows['created_at'],
+            y=rows['composite_score'],
+            mode='markers+lines' if len(rows) < 200 else 'lines',
+            name=f"{agent} · {variant}",
+            customdata=rows['tests'],
+            hovertemplate='%{x}<br>Composite Score=%{y:.3f}<br>tests=%{customdata}<extra></extra>'
+        )
+        for (agent, variant), rows in trend.groupby(['agent_name', 'variant_name'], observed=True)
+    ])
+    fig.update_layout(xaxis_title='Date', yaxis_title='Composite Score', legend_title='Variant')
+    return fig
@@ -0,0 +1,145 @@
+"""
+Per-call checkpoints for A/B test runs.
+
+Every run gets an append-only JSONL file under outputs/runs/: a header line
+with everything needed to rebuild the run (agent, variants, input, iterations,
+runner settings), then one line per finished call, written and fsynced as the
+call completes, and status lines when the run is cancelled or completes.
+
+A run interrupted by a crash, a Streamlit rerun or a cancel can therefore be
+resumed by id: successful calls are read back from the file and only the
+missing (or failed, hence unbilled) calls are sent again. A run stays
+resumable until its results have been saved (set_status(COMPLETE, saved_path)).
+
+    store = CheckpointStore()
+    run = store.create({'agent_name': ..., 'variants': ..., ...})
+    run.record('v1_expert', 0, result)
+    store.open(run.run_id).completed()  # {(variant_id, iteration): result}
+"""
+
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+RUNS_DIR = 'outputs/runs'
+
+RUNNING = 'running'
+CANCELLED = 'cancelled'
+COMPLETE = 'complete'
+
+
+def new_run_id(agent_name: str) -> str:
+    """Id for a run not created yet, e.g. to record it somewhere before the checkpoint file exists"""
+    return f"run_{agent_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+class RunCheckpoint:
+    """One run's checkpoint file: header, finished calls and status"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.header = {}
+        self.calls: Dict[Tuple[str, int], Dict] = {}
+        self.status = RUNNING
+        self.saved_path = None
+
+        if os.path.exists(path):
+            self.load()
+
+    @property
+    def run_id(self) -> str:
+        return self.header['run_id']
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves at most one partial last line
+                    continue
+
+                if entry['type'] == 'run':
+                    self.header = entry
+                elif entry['type'] == 'call':
+                    self.calls[(entry['variant_id'], entry['iteration'])] = entry['result']
+                elif entry['type'] == 'status':
+                    self.status = entry['status']
+                    self.saved_path = entry.get('saved_path', self.saved_path)
+
+    def append(self, entry: Dict):
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, variant_id: str, iteration: int, result: Dict):
+        """Checkpoint one finished call"""
+        self.calls[(variant_id, iteration)] = result
+        self.append({'type': 'call', 'variant_id': variant_id, 'iteration': iteration, 'result': result})
+
+    def set_status(self, status: str, saved_path: Optional[str] = None):
+        self.status = status
+        entry = {'type': 'status', 'status': status, 'at': datetime.now().isoformat()}
+        if saved_path:
+            self.saved_path = saved_path
+            entry['saved_path'] = saved_path
+        self.append(entry)
+
+    def completed(self) -> Dict[Tuple[str, int], Dict]:
+        """Successful calls; failed calls were not billed and are sent again on resume"""
+        return {key: result for key, result in self.calls.items() if result and result.get('success')}
+
+    def summary(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'agent_name': self.header.get('agent_name'),
+            'created_at': self.header.get('created_at'),
+            'status': self.status,
+            'completed_calls': len(self.completed()),
+            'total_calls': self.header.get('iterations', 0) * len(self.header.get('variant_ids', [])),
+            'saved_path': self.saved_path
+        }
+
+
+class CheckpointStore:
+    """Directory of run checkpoint files"""
+
+    def __init__(self, runs_dir: str = RUNS_DIR):
+        self.runs_dir = runs_dir
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    def path(self, run_id: str) -> str:
+        return os.path.join(self.runs_dir, f"{run_id}.jsonl")
+
+    def create(self, header: Dict, run_id: Optional[str] = None) -> RunCheckpoint:
+        """New run; pass run_id to use one handed out earlier by new_run_id"""
+        run_id = run_id or new_run_id(header['agent_name'])
+        run = RunCheckpoint(self.path(run_id))
+        run.header = dict(header, type='run', run_id=run_id, created_at=datetime.now().isoformat())
+        run.append(run.header)
+        return run
+
+    def exists(self, run_id: str) -> bool:
+        return os.path.exists(self.path(run_id))
+
+    def open(self, run_id: str) -> RunCheckpoint:
+        if not os.path.exists(self.path(run_id)):
+            raise KeyError(f"No checkpoint for run: {run_id}")
+        return RunCheckpoint(self.path(run_id))
+
+    def resumable(self) -> List[Dict]:
+        """Summaries of runs not yet saved as a test result (interrupted, cancelled or unsaved), newest first"""
+        runs = []
+        for path in glob.glob(os.path.join(self.runs_dir, 'run_*.jsonl')):
+            run = RunCheckpoint(path)
+            if run.header and not run.saved_path:
+                runs.append(run.summary())
+        return sorted(runs, key=lambda run: run['created_at'] or '', reverse=True)
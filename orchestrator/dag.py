@@ -0,0 +1,292 @@
+"""
+DAG workflows: agents with explicit dependencies, run with maximal parallelism.
+
+Instead of the fixed phase-1-then-brief structure, agents can declare which
+other agents' outputs they need, and the brief can declare which agents it
+synthesises:
+
+    "agents": {
+        "strategic_analyst": {"parameters": {...}},
+        "audience_evaluator": {"parameters": {...}},
+        "competitive_intel": {"parameters": {...}, "depends_on": ["strategic_analyst"]}
+    },
+    "synthesis": {"parameters": {...}, "depends_on": ["competitive_intel", "audience_evaluator"]}
+
+The scheduler starts every node whose dependencies have finished, so
+independent branches run concurrently. A dependent agent sees its
+dependencies' labelled sections after its usual instruction. The brief
+depends on every agent unless it says otherwise.
+
+Node results are cached on disk keyed by the exact request, which contains
+the outputs of the node's dependencies. A re-run therefore repeats only the
+nodes whose inputs changed; everything downstream of an unchanged node is
+served from the cache. Set DAG_NODE_CACHE=0 (or pass use_cache=False) to
+call every node regardless.
+
+Results have the StreamingWorkflow shape (agent results under
+phase1_results, whatever their depth) plus a 'dag' block with per-node
+timings and the critical path, the chain of nodes that bounded the total
+latency.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from orchestrator.agent_client import (
+    AGENT_INSTRUCTION,
+    AgentClient,
+    agent_parameters,
+    build_agent_request,
+    build_synthesis_request,
+    format_analyses
+)
+from orchestrator.map_reduce import ChunkCache
+from orchestrator.streaming import BRIEF_STREAM
+from orchestrator.tracing import bind, span, start_span
+
+
+DAG_CACHE_DIR = 'outputs/dag_cache'
+NODE_CACHE_ENV = 'DAG_NODE_CACHE'
+
+
+def node_cache_enabled() -> bool:
+    return os.getenv(NODE_CACHE_ENV, '1').lower() not in ('0', 'false', 'no')
+
+
+def declares_dag(config: Dict) -> bool:
+    """Whether any agent (or the synthesis) declares depends_on"""
+    return (any('depends_on' in agent_config for agent_config in config['agents'].values())
+            or 'depends_on' in config.get('synthesis', {}))
+
+
+def build_graph(config: Dict) -> Dict[str, List[str]]:
+    """
+    Dependencies of every node: phase-1 agents, agents with depends_on, and
+    the brief (BRIEF_STREAM). Raises ValueError for unknown dependencies or cycles.
+    """
+    agents = config['agents']
+    nodes = [name for name, agent_config in agents.items()
+             if agent_config.get('phase', 1) == 1 or 'depends_on' in agent_config]
+
+    graph = {name: list(agents[name].get('depends_on', [])) for name in nodes}
+    graph[BRIEF_STREAM] = list(config.get('synthesis', {}).get('depends_on', nodes))
+
+    for name, dependencies in graph.items():
+        unknown = [dependency for dependency in dependencies if dependency not in graph or dependency == BRIEF_STREAM]
+        if unknown:
+            raise ValueError(f"{name} depends on unknown agent(s): {', '.join(unknown)}")
+
+    topological_levels(graph)
+    return graph
+
+
+def topological_levels(graph: Dict[str, List[str]]) -> List[List[str]]:
+    """Nodes grouped by depth: each level only depends on earlier ones"""
+    levels = []
+    placed = set()
+    while len(placed) < len(graph):
+        level = [name for name, dependencies in graph.items()
+                 if name not in placed and all(dependency in placed for dependency in dependencies)]
+        if not level:
+            raise ValueError(f"Dependency cycle among: {', '.join(name for name in graph if name not in placed)}")
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+def critical_path(graph: Dict[str, List[str]], timings: Dict[str, Dict]) -> List[str]:
+    """
+    The chain that bounded the run: from the node that finished last, back
+    through whichever dependency finished last (the one it waited for)
+    """
+    timed = [name for name in graph if name in timings]
+    if not timed:
+        return []
+
+    path = [max(timed, key=lambda name: timings[name]['end'])]
+    while True:
+        dependencies = [dependency for dependency in graph[path[-1]] if dependency in timings]
+        if not dependencies:
+            return list(reversed(path))
+        path.append(max(dependencies, key=lambda name: timings[name]['end']))
+
+
+def format_critical_path(result: Dict) -> str:
+    """Per-node timings along the critical path, naming the agent that bounds the latency"""
+    dag = result.get('dag')
+    if not dag or not dag['critical_path']:
+        return ''
+
+    nodes = dag['nodes']
+    lines = ["Critical path:"]
+    for name in dag['critical_path']:
+        node = nodes[name]
+        note = ' (cached)' if node['cached'] else ''
+        lines.append(f"  {name:24s} {node['start']:6.2f}s -> {node['end']:6.2f}s  ({node['duration']:.2f}s){note}")
+
+    # A cached node took no model time, so it can't be what bounds the latency
+    agents = [name for name in dag['critical_path'] if name != BRIEF_STREAM and not nodes[name]['cached']]
+    if agents:
+        slowest = max(agents, key=lambda name: nodes[name]['duration'])
+        lines.append(f"Bounded by {slowest} ({nodes[slowest]['duration']:.2f}s of "
+                     f"{result.get('execution_time', 0):.2f}s)")
+    return '\n'.join(lines)
+
+
+class DagWorkflow:
+    """Dependency-scheduled counterpart to StreamingWorkflow, with a per-node result cache"""
+
+    def __init__(self, config: Dict, client: Optional[AgentClient] = None, cache: Optional[ChunkCache] = None,
+                 cache_prefix: bool = True, max_workers: int = 8, use_cache: Optional[bool] = None):
+        self.config = config
+        self.client = client or AgentClient()
+        self.cache = cache if cache is not None else ChunkCache(DAG_CACHE_DIR)
+        self.use_cache = node_cache_enabled() if use_cache is None else use_cache
+        self.cache_prefix = cache_prefix
+        self.max_workers = max_workers
+        self.graph = build_graph(config)
+        self.stats_lock = threading.Lock()
+
+    @property
+    def agent_names(self) -> List[str]:
+        return [name for name in self.graph if name != BRIEF_STREAM]
+
+    def node_request(self, name: str, input_data: Dict, results: Dict) -> Optional[Dict]:
+        """Request for a node given its dependencies' results; None when it cannot run"""
+        upstream = {dependency: results[dependency] for dependency in self.graph[name]}
+        succeeded = {dependency: result for dependency, result in upstream.items() if result['success']}
+
+        if name == BRIEF_STREAM:
+            # Like the phased workflow, the brief only needs one successful analysis
+            if upstream and not succeeded:
+                return None
+            return build_synthesis_request(self.config, input_data, succeeded, self.cache_prefix)
+
+        if len(succeeded) < len(upstream):
+            return None
+        request = build_agent_request(agent_parameters(self.config, name), input_data, self.cache_prefix)
+        if succeeded:
+            request['messages'] = [{
+                'role': 'user',
+                'content': f"{AGENT_INSTRUCTION}\n\nANALYSES YOU BUILD ON:\n\n" + '\n\n'.join(format_analyses(succeeded))
+            }]
+        return request
+
+    def run(self, input_data: Dict) -> Iterator[Dict]:
+        """Yield the same events as StreamingWorkflow.run, with nodes starting as soon as they are ready"""
+        start = time.time()
+        events = queue.Queue()
+        results: Dict[str, Dict] = {}
+        timings: Dict[str, Dict] = {}
+        stats = {'calls': 0, 'cache_hits': 0}
+
+        def run_node(name: str, request: Optional[Dict]):
+            with span('dag.node', node=name, depends_on=','.join(self.graph[name])) as node_span:
+                run_request(name, request, node_span)
+
+        def run_request(name: str, request: Optional[Dict], node_span):
+            node_start = time.time() - start
+            if request is None:
+                failed = [dependency for dependency in self.graph[name] if not results[dependency]['success']]
+                result = {'success': False, 'error': f"Skipped: {', '.join(failed)} failed", 'execution_time': 0.0}
+                node_span.set(skipped=True)
+                events.put({'type': 'done', 'agent': name, 'result': result, 'started': node_start})
+                return
+
+            cached = None
+            if self.use_cache:
+                with span('dag.cache_lookup'):
+                    cached = self.cache.get(request)
+            node_span.set(cached=cached is not None)
+            if cached is not None:
+                with self.stats_lock:
+                    stats['cache_hits'] += 1
+                # Replay the cached answer as one delta so streaming displays still show it
+                events.put({'type': 'delta', 'agent': name, 'text': cached['output'].get('raw_response', ''),
+                            'fields': cached['output']})
+                events.put({'type': 'done', 'agent': name, 'result': cached, 'started': node_start})
+                return
+
+            with self.stats_lock:
+                stats['calls'] += 1
+            try:
+                for event in self.client.stream(name, request):
+                    if event['type'] == 'done':
+                        if event['result']['success'] and self.use_cache:
+                            self.cache.put(request, event['result'])
+                        event = dict(event, started=node_start)
+                    events.put(event)
+            except Exception as e:
+                events.put({'type': 'done', 'agent': name, 'started': node_start,
+                            'result': {'success': False, 'error': str(e), 'execution_time': time.time() - start}})
+
+        first_insight = None
+        dag_span = start_span('workflow.dag', nodes=len(self.graph), levels=len(topological_levels(self.graph)))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='dag') as pool:
+            submitted = set()
+
+            def submit_ready():
+                for name, dependencies in self.graph.items():
+                    if name not in submitted and all(dependency in results for dependency in dependencies):
+                        submitted.add(name)
+                        pool.submit(bind(run_node, dag_span), name, self.node_request(name, input_data, results))
+
+            submit_ready()
+            while len(results) < len(self.graph):
+                event = events.get()
+                if event['type'] == 'delta' and event['agent'] != BRIEF_STREAM and first_insight is None:
+                    first_insight = time.time() - start
+                if event['type'] == 'done':
+                    name = event['agent']
+                    results[name] = event['result']
+                    end = time.time() - start
+                    timings[name] = {
+                        'start': event.pop('started'),
+                        'end': end,
+                        'cached': bool(event['result'].get('cached'))
+                    }
+                    timings[name]['duration'] = end - timings[name]['start']
+                    submit_ready()
+                yield event
+        dag_span.end()
+
+        phase1_results = {name: results[name] for name in self.agent_names}
+        synthesis = results[BRIEF_STREAM]
+        result = {
+            'success': any(r['success'] for r in phase1_results.values()) and synthesis['success'],
+            'timestamp': datetime.now().isoformat(),
+            'input': input_data,
+            'phase1_results': phase1_results,
+            'time_to_first_insight': first_insight,
+            'synthesis': synthesis,
+            'dag': {
+                'levels': topological_levels(self.graph),
+                'nodes': {name: dict(timings[name], depends_on=self.graph[name]) for name in self.graph},
+                'critical_path': critical_path(self.graph, timings),
+                'calls': stats['calls'],
+                'cache_hits': stats['cache_hits']
+            }
+        }
+
+        if synthesis['success']:
+            result['final_brief'] = synthesis['output']['raw_response']
+        elif not any(r['success'] for r in phase1_results.values()):
+            result['error'] = 'All agents failed'
+        else:
+            result['error'] = f"Synthesis failed: {synthesis['error']}"
+
+        result['execution_time'] = time.time() - start
+        yield {'type': 'complete', 'result': result}
+
+    def execute(self, input_data: Dict) -> Dict:
+        """Run to completion and return only the final result"""
+        result = None
+        for event in self.run(input_data):
+            if event['type'] == 'complete':
+                result = event['result']
+        return result
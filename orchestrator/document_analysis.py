@@ -0,0 +1,246 @@
+"""
+Rule-based document analysis behind marketing_analyzer.py.
+
+The Streamlit app used to compute its metrics, heuristics checklist and
+persona insights inline while rendering. They live here so the same analysis
+can be run (and load-tested) without a Streamlit session:
+
+    analysis = analyze_document(document, ['Strategic Consultant', 'Skeptical Buyer'], price_point='$99')
+    analysis['metrics']['word_count'], analysis['heuristic_score'], analysis['personas']['Skeptical Buyer']
+
+No model calls are made; sentiment uses TextBlob when it is installed. Each
+step is a trace span when a trace is running.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from orchestrator.tracing import span
+
+try:
+    from textblob import TextBlob
+except ImportError:
+    TextBlob = None
+
+
+SENTIMENT_AVAILABLE = TextBlob is not None
+
+PERSONAS = {
+    "Strategic Consultant": {
+        "icon": "🎯",
+        "description": "Expert marketing strategist analyzing positioning and competitive advantage",
+        "focus": ["Strategy", "Positioning", "Differentiation"]
+    },
+    "Target Customer": {
+        "icon": "👤",
+        "description": "Your ideal customer's perspective on the message",
+        "focus": ["Appeal", "Clarity", "Trust"]
+    },
+    "Skeptical Buyer": {
+        "icon": "🤔",
+        "description": "Critical consumer looking for red flags and concerns",
+        "focus": ["Objections", "Credibility", "Value"]
+    },
+    "SEO Specialist": {
+        "icon": "🔍",
+        "description": "Digital marketing expert analyzing online performance",
+        "focus": ["Keywords", "Readability", "Engagement"]
+    },
+    "Brand Strategist": {
+        "icon": "✨",
+        "description": "Brand expert evaluating tone, voice, and positioning",
+        "focus": ["Voice", "Emotion", "Differentiation"]
+    }
+}
+
+DEFAULT_PERSONAS = ["Strategic Consultant", "Target Customer", "Skeptical Buyer"]
+
+# Heuristic -> (words that satisfy it, or a regex, and the tip shown when it is missing)
+HEURISTICS = {
+    "Clear Value Proposition": (['benefit', 'save', 'improve', 'increase', 'reduce', 'transform'],
+                                "Clearly state what benefit the customer gets"),
+    "Specific Claims": (re.compile(r'\d+%|\$\d+|\d+ (days|hours|minutes)'),
+                        "Use specific numbers and data points"),
+    "Call to Action": (['buy', 'get', 'start', 'try', 'download', 'sign up', 'contact', 'learn more'],
+                       "Include a clear next step for the reader"),
+    "Urgency/Scarcity": (['limited', 'now', 'today', 'exclusive', 'only', 'hurry'],
+                         "Create urgency (but don't overdo it)"),
+    "Social Proof": (['customers', 'users', 'clients', 'testimonial', 'review', 'rated', 'trusted'],
+                     "Include customer testimonials or statistics"),
+    "Credibility Markers": (['proven', 'tested', 'certified', 'guarantee', 'expert', 'professional'],
+                            "Build trust with credentials or guarantees")
+}
+
+HYPERBOLE_PATTERN = re.compile(r'amazing|incredible|revolutionary|best')
+
+
+def document_metrics(document: str) -> Dict:
+    """Word, sentence and reading-time counts"""
+    words = document.split()
+    sentences = document.split('.')
+    return {
+        'word_count': len(words),
+        'sentence_count': len(sentences),
+        'avg_word_length': sum(len(word) for word in words) / len(words) if words else 0,
+        'reading_time': len(words) / 200  # Average reading speed
+    }
+
+
+def sentiment_score(document: str) -> Optional[float]:
+    """TextBlob polarity (-1 to +1); None without TextBlob or its corpora"""
+    if TextBlob is None:
+        return None
+    try:
+        return TextBlob(document).sentiment.polarity
+    except Exception:
+        return None
+
+
+def keyword_words(document: str) -> List[str]:
+    return [word.lower() for word in document.split() if len(word) > 4 and word.isalpha()]
+
+
+def check_heuristics(document: str) -> Dict[str, Dict]:
+    """{'heuristic': {'check': bool, 'tip': str}} for the marketing checklist"""
+    lowered = document.lower()
+    checks = {}
+    for heuristic, (signals, tip) in HEURISTICS.items():
+        if isinstance(signals, re.Pattern):
+            present = bool(signals.search(document))
+        else:
+            present = any(word in lowered for word in signals)
+        checks[heuristic] = {'check': present, 'tip': tip}
+    return checks
+
+
+def persona_insights(persona_name: str, document: str, metrics: Dict, keywords: List, words_clean: List[str],
+                     sentiment: Optional[float], price_point: str = '') -> List[Dict]:
+    """Top 3 insights (title, insight, action) from one persona's perspective"""
+    lowered = document.lower()
+    avg_word_length = metrics['avg_word_length']
+    sentiment = sentiment or 0.0
+
+    if persona_name == "Strategic Consultant":
+        return [
+            {
+                "title": "🎯 Positioning Strategy",
+                "insight": "The document positions the offering as a premium solution, but could strengthen differentiation by highlighting unique features.",
+                "action": "Add 1-2 specific features that competitors don't offer"
+            },
+            {
+                "title": "💪 Key Strength",
+                "insight": f"Strong use of {'benefit-focused' if 'benefit' in lowered else 'feature-focused'} language. The messaging clearly communicates value.",
+                "action": "Maintain this approach and apply consistently across all channels"
+            },
+            {
+                "title": "⚠️ Key Weakness",
+                "insight": "Missing clear competitive advantage. Why choose you over alternatives?",
+                "action": "Add explicit comparison or unique selling proposition"
+            }
+        ]
+
+    if persona_name == "Target Customer":
+        short_opening = len(document.split('\n')[0]) < 60
+        return [
+            {
+                "title": "👀 First Impression",
+                "insight": f"The {'clear headline' if short_opening else 'lengthy opening'} {'captures' if short_opening else 'may lose'} attention quickly.",
+                "action": "Consider A/B testing the opening line for maximum impact"
+            },
+            {
+                "title": "💭 Clarity Score",
+                "insight": f"Message clarity is {'high' if avg_word_length < 6 else 'moderate'} - average word length of {avg_word_length:.1f} letters.",
+                "action": "Use simpler language where possible for broader appeal"
+            },
+            {
+                "title": "🤝 Trust Factors",
+                "insight": f"{'Strong' if any(word in lowered for word in ['guarantee', 'proven', 'trusted']) else 'Limited'} trust signals present.",
+                "action": "Add guarantees, testimonials, or credibility markers"
+            }
+        ]
+
+    if persona_name == "Skeptical Buyer":
+        return [
+            {
+                "title": "🚩 Red Flags",
+                "insight": f"{'Few' if len(HYPERBOLE_PATTERN.findall(lowered)) < 2 else 'Multiple'} hyperbolic claims detected.",
+                "action": "Replace superlatives with specific, measurable benefits"
+            },
+            {
+                "title": "❓ Unanswered Questions",
+                "insight": f"Price {'is' if price_point else 'is NOT'} mentioned - transparency {'good' if price_point else 'lacking'}.",
+                "action": "Be upfront about pricing to build trust"
+            },
+            {
+                "title": "🛡️ Risk Reversal",
+                "insight": f"{'Good' if 'guarantee' in lowered or 'refund' in lowered else 'No'} risk reversal present.",
+                "action": "Add money-back guarantee or free trial to reduce purchase risk"
+            }
+        ]
+
+    if persona_name == "SEO Specialist":
+        return [
+            {
+                "title": "🔍 Keyword Optimization",
+                "insight": f"Top keyword '{keywords[0][0] if keywords else 'N/A'}' appears {keywords[0][1] if keywords else 0} times.",
+                "action": "Ensure primary keywords appear in headline and first 100 words"
+            },
+            {
+                "title": "📱 Readability",
+                "insight": f"{'Short' if metrics['sentence_count'] > 10 else 'Long'} sentences - average {metrics['word_count'] / metrics['sentence_count']:.1f} words per sentence.",
+                "action": "Aim for 15-20 words per sentence for online readability"
+            },
+            {
+                "title": "🎯 Meta Description Ready",
+                "insight": f"First {'100' if len(document) > 100 else len(document)} characters could serve as meta description.",
+                "action": "Extract this for your SEO meta description"
+            }
+        ]
+
+    # Brand Strategist
+    diversity = len(set(words_clean)) / len(words_clean) if words_clean else 0.0
+    return [
+        {
+            "title": "🎨 Brand Voice",
+            "insight": f"Tone is {'professional' if avg_word_length > 5 else 'casual'} with {'positive' if sentiment > 0 else 'neutral'} sentiment.",
+            "action": "Ensure this aligns with your overall brand personality"
+        },
+        {
+            "title": "💫 Emotional Resonance",
+            "insight": f"{'Strong' if sentiment > 0.3 else 'Moderate'} emotional appeal detected.",
+            "action": "Consider adding more emotional triggers for engagement"
+        },
+        {
+            "title": "🎭 Differentiation",
+            "insight": f"{'Unique' if diversity > 0.5 else 'Generic'} language - vocabulary diversity {diversity:.1%}.",
+            "action": "Use distinctive language that competitors don't use"
+        }
+    ]
+
+
+def analyze_document(document: str, personas: Sequence[str] = DEFAULT_PERSONAS, price_point: str = '',
+                     include_sentiment: bool = True) -> Dict:
+    """Metrics, sentiment, top keywords, heuristics checklist and per-persona insights for one document"""
+    metrics = document_metrics(document)
+    with span('sentiment', enabled=include_sentiment):
+        sentiment = sentiment_score(document) if include_sentiment else None
+    with span('keywords'):
+        words_clean = keyword_words(document)
+        keywords = Counter(words_clean).most_common(10)
+    with span('heuristics'):
+        heuristics = check_heuristics(document)
+    with span('personas', personas=len(personas)):
+        insights = {
+            name: persona_insights(name, document, metrics, keywords, words_clean, sentiment, price_point)
+            for name in personas
+        }
+
+    return {
+        'metrics': metrics,
+        'sentiment_score': sentiment,
+        'keywords': keywords,
+        'heuristics': heuristics,
+        'heuristic_score': sum(1 for h in heuristics.values() if h['check']),
+        'personas': insights
+    }
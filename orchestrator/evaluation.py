@@ -0,0 +1,304 @@
+"""
+Dataset-level evaluation of prompt variants.
+
+A single document says little about which variant is better, so this runs
+every variant over a labelled dataset (JSONL lines of document, context and
+ground_truth) and ranks variants on all of it:
+
+    evaluator = DatasetEvaluator(PromptTester(), max_workers=16)
+    report = evaluator.run('strategic_analyst', load_dataset('data/eval.jsonl'), iterations=2,
+                           on_leaderboard=lambda board: print(format_leaderboard(board)))
+
+Variant x document x iteration calls are fanned out over the VariantRunner
+scheduler (document-major, with each document's first call sent ahead so
+the rest read its cached prefix) and checkpointed per call under outputs/evaluations/, so an
+interrupted evaluation resumes by run id. Finished calls are scored in
+chunks with the vectorised metrics: truth_coverage (IDF-weighted share of
+each ground-truth field's words found in the output, with IDF taken from the
+dataset) and text_quality (the composite without consistency). A partial
+leaderboard is published after every chunk.
+
+Variants are ranked on mean truth coverage when the dataset has ground
+truth, otherwise on quality, with a 95% interval and the number of
+documents each variant won.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from orchestrator.agent_client import AgentClient
+from orchestrator.checkpoints import CANCELLED, COMPLETE, CheckpointStore
+from orchestrator.metrics import document_frequencies, output_text, text_quality, truth_coverage
+from orchestrator.pricing import cache_report
+from orchestrator.variant_runner import VariantRunner
+
+
+EVALUATIONS_DIR = 'outputs/evaluations'
+
+
+def load_dataset(path: str) -> List[Dict]:
+    """
+    Read a JSONL file of {'document', 'context', 'ground_truth', 'id'} lines
+    (all but document optional); also the documents file of batch A/B tests
+    """
+    cases = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                case = json.loads(line)
+                cases.append({
+                    'id': str(case.get('id', f"case_{len(cases) + 1}")),
+                    'input_data': {'document': case['document'], 'context': case.get('context', '')},
+                    'ground_truth': case.get('ground_truth')
+                })
+    return cases
+
+
+class Scoreboard:
+    """Per-call scores of an evaluation, scored in vectorised chunks as calls finish"""
+
+    COLUMNS = ['variant_id', 'case', 'success', 'truth', 'quality', 'latency']
+
+    def __init__(self, cases: List[Dict], variants: Dict):
+        self.cases = cases
+        self.variants = variants
+        self.has_truth = any(case['ground_truth'] for case in cases)
+        self.idf = document_frequencies([
+            f"{case['input_data']['document']} {' '.join(map(str, (case['ground_truth'] or {}).values()))}"
+            for case in cases
+        ])
+        self.pending = []
+        self.rows = []
+        self.lock = threading.Lock()
+
+    def add(self, variant_id: str, case_index: int, result: Dict):
+        with self.lock:
+            self.pending.append((variant_id, case_index, result))
+
+    def score_pending(self) -> int:
+        """Score every finished call not yet scored; returns how many were"""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return 0
+
+        texts = [output_text(result) if result else '' for _, _, result in pending]
+        truths = [self.cases[case_index]['ground_truth'] for _, case_index, _ in pending]
+        truth = truth_coverage(texts, truths, self.idf)
+        quality = text_quality(texts)
+
+        # Failed calls count towards the failure rate but not the score means
+        succeeded = [bool(result and result.get('success')) for _, _, result in pending]
+        rows = [
+            (variant_id, case_index, succeeded[i],
+             truth[i] if succeeded[i] else np.nan,
+             quality[i] if succeeded[i] else np.nan,
+             result.get('execution_time', 0.0) if succeeded[i] else np.nan)
+            for i, (variant_id, case_index, result) in enumerate(pending)
+        ]
+        with self.lock:
+            self.rows.extend(rows)
+        return len(rows)
+
+    def frame(self) -> pd.DataFrame:
+        with self.lock:
+            return pd.DataFrame(self.rows, columns=self.COLUMNS)
+
+    def leaderboard(self, total_calls: int) -> Dict:
+        """Variants ranked on mean truth coverage (or quality without ground truth) so far"""
+        df = self.frame()
+        metric = 'truth' if self.has_truth else 'quality'
+        board = {'metric': metric, 'calls_scored': len(df), 'total_calls': total_calls, 'variants': []}
+        if df.empty:
+            return board
+
+        per_variant = df.groupby('variant_id').agg(
+            calls=('success', 'size'),
+            success_rate=('success', 'mean'),
+            truth=('truth', 'mean'),
+            quality=('quality', 'mean'),
+            latency=('latency', 'mean'),
+            spread=(metric, 'std'),
+            scored=(metric, 'count')
+        )
+        per_variant['failure_rate'] = 1.0 - per_variant['success_rate']
+        per_variant['margin'] = 1.96 * per_variant['spread'].fillna(0) / np.sqrt(per_variant['scored'].clip(lower=1))
+
+        # A document is won by the variant with the strictly best mean score on it
+        per_case = df.groupby(['case', 'variant_id'])[metric].mean().dropna().reset_index()
+        best = per_case.groupby('case')[metric].transform('max')
+        leaders = per_case[per_case[metric] == best]
+        winners = leaders[~leaders.duplicated('case', keep=False)]['variant_id'].value_counts()
+        per_variant['documents_won'] = winners.reindex(per_variant.index).fillna(0).astype(int)
+        per_variant['documents'] = df.groupby('variant_id')['case'].nunique()
+
+        for variant_id, row in per_variant.sort_values(metric, ascending=False).iterrows():
+            board['variants'].append({
+                'variant_id': variant_id,
+                'variant_name': self.variants[variant_id].get('name', variant_id),
+                'score': None if pd.isna(row[metric]) else float(row[metric]),
+                'margin': float(row['margin']),
+                'truth': None if pd.isna(row['truth']) else float(row['truth']),
+                'quality': None if pd.isna(row['quality']) else float(row['quality']),
+                'success_rate': float(row['success_rate']),
+                'failure_rate': float(row['failure_rate']),
+                'avg_execution_time': None if pd.isna(row['latency']) else float(row['latency']),
+                'calls': int(row['calls']),
+                'documents': int(row['documents']),
+                'documents_won': int(row['documents_won'])
+            })
+        return board
+
+
+class DatasetEvaluator:
+    """Runs and ranks every variant of an agent over a labelled dataset"""
+
+    def __init__(self, tester, config: Optional[Dict] = None, client: Optional[AgentClient] = None,
+                 max_workers: int = 16, score_every: int = 50, checkpoints: Optional[CheckpointStore] = None):
+        self.runner = VariantRunner(tester, config=config, client=client, max_workers=max_workers)
+        self.tester = tester
+        self.score_every = score_every
+        self.checkpoints = checkpoints or CheckpointStore(EVALUATIONS_DIR)
+
+    def run(self, agent_name: str, cases: List[Dict], iterations: int = 1,
+            on_leaderboard: Optional[Callable[[Dict], None]] = None,
+            cancel: Optional[threading.Event] = None) -> Dict:
+        run_id = self.start(agent_name, cases, iterations)
+        return self.resume(run_id, on_leaderboard, cancel)
+
+    def start(self, agent_name: str, cases: List[Dict], iterations: int = 1,
+              variant_ids: Optional[List[str]] = None) -> str:
+        """Create a checkpointed evaluation and return its id (no calls are made yet)"""
+        variants = self.tester.variants[agent_name]['variants']
+        variant_ids = variant_ids or list(variants)
+        run = self.checkpoints.create({
+            'kind': 'evaluation',
+            'agent_name': agent_name,
+            'cases': cases,
+            'iterations': iterations,
+            'variant_ids': variant_ids,
+            'variants': {variant_id: variants[variant_id] for variant_id in variant_ids}
+        })
+        return run.run_id
+
+    def order_jobs(self, jobs_per_case: List[List]) -> List:
+        """
+        Document-major order in which each document's first call is scheduled
+        a pool's width ahead of its other calls, so they find its prefix cached
+        """
+        jobs_per_case = [jobs for jobs in jobs_per_case if jobs]
+        lead = self.runner.max_workers
+        ordered = [jobs[0] for jobs in jobs_per_case[:lead]]
+        for k, jobs in enumerate(jobs_per_case):
+            ordered.extend(jobs[1:])
+            if k + lead < len(jobs_per_case):
+                ordered.append(jobs_per_case[k + lead][0])
+        return ordered
+
+    def resume(self, run_id: str, on_leaderboard: Optional[Callable[[Dict], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Dict:
+        """
+        Finish an evaluation, reusing checkpointed calls. Calls are stored as
+        (variant_id, case_index * iterations + iteration).
+        """
+        run = self.checkpoints.open(run_id)
+        header = run.header
+        agent_name, cases, iterations = header['agent_name'], header['cases'], header['iterations']
+        variants, variant_ids = header['variants'], header['variant_ids']
+
+        board = Scoreboard(cases, variants)
+        completed = run.completed()
+        for (variant_id, call_index), result in completed.items():
+            board.add(variant_id, call_index // iterations, result)
+
+        jobs = self.order_jobs([
+            [(variant_id, case_index, i) for i in range(iterations) for variant_id in variant_ids
+             if (variant_id, case_index * iterations + i) not in completed]
+            for case_index in range(len(cases))
+        ])
+        total = len(cases) * iterations * len(variant_ids)
+        calls = list(completed.values())
+        finished = [total - len(jobs)]
+        lock = threading.Lock()
+        scoring = threading.Lock()
+        start = time.time()
+
+        def publish():
+            # One thread scores at a time; the others keep calling
+            if not scoring.acquire(blocking=False):
+                return
+            try:
+                board.score_pending()
+                if on_leaderboard:
+                    on_leaderboard(board.leaderboard(total))
+            finally:
+                scoring.release()
+
+        def run_job(job):
+            variant_id, case_index, iteration = job
+            result = self.runner.call(run, agent_name, variants[variant_id], cases[case_index]['input_data'],
+                                      variant_id, case_index * iterations + iteration)
+            board.add(variant_id, case_index, result)
+            with lock:
+                calls.append(result)
+                finished[0] += 1
+                due = finished[0] % self.score_every == 0 and finished[0] < total
+            if due:
+                publish()
+
+        self.runner.schedule(jobs, run_job, cancel)
+
+        with scoring:
+            board.score_pending()
+        leaderboard = board.leaderboard(total)
+        if on_leaderboard:
+            on_leaderboard(leaderboard)
+
+        cancelled = board.frame().shape[0] < total
+        run.set_status(CANCELLED if cancelled else COMPLETE)
+        report = {
+            'run_id': run_id,
+            'agent_name': agent_name,
+            'timestamp': datetime.now().isoformat(),
+            'documents': len(cases),
+            'iterations': iterations,
+            'execution_time': time.time() - start,
+            'leaderboard': leaderboard,
+            'winner': leaderboard['variants'][0] if leaderboard['variants'] else None,
+            'cache_report': cache_report([call for call in calls if call])
+        }
+        if cancelled:
+            report['cancelled'] = True
+        return report
+
+
+def save_evaluation(report: Dict, evaluations_dir: str = EVALUATIONS_DIR) -> str:
+    """Write the final report next to the run's checkpoint file; returns its path"""
+    path = os.path.join(evaluations_dir, f"{report['run_id']}_report.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def format_leaderboard(board: Dict) -> str:
+    label = 'Truth coverage' if board['metric'] == 'truth' else 'Quality'
+    lines = [
+        f"Leaderboard ({board['calls_scored']}/{board['total_calls']} calls scored, ranked on {label.lower()})",
+        f"  {'Variant':28s} {label:>18s} {'Quality':>8s} {'Failed':>8s} {'Latency':>8s} {'Docs won':>9s}"
+    ]
+    for rank, variant in enumerate(board['variants'], 1):
+        score = f"{variant['score']:.3f} ± {variant['margin']:.3f}" if variant['score'] is not None else 'n/a'
+        quality = f"{variant['quality']:.3f}" if variant['quality'] is not None else 'n/a'
+        latency = f"{variant['avg_execution_time']:.2f}s" if variant['avg_execution_time'] is not None else 'n/a'
+        lines.append(
+            f"{rank:>2d}. {variant['variant_name'][:28]:28s} {score:>18s} {quality:>8s} "
+            f"{variant['failure_rate']:>8.0%} {latency:>8s} {variant['documents_won']:>4d}/{variant['documents']}"
+        )
+    return '\n'.join(lines)
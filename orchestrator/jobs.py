@@ -0,0 +1,217 @@
+"""
+Background jobs for the Streamlit app.
+
+Analyses and A/B tests are submitted to a JobQueue shared by every session
+(one bounded worker pool per server process) instead of running inside the
+script thread. The page keeps only the job id in session state and polls the
+job for status, progress and partial results, so a long run survives reruns,
+widget interaction and closed tabs, and concurrent users queue for the pool
+rather than each holding a server thread for the whole LLM call.
+
+    jobs = JobQueue(max_workers=4)
+    job_id = jobs.submit('analysis', run_analysis, workflow, input_data)
+    job = jobs.get(job_id)
+    job.status, job.progress, job.partial, job.result
+
+A job's target is called as target(job, *args, **kwargs); it reports progress
+with job.set_progress(done, total), publishes partial results with
+job.update(...), checks job.cancelled() between steps, and returns the result.
+A target that stops early because it was cancelled returns None or a dict
+with 'cancelled': True. A cancel that arrives after the target already
+produced a full result does not discard it: the job still ends DONE.
+
+Submitting with a key (e.g. orchestrator.single_flight.fingerprint of the
+input) coalesces identical requests: while a job with that key is queued or
+running, further submissions attach to it instead of starting another run,
+and the job counts its waiters. cancel() then only detaches a waiter until
+the last one leaves.
+
+A page takes a finished job's result with collect(); once every waiter has
+collected it the job drops its result and partial results (the page keeps
+them in its session store), so they aren't held twice until prune().
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """Status, progress, partial results and outcome of one background job"""
+
+    def __init__(self, job_id: str, kind: str, label: str = '', key: Optional[str] = None):
+        self.id = job_id
+        self.kind = kind
+        self.label = label
+        self.key = key
+        self.waiters = 1
+        self.collected = 0
+        self.status = QUEUED
+        self.progress = (0, 0)
+        self.partial: Dict = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def set_progress(self, done: int, total: int):
+        self.progress = (done, total)
+
+    def update(self, **partial):
+        """Publish partial results for the page to render while the job runs"""
+        with self.lock:
+            self.partial.update(partial)
+
+    def snapshot(self) -> Dict:
+        """Consistent copy of the partial results"""
+        with self.lock:
+            return dict(self.partial)
+
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobQueue:
+    """Bounded worker pool running jobs in the background, looked up by id"""
+
+    def __init__(self, max_workers: int = 4, keep_seconds: float = 3600.0):
+        self.max_workers = max_workers
+        self.keep_seconds = keep_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.registry: Dict[str, Job] = {}
+        self.keys: Dict[str, str] = {}
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, target: Callable, *args, job_id: Optional[str] = None,
+               label: str = '', key: Optional[str] = None, **kwargs) -> str:
+        """Queue target(job, *args, **kwargs), or attach to the unfinished job with the same key; returns the job id"""
+        self.prune()
+        with self.lock:
+            existing = self.registry.get(self.keys.get(key)) if key else None
+            if existing is not None and not existing.finished and not existing.cancelled():
+                existing.waiters += 1
+                self.coalesced += 1
+                return existing.id
+
+            job = Job(job_id or f"{kind}_{uuid.uuid4().hex[:10]}", kind, label, key)
+            self.registry[job.id] = job
+            if key:
+                self.keys[key] = job.id
+        self.executor.submit(self.execute, job, target, args, kwargs)
+        return job.id
+
+    def execute(self, job: Job, target: Callable, args: tuple, kwargs: Dict):
+        if job.cancelled():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self.release_key(job)
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = target(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancelled() and self.stopped_early(job.result) else DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self.release_key(job)
+
+    @staticmethod
+    def stopped_early(result) -> bool:
+        """Whether a target's return value is a cancelled (partial or missing) result"""
+        return result is None or (isinstance(result, dict) and bool(result.get('cancelled')))
+
+    def release_key(self, job: Job):
+        """Later submissions with the job's key start a fresh run"""
+        with self.lock:
+            if job.key and self.keys.get(job.key) == job.id:
+                del self.keys[job.key]
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self.lock:
+            return self.registry.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job (queued jobs never start; running jobs stop at their next
+        cancelled() check). A job other sessions are waiting on is only
+        detached from; returns whether it was actually cancelled.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with self.lock:
+            if job.waiters > 1:
+                job.waiters -= 1
+                return False
+        job.cancel_event.set()
+        self.release_key(job)
+        return True
+
+    def collect(self, job_id: str):
+        """A finished job's result for one of its waiters; dropped from the job once all have collected it"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            result = job.result
+            job.collected += 1
+            if job.finished and job.collected >= job.waiters:
+                job.result = None
+                job.partial = {}
+        return result
+
+    def jobs(self, kind: Optional[str] = None) -> List[Job]:
+        with self.lock:
+            return [job for job in self.registry.values() if kind is None or job.kind == kind]
+
+    def position(self, job_id: str) -> int:
+        """How many queued jobs were submitted ahead of this one"""
+        job = self.get(job_id)
+        if job is None or job.status != QUEUED:
+            return 0
+        return sum(1 for other in self.jobs() if other.status == QUEUED and other.created_at < job.created_at)
+
+    def stats(self) -> Dict:
+        counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED, 0)
+        for job in self.jobs():
+            counts[job.status] += 1
+        with self.lock:
+            waiters = {job.id: job.waiters for job in self.registry.values()
+                       if not job.finished and job.waiters > 1}
+        return dict(counts, workers=self.max_workers, coalesced=self.coalesced, waiters=waiters)
+
+    def prune(self):
+        """Forget finished jobs older than keep_seconds"""
+        cutoff = time.time() - self.keep_seconds
+        with self.lock:
+            for job_id in [job_id for job_id, job in self.registry.items()
+                           if job.finished and job.finished_at < cutoff]:
+                del self.registry[job_id]
@@ -0,0 +1,373 @@
+"""
+Map-reduce workflow for documents too long to send to every agent whole.
+
+The document is split at paragraph/section boundaries into chunks that fit a
+token budget. Every phase-1 agent analyses every chunk in parallel (map),
+then merges its chunk analyses into one answer with the usual labelled
+fields (reduce), and the synthesis call writes the final brief from those.
+Results have the same shape as StreamingWorkflow/WorkflowEngine results,
+plus a 'map_reduce' block with the chunk and cache counts.
+
+Map and reduce results are cached on disk keyed by the exact request, so a
+re-run after a small edit only repeats the calls whose chunk changed. Chunk
+boundaries are content-defined (section headings or a paragraph hash), so an
+edit early in the document does not shift every later boundary. A cache hit
+costs nothing: it reports no tokens and no execution time, and is marked
+'cached'. Entries older than max_age are ignored and pruned, and the oldest
+are removed once there are more than max_entries.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from orchestrator.agent_client import (
+    AgentClient,
+    agent_parameters,
+    build_agent_request,
+    build_synthesis_request,
+    phase1_agents
+)
+from orchestrator.pricing import token_breakdown
+from orchestrator.streaming import BRIEF_STREAM, StreamingWorkflow
+from orchestrator.tracing import bind, start_span
+
+
+CHARS_PER_TOKEN = 4
+
+DEFAULT_CHUNK_TOKENS = 6000
+
+CHUNK_CACHE_DIR = 'outputs/chunk_cache'
+CHUNK_CACHE_MAX_ENTRIES = 5000
+CHUNK_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Pruning scans the cache directory, so it runs once per this many writes
+PRUNE_EVERY = 100
+
+MAP_INSTRUCTION = (
+    "The document above is one excerpt of a longer document. Analyse this excerpt from your perspective, "
+    "using short labelled headings such as 'KEY STRENGTH:'. Only report what this excerpt shows."
+)
+
+REDUCE_INSTRUCTION = (
+    "Below are your analyses of consecutive excerpts of one long document. Merge them into a single "
+    "analysis of the whole document under the same labelled headings, keeping the strongest, most "
+    "specific points and resolving contradictions between excerpts."
+)
+
+HEADING_LINE = re.compile(r'^\s*(?:#{1,6}\s+\S|[A-Z0-9][A-Z0-9 &/\-]{2,60}:?\s*$)')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English prose)"""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def needs_map_reduce(input_data: Dict, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> bool:
+    return estimate_tokens(input_data.get('document', '')) > chunk_tokens
+
+
+def split_oversized(paragraph: str, max_tokens: int) -> List[str]:
+    """Split a paragraph longer than the budget at sentence ends (or hard, as a last resort)"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces, current = [], ''
+
+    for sentence in SENTENCE_END.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ''
+        current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_document(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """
+    Split a document into chunks of at most max_tokens at paragraph boundaries.
+    Once a chunk is half full it is closed before a section heading, or after a
+    paragraph whose hash picks it as a boundary, so boundaries resynchronise
+    after local edits.
+    """
+    paragraphs = []
+    for paragraph in re.split(r'\n\s*\n', text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            paragraphs.extend(split_oversized(paragraph, max_tokens))
+        else:
+            paragraphs.append(paragraph)
+
+    chunks, current, current_tokens = [], [], 0
+
+    for i, paragraph in enumerate(paragraphs):
+        tokens = estimate_tokens(paragraph) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+
+        current.append(paragraph)
+        current_tokens += tokens
+
+        if current_tokens >= max_tokens / 2 and i + 1 < len(paragraphs):
+            next_is_heading = bool(HEADING_LINE.match(paragraphs[i + 1]))
+            hash_boundary = int(hashlib.sha1(paragraph.encode('utf-8')).hexdigest(), 16) % 4 == 0
+            if next_is_heading or hash_boundary:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def document_outline(chunks: List[str], width: int = 120) -> str:
+    """Stand-in document for the synthesis prefix: the opening line of every chunk"""
+    lines = [f"(Long document, about {sum(estimate_tokens(c) for c in chunks)} tokens, "
+             f"analysed in {len(chunks)} parts.)"]
+    for i, chunk in enumerate(chunks, 1):
+        first_line = chunk.strip().split('\n', 1)[0]
+        lines.append(f"Part {i}: {first_line[:width]}")
+    return '\n'.join(lines)
+
+
+class ChunkCache:
+    """On-disk cache of successful call results keyed by the full request, capped by count and age"""
+
+    def __init__(self, cache_dir: str = CHUNK_CACHE_DIR, max_entries: int = CHUNK_CACHE_MAX_ENTRIES,
+                 max_age: float = CHUNK_CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.puts = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.prune()
+
+    @staticmethod
+    def key(request: Dict) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, request: Dict) -> Optional[Dict]:
+        """The cached result as a free call (no tokens, no time, 'cached': True), or None"""
+        path = os.path.join(self.cache_dir, f"{self.key(request)}.json")
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, 'r') as f:
+                result = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        result.update(tokens_used=token_breakdown(0), execution_time=0.0, cached=True)
+        return result
+
+    def put(self, request: Dict, result: Dict):
+        path = os.path.join(self.cache_dir, f"{self.key(request)}.json")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.puts += 1
+            due = self.puts % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Drop entries past max_age, then the oldest beyond max_entries"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.max_age
+        for i, (mtime, path) in enumerate(entries):
+            if mtime < cutoff or i >= self.max_entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class MapReduceWorkflow:
+    """Chunked counterpart to StreamingWorkflow for documents over the chunk budget"""
+
+    def __init__(self, config: Dict, client: Optional[AgentClient] = None, cache: Optional[ChunkCache] = None,
+                 chunk_tokens: int = DEFAULT_CHUNK_TOKENS, max_workers: int = 4, cache_prefix: bool = True):
+        self.config = config
+        self.client = client or AgentClient()
+        self.cache = cache if cache is not None else ChunkCache()
+        self.chunk_tokens = chunk_tokens
+        self.max_workers = max_workers
+        self.cache_prefix = cache_prefix
+        self.stats_lock = threading.Lock()
+
+    @property
+    def agent_names(self) -> List[str]:
+        return phase1_agents(self.config)
+
+    def map_request(self, params: Dict, chunk: str, context: str) -> Dict:
+        request = build_agent_request(params, {'document': chunk, 'context': context}, self.cache_prefix)
+        request['messages'] = [{'role': 'user', 'content': MAP_INSTRUCTION}]
+        return request
+
+    def reduce_request(self, params: Dict, chunk_results: List[Dict], context: str) -> Dict:
+        analyses = [
+            f"### Excerpt {i}\n{result['output']['raw_response']}"
+            for i, result in enumerate(chunk_results, 1)
+            if result.get('success')
+        ]
+        system = [{'type': 'text', 'text': params['system_prompt']}]
+        if context:
+            system.append({'type': 'text', 'text': f"CONTEXT:\n{context.strip()}"})
+
+        return {
+            'model': params['model'],
+            'max_tokens': params['max_tokens'],
+            'temperature': params['temperature'],
+            'system': system,
+            'messages': [{'role': 'user', 'content': f"{REDUCE_INSTRUCTION}\n\n" + '\n\n'.join(analyses)}]
+        }
+
+    def cached_call(self, name: str, request: Dict, stats: Dict) -> Dict:
+        result = self.cache.get(request)
+        if result is not None:
+            with self.stats_lock:
+                stats['cache_hits'] += 1
+            return result
+
+        result = self.client.call(name, request)
+        with self.stats_lock:
+            stats['calls'] += 1
+        if result['success']:
+            self.cache.put(request, result)
+        return result
+
+    def run(self, input_data: Dict) -> Iterator[Dict]:
+        """Yield the same events as StreamingWorkflow.run (agent 'done' events arrive after reduce)"""
+        start = time.time()
+        context = input_data.get('context', '')
+        chunks = split_document(input_data.get('document', ''), self.chunk_tokens)
+        agent_names = self.agent_names
+        params = {name: agent_parameters(self.config, name) for name in agent_names}
+        stats = {'calls': 0, 'cache_hits': 0}
+
+        # Map: every agent x chunk in parallel (chunk-major, so agents share each chunk's cached prefix)
+        jobs = [(name, i) for i in range(len(chunks)) for name in agent_names]
+        map_span = start_span('map_reduce.map', chunks=len(chunks), calls=len(jobs))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            mapped = list(pool.map(
+                bind(lambda job: self.cached_call(job[0], self.map_request(params[job[0]], chunks[job[1]], context), stats),
+                     map_span),
+                jobs
+            ))
+        map_span.end()
+        chunk_results = {name: [r for (n, _), r in zip(jobs, mapped) if n == name] for name in agent_names}
+
+        # Reduce: one merge call per agent, in parallel
+        def reduce(name: str) -> Dict:
+            results = chunk_results[name]
+            failed = sum(1 for r in results if not r['success'])
+            if failed == len(results):
+                return {'success': False, 'error': results[0].get('error', 'All chunks failed'),
+                        'execution_time': time.time() - start}
+            result = self.cached_call(name, self.reduce_request(params[name], results, context), stats)
+            result['chunks'] = len(results)
+            result['failed_chunks'] = failed
+            return result
+
+        phase1_results = {}
+        first_insight = None
+        reduce_span = start_span('map_reduce.reduce', agents=len(agent_names))
+        with ThreadPoolExecutor(max_workers=max(1, len(agent_names))) as pool:
+            futures = {name: pool.submit(bind(reduce, reduce_span), name) for name in agent_names}
+            for name in agent_names:
+                phase1_results[name] = futures[name].result()
+                if first_insight is None:
+                    first_insight = time.time() - start
+                yield {'type': 'done', 'agent': name, 'result': phase1_results[name]}
+        reduce_span.end()
+
+        result = {
+            'success': any(r['success'] for r in phase1_results.values()),
+            'timestamp': datetime.now().isoformat(),
+            'input': input_data,
+            'phase1_results': phase1_results,
+            'time_to_first_insight': first_insight,
+            'map_reduce': {
+                'chunks': len(chunks),
+                'chunk_tokens': self.chunk_tokens,
+                'estimated_tokens': estimate_tokens(input_data.get('document', '')),
+                'calls': stats['calls'],
+                'cache_hits': stats['cache_hits']
+            }
+        }
+
+        if not result['success']:
+            result['error'] = 'All agents failed'
+            result['execution_time'] = time.time() - start
+            yield {'type': 'complete', 'result': result}
+            return
+
+        # The synthesis sees an outline of the document rather than the whole text
+        outline = {'document': document_outline(chunks), 'context': context}
+        request = build_synthesis_request(self.config, outline, phase1_results, self.cache_prefix)
+        for event in self.client.stream(BRIEF_STREAM, request):
+            if event['type'] == 'done':
+                synthesis = event['result']
+                if synthesis['success']:
+                    result['final_brief'] = synthesis['output']['raw_response']
+                else:
+                    result['success'] = False
+                    result['error'] = f"Synthesis failed: {synthesis['error']}"
+                result['synthesis'] = synthesis
+            yield event
+
+        result['execution_time'] = time.time() - start
+        yield {'type': 'complete', 'result': result}
+
+    def execute(self, input_data: Dict) -> Dict:
+        result = None
+        for event in self.run(input_data):
+            if event['type'] == 'complete':
+                result = event['result']
+        return result
+
+
+def workflow_for(config: Dict, input_data: Dict, chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                 client: Optional[AgentClient] = None, cache_prefix: bool = True):
+    """
+    StreamingWorkflow for documents within the chunk budget (DagWorkflow if the
+    config declares depends_on), MapReduceWorkflow beyond it
+    """
+    # Imported here because the DAG workflow reuses this module's ChunkCache
+    from orchestrator.dag import DagWorkflow, declares_dag
+
+    if needs_map_reduce(input_data, chunk_tokens):
+        return MapReduceWorkflow(config, client=client, chunk_tokens=chunk_tokens, cache_prefix=cache_prefix)
+    if declares_dag(config):
+        return DagWorkflow(config, client=client, cache_prefix=cache_prefix)
+    return StreamingWorkflow(config, client=client, cache_prefix=cache_prefix)
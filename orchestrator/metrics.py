@@ -0,0 +1,467 @@
+"""
+Quality metrics for A/B prompt testing.
+
+Scores a variant from the outputs of its iterations on the same dimensions
+PromptTester reports (consistency, specificity, actionability, technical
+density, speed, success rate) and combines them into the composite score
+used to pick the winner, with PromptTester's weights:
+
+    Score = Consistency x 0.2 + Specificity x 0.3 + Actionability x 0.3
+            + Technical Density x 0.1 + Speed x 0.1
+
+Speed is the execution time normalised as on the A/B radar chart
+(1 - time/10s, floored at 0). Kept separate so alternative runners (cached,
+batched, adaptive) produce results in exactly the same shape.
+
+All texts of a test are tokenised in a single pass (whitespace split, then
+each distinct raw token split into words and punctuation once), and every
+metric is computed with NumPy over the resulting token-id arrays: lexicons
+are matched as precompiled word-id sequences, sentence-level scores come from
+per-token sentence ids, and consistency is the pairwise Jaccard similarity of
+a binary text x term matrix computed with one matrix product per variant.
+
+Word boundaries follow the regexes the metrics were first written with
+(\b, Unicode-aware): "30日" or "premium_x" is not a whole number or term.
+Two cases still score differently from those regexes, because whitespace
+splitting keeps apostrophes inside words and does not record how much
+whitespace separated two words: a term with an apostrophe attached
+("premium's", "'add") is not counted, and a multi-word term split by more than
+one space or a tab ("value  proposition") is.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+    pc = None
+
+
+# Text metrics in the composite; speed comes from avg_execution_time
+COMPOSITE_WEIGHTS = {
+    'consistency': 0.2,
+    'specificity_score': 0.3,
+    'actionability_score': 0.3,
+    'technical_density': 0.1
+}
+SPEED_WEIGHT = 0.1
+
+GENERIC_PHRASES = [
+    'high quality', 'best in class', 'world class', 'cutting edge', 'innovative',
+    'unique', 'various', 'many', 'some', 'generally', 'overall', 'it depends',
+    'in today\'s', 'leverage', 'synergy', 'holistic', 'robust', 'seamless'
+]
+
+ACTION_VERBS = [
+    'add', 'replace', 'remove', 'test', 'introduce', 'reduce', 'increase', 'highlight',
+    'include', 'emphasize', 'emphasise', 'lead with', 'launch', 'reposition', 'clarify',
+    'quantify', 'segment', 'target', 'shorten', 'rewrite', 'benchmark', 'partner',
+    'offer', 'bundle', 'price', 'cite', 'show', 'move', 'prioritize', 'prioritise'
+]
+
+TECHNICAL_TERMS = [
+    'positioning', 'differentiation', 'value proposition', 'segmentation', 'targeting',
+    'brand equity', 'price elasticity', 'price anchoring', 'premium', 'conversion',
+    'funnel', 'retention', 'acquisition', 'share of voice', 'social proof', 'credibility',
+    'heritage', 'perceived value', 'willingness to pay', 'competitive set', 'usp',
+    'persona', 'objection', 'scarcity', 'urgency', 'claims', 'clinical', 'efficacy'
+]
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# A raw (whitespace-separated) token splits into ASCII words, runs of other
+# word characters ("é") and single punctuation marks
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9']+|[^\WA-Za-z0-9]+|[^\w\s']")
+WORD_TOKEN = re.compile(r"[A-Za-z0-9']+")
+OTHER_WORD_TOKEN = re.compile(r'[^\WA-Za-z0-9]')
+NUMBER_TOKEN = re.compile(r'\d+')
+ENDS_WITH_DIGIT = re.compile(r'\d$')
+STARTS_WITH_DIGIT = re.compile(r'^\d')
+CAPITALISED_TOKEN = re.compile(r'[A-Z][a-z]+')
+# A phrase may end on a possessive ("Future Shiseido's")
+CAPITALISED_END_TOKEN = re.compile(r"[A-Z][a-z]+(?:'|$)")
+
+SENTENCE_ENDS = {'.', '!', '?'}
+NEWLINE = '\x01'
+TEXT_BREAK = '\x00'
+
+
+def output_text(result: Dict) -> str:
+    """Raw text of one iteration's result ('' for failures)"""
+    if not result.get('success'):
+        return ''
+    output = result.get('output', {})
+    return output.get('raw_response') or ' '.join(
+        str(v) for k, v in output.items() if not k.startswith('_')
+    )
+
+
+def split_and_encode(text: str) -> Tuple[np.ndarray, List[str]]:
+    """Whitespace-split a text into (codes, distinct tokens); uses Arrow's C++ kernels when available"""
+    if pc is not None:
+        encoded = pc.dictionary_encode(pc.utf8_split_whitespace(pa.array([text], type=pa.large_string())).flatten())
+        return encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary.to_pylist()
+    codes, uniques = pd.factorize(np.array(text.split(), dtype=object))
+    return codes, list(uniques)
+
+
+class Lexicon:
+    """A term list precompiled to lowercase word-id sequences for one TextBatch"""
+
+    def __init__(self, terms: List[str]):
+        self.terms = [tuple(WORD_PATTERN.findall(term.lower())) for term in terms]
+
+    def match_starts(self, batch: 'TextBatch', per_term: bool = False):
+        """Token positions where a term starts (one mask per term, or their union)"""
+        ids = batch.lower_ids
+        masks = []
+        for words in self.terms:
+            word_ids = [batch.lower_vocabulary.get(w, -2) for w in words]
+            if -2 in word_ids:
+                continue
+            mask = (ids == word_ids[0]) & ~batch.glued_before
+            for offset, word_id in enumerate(word_ids[1:], 1):
+                mask[:-offset] &= ids[offset:] == word_id
+                mask[-offset:] = False
+            last = len(word_ids) - 1
+            if last:
+                mask[:-last] &= ~batch.glued_after[last:]
+            else:
+                mask &= ~batch.glued_after
+            masks.append(mask)
+
+        if per_term:
+            return masks
+        union = np.zeros(len(ids), dtype=bool)
+        for mask in masks:
+            union |= mask
+        return union
+
+    def counts(self, batch: 'TextBatch') -> np.ndarray:
+        """Occurrences per text, each term counted separately"""
+        total = np.zeros(batch.n, dtype=np.int64)
+        for mask in self.match_starts(batch, per_term=True):
+            total += batch.per_text(mask)
+        return total
+
+
+GENERIC_LEXICON = Lexicon(GENERIC_PHRASES)
+ACTION_LEXICON = Lexicon(ACTION_VERBS)
+TECHNICAL_LEXICON = Lexicon(TECHNICAL_TERMS)
+
+
+class TextBatch:
+    """Every text of a test tokenised once into NumPy arrays"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.n = len(texts)
+
+        joined = f" {TEXT_BREAK} ".join(t.replace('\n', f" {NEWLINE} ") for t in texts)
+        raw_codes, raw_tokens = split_and_encode(joined)
+
+        # Split each distinct raw token once, then expand to the full token stream
+        vocabulary = {}
+        pieces = [
+            [vocabulary.setdefault(piece, len(vocabulary))
+             for piece in ([raw] if raw in (TEXT_BREAK, NEWLINE) else TOKEN_PATTERN.findall(raw))]
+            for raw in raw_tokens
+        ]
+        lengths = np.array([len(p) for p in pieces], dtype=np.int64)
+        flat = np.fromiter((i for p in pieces for i in p), dtype=np.int64, count=int(lengths.sum()))
+        piece_starts = np.cumsum(lengths) - lengths
+
+        occurrence_lengths = lengths[raw_codes]
+        occurrence_starts = np.cumsum(occurrence_lengths) - occurrence_lengths
+        within = np.arange(int(occurrence_lengths.sum())) - np.repeat(occurrence_starts, occurrence_lengths)
+        token_ids = flat[np.repeat(piece_starts[raw_codes], occurrence_lengths) + within]
+
+        # Per-vocabulary-entry properties, looked up for every token
+        words = list(vocabulary)
+        self.lower_vocabulary = {}
+        lower_of = np.array([
+            self.lower_vocabulary.setdefault(w.lower(), len(self.lower_vocabulary)) if WORD_TOKEN.fullmatch(w) else -1
+            for w in words
+        ] or [-1], dtype=np.int64)
+        is_break = np.array([w == TEXT_BREAK for w in words] or [False])
+        is_boundary = np.array([w in SENTENCE_ENDS or w in (NEWLINE, TEXT_BREAK) for w in words] or [False])
+        is_number = np.array([bool(NUMBER_TOKEN.fullmatch(w)) for w in words] or [False])
+        ends_with_digit = np.array([bool(ENDS_WITH_DIGIT.search(w)) for w in words] or [False])
+        starts_with_digit = np.array([bool(STARTS_WITH_DIGIT.match(w)) for w in words] or [False])
+        is_percent = np.array([w == '%' for w in words] or [False])
+        is_dollar = np.array([w == '$' for w in words] or [False])
+        is_capitalised = np.array([bool(CAPITALISED_TOKEN.fullmatch(w)) for w in words] or [False])
+        is_capitalised_end = np.array([bool(CAPITALISED_END_TOKEN.match(w)) for w in words] or [False])
+        is_other_word = np.array([bool(OTHER_WORD_TOKEN.match(w)) for w in words] or [False])
+
+        self.lower_ids = lower_of[token_ids]
+        self.text_ids = np.cumsum(is_break[token_ids])
+        self.sentence_ids = np.cumsum(is_boundary[token_ids])
+        self.content = ~is_boundary[token_ids]
+        self.is_word = self.lower_ids >= 0
+
+        # A token glued to a non-ASCII word character ("30日", "Clé", "premium_x") has no
+        # word boundary (\b) on that side, so it is not a whole number, phrase word or term there
+        self.glued_before = np.zeros(len(token_ids), dtype=bool)
+        self.glued_before[1:] = (within[1:] > 0) & is_other_word[token_ids[:-1]]
+        self.glued_after = np.zeros(len(token_ids), dtype=bool)
+        self.glued_after[:-1] = (within[1:] > 0) & is_other_word[token_ids[1:]]
+
+        phrase_starts = np.zeros(len(token_ids), dtype=bool)
+        phrase_starts[:-1] = (is_capitalised[token_ids[:-1]] & ~self.glued_before[:-1]
+                              & is_capitalised_end[token_ids[1:]] & ~self.glued_after[1:])
+
+        # Specific: a whole number, digits followed by '%' or preceded by '$', or a capitalised phrase
+        percent = np.zeros(len(token_ids), dtype=bool)
+        percent[:-1] = ends_with_digit[token_ids[:-1]] & (within[1:] > 0) & is_percent[token_ids[1:]]
+        dollar = np.zeros(len(token_ids), dtype=bool)
+        dollar[1:] = starts_with_digit[token_ids[1:]] & (within[1:] > 0) & is_dollar[token_ids[:-1]]
+        whole_number = is_number[token_ids] & ~self.glued_before & ~self.glued_after
+        self.specific_starts = whole_number | percent | dollar | phrase_starts
+
+        self.words = self.per_text(self.is_word)
+        self.sentences = self.sentences_with(self.content)
+
+    def per_text(self, mask: np.ndarray) -> np.ndarray:
+        return np.bincount(self.text_ids[mask], minlength=self.n)[:self.n]
+
+    def sentences_with(self, mask: np.ndarray) -> np.ndarray:
+        """Per text, how many sentences contain at least one masked token"""
+        sentence_ids = self.sentence_ids[mask]
+        first = np.ones(len(sentence_ids), dtype=bool)
+        first[1:] = sentence_ids[1:] != sentence_ids[:-1]
+        return np.bincount(self.text_ids[mask][first], minlength=self.n)[:self.n]
+
+    def term_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Distinct (text, lowercase word id) pairs, sorted by text"""
+        width = max(1, len(self.lower_vocabulary))
+        keys = np.sort(pd.unique(self.text_ids[self.is_word] * width + self.lower_ids[self.is_word]))
+        return keys // width, keys % width
+
+    def per_text_mean(self, values: np.ndarray, mask: np.ndarray, rows: slice) -> float:
+        values, mask = values[rows], mask[rows]
+        return float(values[mask].mean()) if mask.any() else 0.0
+
+
+def pairwise_jaccard(matrix: np.ndarray) -> np.ndarray:
+    """All pairwise Jaccard similarities of the rows of a binary matrix"""
+    intersection = matrix @ matrix.T
+    sizes = np.diag(intersection)
+    union = sizes[:, None] + sizes[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+
+
+def group_consistency(batch: TextBatch, rows: slice, pair_texts: np.ndarray, pair_terms: np.ndarray) -> float:
+    """Mean pairwise vocabulary overlap across one variant's iterations (1.0 = identical)"""
+    present = [i for i in range(rows.start, rows.stop) if batch.texts[i]]
+    if len(present) < 2:
+        return 1.0 if present else 0.0
+
+    lo, hi = np.searchsorted(pair_texts, [rows.start, rows.stop])
+    local_terms, columns = np.unique(pair_terms[lo:hi], return_inverse=True)
+
+    # Only non-empty texts have words, so every pair maps to a row
+    row_of = np.full(rows.stop - rows.start, -1)
+    row_of[np.array(present) - rows.start] = np.arange(len(present))
+
+    matrix = np.zeros((len(present), max(1, len(local_terms))), dtype=np.float32)
+    matrix[row_of[pair_texts[lo:hi] - rows.start], columns] = 1.0
+
+    similarity = pairwise_jaccard(matrix)
+    return float(similarity[np.triu_indices(len(present), k=1)].mean())
+
+
+def text_scores(batch: TextBatch) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-text specificity, actionability and technical density"""
+    sentences = np.maximum(batch.sentences, 1)
+    specific = batch.sentences_with(batch.specific_starts)
+    generic = GENERIC_LEXICON.counts(batch)
+    specificity = np.maximum(0.0, np.minimum(1.0, specific / sentences) - np.minimum(0.5, generic / sentences * 0.5))
+    actionability = batch.sentences_with(ACTION_LEXICON.match_starts(batch)) / sentences
+    technical = np.minimum(1.0, TECHNICAL_LEXICON.counts(batch) / np.maximum(batch.words, 1) * 10)
+    return specificity, actionability, technical
+
+
+def batch_metrics(texts_by_group: Dict[str, List[str]], ground_truth: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Text metrics for every group (variant) of texts, from one shared tokenisation"""
+    all_texts = [text for texts in texts_by_group.values() for text in texts]
+    batch = TextBatch(all_texts)
+    has_sentences = batch.sentences > 0
+    specificity, actionability, technical = text_scores(batch)
+
+    pair_texts, pair_terms = batch.term_pairs()
+
+    truth = None
+    if ground_truth:
+        fields = []
+        for expected in ground_truth.values():
+            expected_words = set(WORD_PATTERN.findall(str(expected).lower()))
+            if not expected_words:
+                continue
+            ids = [batch.lower_vocabulary[w] for w in expected_words if w in batch.lower_vocabulary]
+            found = np.bincount(pair_texts[np.isin(pair_terms, ids)], minlength=batch.n)[:batch.n]
+            fields.append(found / len(expected_words))
+        truth = np.column_stack(fields) if fields else None
+
+    results = {}
+    start = 0
+    for group, texts in texts_by_group.items():
+        rows = slice(start, start + len(texts))
+        start += len(texts)
+
+        results[group] = {
+            'consistency': group_consistency(batch, rows, pair_texts, pair_terms),
+            'specificity_score': batch.per_text_mean(specificity, has_sentences, rows),
+            'actionability_score': batch.per_text_mean(actionability, has_sentences, rows),
+            'technical_density': batch.per_text_mean(technical, batch.words > 0, rows)
+        }
+        if ground_truth:
+            results[group]['ground_truth_similarity'] = (
+                float(truth[rows].mean()) if truth is not None and len(texts) else 0.0
+            )
+
+    return results
+
+
+def consistency(texts: List[str]) -> float:
+    return batch_metrics({'texts': texts})['texts']['consistency']
+
+
+def specificity_score(texts: List[str]) -> float:
+    return batch_metrics({'texts': texts})['texts']['specificity_score']
+
+
+def actionability_score(texts: List[str]) -> float:
+    return batch_metrics({'texts': texts})['texts']['actionability_score']
+
+
+def technical_density(texts: List[str]) -> float:
+    return batch_metrics({'texts': texts})['texts']['technical_density']
+
+
+def all_variant_metrics(results_by_variant: Dict[str, List[Dict]], ground_truth: Optional[Dict] = None) -> Dict[str, Dict]:
+    """Metrics for every variant of a test at once"""
+    texts = {
+        variant_id: [output_text(r) for r in results if r and r.get('success')]
+        for variant_id, results in results_by_variant.items()
+    }
+    metrics = batch_metrics(texts, ground_truth)
+
+    for variant_id, results in results_by_variant.items():
+        successes = [r for r in results if r and r.get('success')]
+        metrics[variant_id]['avg_execution_time'] = (
+            sum(r.get('execution_time', 0) for r in successes) / len(successes) if successes else 0.0
+        )
+        metrics[variant_id]['success_rate'] = len(successes) / len(results) if results else 0.0
+        if not ground_truth:
+            metrics[variant_id].pop('ground_truth_similarity', None)
+
+    return metrics
+
+
+def variant_metrics(results: List[Dict], ground_truth: Optional[Dict] = None) -> Dict:
+    """All metrics for one variant from its per-iteration results"""
+    return all_variant_metrics({'variant': results}, ground_truth)['variant']
+
+
+def speed_score(metrics: Dict) -> float:
+    """1.0 for an instant answer, 0.0 at 10s or more"""
+    return 1.0 - min(metrics.get('avg_execution_time', 0) / 10.0, 1.0)
+
+
+def composite_score(metrics: Dict) -> float:
+    return (sum(metrics.get(name, 0) * weight for name, weight in COMPOSITE_WEIGHTS.items())
+            + speed_score(metrics) * SPEED_WEIGHT)
+
+
+def output_quality(result: Dict) -> float:
+    """
+    Composite score of a single output's text. Consistency needs several
+    outputs and speed is not a property of the text, so both are left out and
+    the remaining weights are rescaled to sum to 1.
+    """
+    if not result or not result.get('success'):
+        return 0.0
+    metrics = batch_metrics({'output': [output_text(result)]})['output']
+    weights = {name: weight for name, weight in COMPOSITE_WEIGHTS.items() if name != 'consistency'}
+    return sum(metrics[name] * weight for name, weight in weights.items()) / sum(weights.values())
+
+
+def text_quality(texts: List[str]) -> np.ndarray:
+    """output_quality for many texts at once, from one tokenisation (0 for empty texts)"""
+    batch = TextBatch(texts)
+    specificity, actionability, technical = text_scores(batch)
+    weights = {name: weight for name, weight in COMPOSITE_WEIGHTS.items() if name != 'consistency'}
+    quality = (np.where(batch.sentences > 0, specificity, 0.0) * weights['specificity_score']
+               + np.where(batch.sentences > 0, actionability, 0.0) * weights['actionability_score']
+               + np.where(batch.words > 0, technical, 0.0) * weights['technical_density'])
+    return quality / sum(weights.values())
+
+
+def document_frequencies(texts: List[str]) -> Dict[str, float]:
+    """Smoothed inverse document frequency of every lowercase word in a corpus"""
+    batch = TextBatch(texts)
+    _, pair_terms = batch.term_pairs()
+    counts = np.bincount(pair_terms, minlength=len(batch.lower_vocabulary))
+    idf = np.log((1 + batch.n) / (1 + counts)) + 1
+    return dict(zip(batch.lower_vocabulary, idf.tolist()))
+
+
+def truth_coverage(texts: List[str], truths: List[Optional[Dict]],
+                   idf: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    For each text, the share of each of its ground-truth fields' words that it
+    contains (IDF-weighted when idf is given, so rare words count for more),
+    averaged over the fields. NaN where a text has no ground truth. All texts
+    and fields are tokenised together and matched as (text, word) pairs.
+    """
+    fields = [(i, str(expected)) for i, truth in enumerate(truths) if truth
+              for expected in truth.values() if WORD_PATTERN.search(str(expected).lower())]
+    coverage = np.full(len(texts), np.nan)
+    if not fields:
+        return coverage
+
+    n = len(texts)
+    batch = TextBatch(list(texts) + [text for _, text in fields])
+    pair_texts, pair_terms = batch.term_pairs()
+    width = max(1, len(batch.lower_vocabulary))
+
+    in_output = pair_texts < n
+    output_keys = pair_texts[in_output] * width + pair_terms[in_output]
+
+    field_index = pair_texts[~in_output] - n
+    field_owner = np.array([i for i, _ in fields])
+    terms = pair_terms[~in_output]
+    found = np.isin(field_owner[field_index] * width + terms, output_keys)
+
+    if idf:
+        fallback = max(idf.values())
+        weights = np.array([idf.get(word, fallback) for word in batch.lower_vocabulary])[terms]
+    else:
+        weights = np.ones(len(terms))
+
+    per_field = (np.bincount(field_index, weights=weights * found, minlength=len(fields))
+                 / np.maximum(np.bincount(field_index, weights=weights, minlength=len(fields)), 1e-12))
+    fields_per_text = np.bincount(field_owner, minlength=n)
+    scored = fields_per_text > 0
+    coverage[scored] = np.bincount(field_owner, weights=per_field, minlength=n)[scored] / fields_per_text[scored]
+    return coverage
+
+
+def pick_winner(results: Dict) -> Dict:
+    """Winner block in the PromptTester format from {variant_id: {'config', 'metrics'}}"""
+    all_scores = {vid: composite_score(data['metrics']) for vid, data in results.items()}
+    winner_id = max(all_scores, key=all_scores.get)
+
+    return {
+        'variant_id': winner_id,
+        'variant_name': results[winner_id]['config']['name'],
+        'composite_score': all_scores[winner_id],
+        'all_scores': all_scores
+    }
@@ -0,0 +1,782 @@
+"""
+Local stand-in for the Anthropic Messages API.
+
+Serves POST /v1/messages with the same request/response shape as the real
+API so WorkflowEngine, PromptTester and the apps can run without a network
+connection. Point the Anthropic client at it with:
+
+    python -m orchestrator.mock_server --port 8765
+    export ANTHROPIC_BASE_URL=http://127.0.0.1:8765
+
+Three modes are supported:
+    mock   - synthesize responses with configurable latency, tokens and errors,
+             plus slow stragglers (slow_rate x slow_factor) for tail-latency tests;
+             latency scales with the model family (MODEL_LATENCY), and
+             weak_draft_rate makes that share of small-model answers unusable
+    record - forward requests to the real API and capture them into a cassette
+    replay - answer from a cassette only (deterministic, no network)
+
+Requests with "stream": true are answered as server-sent events in every mode.
+Blocks marked with cache_control are cached like the real prompt cache, so
+usage reports cache_creation_input_tokens / cache_read_input_tokens and
+cache hits answer faster.
+
+The Message Batches endpoints (/v1/messages/batches) are also served: batches
+are processed in the background after batch_delay seconds and their results
+are available as JSONL, as with the real API.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+UPSTREAM_URL = 'https://api.anthropic.com'
+
+FORWARDED_HEADERS = ['x-api-key', 'authorization', 'anthropic-version', 'anthropic-beta', 'content-type']
+
+ERROR_TYPES = {
+    400: 'invalid_request_error',
+    404: 'not_found_error',
+    429: 'rate_limit_error',
+    500: 'api_error',
+    529: 'overloaded_error'
+}
+
+DEFAULT_SECTIONS = [
+    'Strategic Assessment',
+    'Key Strength',
+    'Key Weakness',
+    'Recommendations'
+]
+
+# Latency multiplier per model family (haiku answers faster than sonnet, opus slower)
+MODEL_LATENCY = {'haiku': 0.35, 'sonnet': 1.0, 'opus': 1.8}
+
+SMALL_MODEL_FAMILY = 'haiku'
+
+WEAK_WORDS = 'overall various many generally some innovative unique quality good'.split()
+
+FILLER_WORDS = (
+    'positioning premium audience differentiation credibility pricing evidence '
+    'clinical heritage retention conversion messaging proof value segment '
+    'benchmark channel launch claim trust competitive'
+).split()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def request_blocks(body: Dict) -> List[Dict]:
+    """System and message content of a request as an ordered list of text blocks"""
+    blocks = []
+
+    system = body.get('system', '')
+    if isinstance(system, list):
+        blocks.extend(system)
+    elif system:
+        blocks.append({'type': 'text', 'text': system})
+
+    for message in body.get('messages', []):
+        content = message.get('content', '')
+        if isinstance(content, list):
+            blocks.extend(block for block in content if isinstance(block, dict))
+        else:
+            blocks.append({'type': 'text', 'text': content})
+
+    return blocks
+
+
+def request_text(body: Dict) -> str:
+    """Flatten the system prompt and messages of a request into plain text"""
+    return '\n'.join(block.get('text', '') for block in request_blocks(body))
+
+
+class LatencyModel:
+    """Samples per-request latency from a named distribution (seconds)"""
+
+    DISTRIBUTIONS = ['fixed', 'uniform', 'normal', 'lognormal']
+
+    def __init__(self, distribution: str = 'lognormal', mean: float = 0.5,
+                 stddev: float = 0.2, rng: Optional[random.Random] = None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+
+        self.distribution = distribution
+        self.mean = mean
+        self.stddev = stddev
+        self.rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+
+        if self.distribution == 'fixed':
+            value = self.mean
+        elif self.distribution == 'uniform':
+            value = self.rng.uniform(self.mean - self.stddev, self.mean + self.stddev)
+        elif self.distribution == 'normal':
+            value = self.rng.gauss(self.mean, self.stddev)
+        else:
+            # Parameterise the lognormal so its mean/stddev match the requested values
+            variance = math.log(1 + (self.stddev ** 2) / (self.mean ** 2))
+            mu = math.log(self.mean) - variance / 2
+            value = self.rng.lognormvariate(mu, math.sqrt(variance))
+
+        return max(0.0, value)
+
+
+class RateLimiter:
+    """Token bucket limiting requests per minute"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None):
+        self.capacity = requests_per_minute
+        self.tokens = float(requests_per_minute or 0)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> Optional[float]:
+        """Take one token. Returns None on success, or seconds until the next token."""
+        if not self.capacity:
+            return None
+
+        with self.lock:
+            now = time.monotonic()
+            refill = (now - self.updated) * self.capacity / 60.0
+            self.tokens = min(self.capacity, self.tokens + refill)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+
+            return (1 - self.tokens) * 60.0 / self.capacity
+
+
+class PromptCache:
+    """Prefix cache keyed on everything up to a cache_control breakpoint"""
+
+    def __init__(self, ttl: float = 300.0, min_tokens: int = 1024):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.entries: Dict[str, Tuple[float, float]] = {}  # key -> (readable from, expires at)
+        self.lock = threading.Lock()
+
+    def apply(self, body: Dict, ready_after: float = 0.0) -> Tuple[int, int, int]:
+        """
+        Return (uncached input, cache write, cache read) token counts for a request.
+        Like the real cache, a new entry is only readable once the request that
+        wrote it has started responding (ready_after seconds from now).
+        """
+        blocks = request_blocks(body)
+        total = estimate_tokens('\n'.join(block.get('text', '') for block in blocks))
+
+        # Cumulative prefix token counts and hashes at each breakpoint
+        breakpoints = []
+        digest = hashlib.sha256(str(body.get('model')).encode('utf-8'))
+        prefix_chars = 0
+        for block in blocks:
+            text = block.get('text', '')
+            digest.update(text.encode('utf-8'))
+            prefix_chars += len(text) + 1
+            if block.get('cache_control'):
+                breakpoints.append((digest.hexdigest(), max(1, prefix_chars // 4)))
+
+        cached = created = 0
+        now = time.monotonic()
+
+        with self.lock:
+            for key, tokens in breakpoints:
+                if tokens < self.min_tokens:
+                    continue
+                readable_from, expires_at = self.entries.get(key, (0.0, 0.0))
+                if readable_from <= now < expires_at:
+                    cached = max(cached, tokens)
+                    self.entries[key] = (readable_from, now + self.ttl)
+                else:
+                    created = max(created, tokens)
+                    if expires_at <= now:
+                        self.entries[key] = (now + ready_after, now + self.ttl)
+
+        created = max(0, created - cached)
+        uncached = max(0, total - cached - created)
+        return uncached, created, cached
+
+
+class Cassette:
+    """JSON file of recorded request/response pairs keyed by request fingerprint"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, List[Dict]] = {}
+        self.cursors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f).get('interactions', {})
+
+    @staticmethod
+    def fingerprint(body: Dict) -> str:
+        """Stable key for a request; ignores fields that do not change the answer"""
+        relevant = {k: v for k, v in body.items() if k not in ('stream', 'metadata')}
+        canonical = json.dumps(relevant, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def record(self, body: Dict, status: int, response: Dict):
+        key = self.fingerprint(body)
+
+        with self.lock:
+            self.entries.setdefault(key, []).append({
+                'request': body,
+                'status': status,
+                'response': response
+            })
+            self.save()
+
+    def lookup(self, body: Dict) -> Optional[Dict]:
+        """Return the next recorded interaction for this request, cycling through repeats"""
+        key = self.fingerprint(body)
+
+        with self.lock:
+            interactions = self.entries.get(key)
+            if not interactions:
+                return None
+
+            cursor = self.cursors.get(key, 0)
+            self.cursors[key] = cursor + 1
+            return interactions[cursor % len(interactions)]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'interactions': self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class MockModelServer:
+    """Threaded HTTP server that speaks the Messages API shape"""
+
+    MODES = ['mock', 'record', 'replay']
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, mode: str = 'mock',
+                 latency: str = 'lognormal', latency_mean: float = 0.5, latency_stddev: float = 0.2,
+                 output_tokens: int = 300, output_tokens_jitter: int = 50,
+                 error_rate: float = 0.0, error_status: int = 529,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0, weak_draft_rate: float = 0.0,
+                 requests_per_minute: Optional[int] = None,
+                 cassette: Optional[str] = None, upstream: str = UPSTREAM_URL,
+                 response_text: Optional[str] = None, stream_chunk_delay: float = 0.01,
+                 cache_min_tokens: int = 1024, cache_speedup: float = 0.5,
+                 batch_delay: float = 1.0, seed: Optional[int] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        if mode in ('record', 'replay') and not cassette:
+            raise ValueError(f"Mode '{mode}' requires a cassette path")
+
+        self.mode = mode
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.latency = LatencyModel(latency, latency_mean, latency_stddev, self.rng)
+        self.output_tokens = output_tokens
+        self.output_tokens_jitter = output_tokens_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.weak_draft_rate = weak_draft_rate
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.cassette = Cassette(cassette) if cassette else None
+        self.upstream = upstream.rstrip('/')
+        self.response_text = response_text
+        self.stream_chunk_delay = stream_chunk_delay
+        self.prompt_cache = PromptCache(min_tokens=cache_min_tokens)
+        self.cache_speedup = cache_speedup
+        self.batch_delay = batch_delay
+        self.batches: Dict[str, Dict] = {}
+        self.batch_results: Dict[str, List[Dict]] = {}
+        self.batches_lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'responses': 0,
+            'errors': 0,
+            'rate_limited': 0,
+            'slow': 0,
+            'weak': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'cache_creation_input_tokens': 0,
+            'cache_read_input_tokens': 0
+        }
+        self.stats_lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockModelServer':
+        """Serve in a background thread"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def snapshot_stats(self) -> Dict:
+        with self.stats_lock:
+            return dict(self.stats)
+
+    # ------------------------------------------------------------------
+    # Response generation
+    # ------------------------------------------------------------------
+
+    def handle_messages(self, body: Dict, headers: Dict) -> Tuple[int, Dict, Dict]:
+        """Produce (status, response body, extra headers) for a Messages request"""
+        self.count(requests=1)
+
+        retry_after = self.rate_limiter.acquire()
+        if retry_after is not None:
+            self.count(rate_limited=1)
+            status, payload = self.error(429, 'Rate limit exceeded')
+            return status, payload, {'retry-after': str(math.ceil(retry_after))}
+
+        if self.mode == 'replay':
+            return (*self.replay(body), {})
+        if self.mode == 'record':
+            return (*self.forward(body, headers), {})
+
+        with self.rng_lock:
+            failed = self.rng.random() < self.error_rate
+            delay = self.latency.sample()
+            slow = self.rng.random() < self.slow_rate
+
+        if slow:
+            self.count(slow=1)
+            delay *= self.slow_factor
+        delay *= next((factor for family, factor in MODEL_LATENCY.items() if family in str(body.get('model'))), 1.0)
+
+        if failed:
+            time.sleep(delay)
+            return (*self.error(self.error_status, 'Injected failure'), {})
+
+        message = self.synthesize(body, ready_after=delay)
+
+        # Cached prefix tokens skip prefill, so cache hits answer faster
+        usage = message['usage']
+        prompt_tokens = usage['input_tokens'] + usage['cache_creation_input_tokens'] + usage['cache_read_input_tokens']
+        cached_fraction = usage['cache_read_input_tokens'] / prompt_tokens if prompt_tokens else 0.0
+        time.sleep(delay * (1 - self.cache_speedup * cached_fraction))
+
+        return 200, message, {}
+
+    def synthesize(self, body: Dict, ready_after: float = 0.0) -> Dict:
+        """Build a deterministic-looking structured answer for the request"""
+        input_tokens, cache_created, cache_read = self.prompt_cache.apply(body, ready_after)
+
+        with self.rng_lock:
+            target = self.output_tokens + self.rng.randint(-self.output_tokens_jitter, self.output_tokens_jitter)
+            target = max(1, min(target, body.get('max_tokens', target)))
+            weak = SMALL_MODEL_FAMILY in str(body.get('model')) and self.rng.random() < self.weak_draft_rate
+            words = [self.rng.choice(WEAK_WORDS if weak else FILLER_WORDS) for _ in range(target)]
+
+        if self.response_text is not None:
+            text = self.response_text
+        elif weak:
+            # An unstructured, generic answer that a cascade should reject
+            self.count(weak=1)
+            text = ' '.join(words).capitalize() + '.'
+        else:
+            per_section = max(1, len(words) // len(DEFAULT_SECTIONS))
+            lines = []
+            for i, section in enumerate(DEFAULT_SECTIONS):
+                chunk = words[i * per_section:(i + 1) * per_section]
+                lines.append(f"{section.upper()}: {' '.join(chunk).capitalize()}.")
+            text = '\n\n'.join(lines)
+
+        self.count(
+            responses=1,
+            input_tokens=input_tokens,
+            output_tokens=target,
+            cache_creation_input_tokens=cache_created,
+            cache_read_input_tokens=cache_read
+        )
+
+        return {
+            'id': f"msg_mock_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model', 'mock-model'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {
+                'input_tokens': input_tokens,
+                'output_tokens': target,
+                'cache_creation_input_tokens': cache_created,
+                'cache_read_input_tokens': cache_read
+            }
+        }
+
+    def replay(self, body: Dict) -> Tuple[int, Dict]:
+        interaction = self.cassette.lookup(body)
+        if interaction is None:
+            return self.error(404, 'No cassette entry for this request')
+
+        self.count(responses=1)
+        return interaction['status'], interaction['response']
+
+    def forward(self, body: Dict, headers: Dict) -> Tuple[int, Dict]:
+        """Send the request to the real API and record whatever comes back"""
+        forwarded = {k: v for k, v in headers.items() if k.lower() in FORWARDED_HEADERS}
+        request = urllib.request.Request(
+            f"{self.upstream}/v1/messages",
+            data=json.dumps(dict(body, stream=False)).encode('utf-8'),
+            headers=forwarded,
+            method='POST'
+        )
+
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, raw = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, raw = e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            # Nothing came back, so there is nothing to record
+            return self.error(502, f"upstream unreachable: {e}")
+
+        try:
+            payload = json.loads(raw or b'{}')
+        except ValueError:
+            # e.g. an HTML error page from a proxy; recorded as an API error
+            payload = {
+                'type': 'error',
+                'error': {'type': ERROR_TYPES.get(status, 'api_error'),
+                          'message': raw[:500].decode('utf-8', 'replace')}
+            }
+
+        self.cassette.record(body, status, payload)
+        self.count(responses=1)
+        return status, payload
+
+    # ------------------------------------------------------------------
+    # Message Batches
+    # ------------------------------------------------------------------
+
+    def create_batch(self, body: Dict) -> Tuple[int, Dict]:
+        requests = body.get('requests', [])
+        if not requests:
+            return self.error(400, 'requests: must contain at least one request')
+
+        now = datetime.now(timezone.utc)
+        batch_id = f"msgbatch_mock_{uuid.uuid4().hex[:20]}"
+        batch = {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'in_progress',
+            'request_counts': {
+                'processing': len(requests), 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0
+            },
+            'created_at': now.isoformat(),
+            'expires_at': (now + timedelta(hours=24)).isoformat(),
+            'ended_at': None,
+            'cancel_initiated_at': None,
+            'archived_at': None,
+            'results_url': None
+        }
+
+        with self.batches_lock:
+            self.batches[batch_id] = batch
+
+        threading.Thread(target=self.process_batch, args=(batch_id, requests), daemon=True).start()
+        return 200, dict(batch)
+
+    def process_batch(self, batch_id: str, requests: List[Dict]):
+        """Answer every request in a batch after batch_delay, honouring error_rate and cancellation"""
+        time.sleep(self.batch_delay)
+        results = []
+
+        for item in requests:
+            with self.batches_lock:
+                canceled = self.batches[batch_id]['cancel_initiated_at'] is not None
+
+            if canceled:
+                result, counter = {'type': 'canceled'}, 'canceled'
+            else:
+                with self.rng_lock:
+                    failed = self.rng.random() < self.error_rate
+                if failed:
+                    _, error = self.error(self.error_status, 'Injected failure')
+                    result, counter = {'type': 'errored', 'error': error}, 'errored'
+                else:
+                    result, counter = {'type': 'succeeded', 'message': self.synthesize(item['params'])}, 'succeeded'
+
+            results.append({'custom_id': item['custom_id'], 'result': result})
+            with self.batches_lock:
+                counts = self.batches[batch_id]['request_counts']
+                counts['processing'] -= 1
+                counts[counter] += 1
+
+        with self.batches_lock:
+            batch = self.batches[batch_id]
+            batch['processing_status'] = 'ended'
+            batch['ended_at'] = datetime.now(timezone.utc).isoformat()
+            batch['results_url'] = f"{self.base_url}/v1/messages/batches/{batch_id}/results"
+            self.batch_results[batch_id] = results
+
+    def get_batch(self, batch_id: str) -> Tuple[int, Dict]:
+        with self.batches_lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return self.error(404, f"Batch not found: {batch_id}")
+            return 200, json.loads(json.dumps(batch))
+
+    def list_batches(self) -> Tuple[int, Dict]:
+        """Every batch, newest first, as a single page"""
+        with self.batches_lock:
+            batches = json.loads(json.dumps(list(reversed(list(self.batches.values())))))
+        return 200, {
+            'data': batches,
+            'has_more': False,
+            'first_id': batches[0]['id'] if batches else None,
+            'last_id': batches[-1]['id'] if batches else None
+        }
+
+    def cancel_batch(self, batch_id: str) -> Tuple[int, Dict]:
+        with self.batches_lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return self.error(404, f"Batch not found: {batch_id}")
+            if batch['processing_status'] == 'in_progress':
+                batch['processing_status'] = 'canceling'
+                batch['cancel_initiated_at'] = datetime.now(timezone.utc).isoformat()
+        return self.get_batch(batch_id)
+
+    def stream_events(self, message: Dict) -> Iterator[Tuple[str, Dict]]:
+        """Replay a complete message as the Messages API streaming event sequence"""
+        usage = message.get('usage', {})
+        start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=0))
+        yield 'message_start', {'type': 'message_start', 'message': start}
+
+        for index, block in enumerate(message.get('content', [])):
+            yield 'content_block_start', {
+                'type': 'content_block_start',
+                'index': index,
+                'content_block': {'type': 'text', 'text': ''}
+            }
+
+            # Emit a few words per delta so clients see tokens arrive incrementally
+            words = re.findall(r'\S+\s*', block.get('text', ''))
+            for i in range(0, len(words), 3):
+                time.sleep(self.stream_chunk_delay)
+                yield 'content_block_delta', {
+                    'type': 'content_block_delta',
+                    'index': index,
+                    'delta': {'type': 'text_delta', 'text': ''.join(words[i:i + 3])}
+                }
+
+            yield 'content_block_stop', {'type': 'content_block_stop', 'index': index}
+
+        yield 'message_delta', {
+            'type': 'message_delta',
+            'delta': {'stop_reason': message.get('stop_reason'), 'stop_sequence': message.get('stop_sequence')},
+            'usage': {'output_tokens': usage.get('output_tokens', 0)}
+        }
+        yield 'message_stop', {'type': 'message_stop'}
+
+    def error(self, status: int, message: str) -> Tuple[int, Dict]:
+        self.count(errors=1)
+        return status, {
+            'type': 'error',
+            'error': {'type': ERROR_TYPES.get(status, 'api_error'), 'message': message}
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle(self):
+                # Clients may drop a connection mid-response (e.g. the losing copy of a hedged request)
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length', 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    self.send_json(*server.error(400, 'Request body is not valid JSON'))
+                    return
+
+                path = self.path.split('?')[0].rstrip('/')
+                if path == '/v1/messages/batches':
+                    self.send_json(*server.create_batch(body))
+                    return
+                if path.startswith('/v1/messages/batches/') and path.endswith('/cancel'):
+                    self.send_json(*server.cancel_batch(path.split('/')[4]))
+                    return
+                if path != '/v1/messages':
+                    self.send_json(*server.error(404, f"Unknown endpoint: {self.path}"))
+                    return
+
+                status, payload, extra_headers = server.handle_messages(body, dict(self.headers))
+                if body.get('stream') and status == 200:
+                    self.send_stream(payload)
+                else:
+                    self.send_json(status, payload, extra_headers)
+
+            def do_GET(self):
+                parts = self.path.split('?')[0].rstrip('/').split('/')
+
+                if self.path == '/_stats':
+                    self.send_json(200, server.snapshot_stats())
+                elif parts[1:] == ['v1', 'messages', 'batches']:
+                    self.send_json(*server.list_batches())
+                elif parts[1:4] == ['v1', 'messages', 'batches'] and len(parts) == 5:
+                    self.send_json(*server.get_batch(parts[4]))
+                elif parts[1:4] == ['v1', 'messages', 'batches'] and len(parts) == 6 and parts[5] == 'results':
+                    self.send_jsonl(parts[4])
+                else:
+                    self.send_json(*server.error(404, f"Unknown endpoint: {self.path}"))
+
+            def send_jsonl(self, batch_id: str):
+                with server.batches_lock:
+                    results = server.batch_results.get(batch_id)
+                if results is None:
+                    self.send_json(*server.error(404, f"No results for batch: {batch_id}"))
+                    return
+
+                data = ''.join(json.dumps(line) + '\n' for line in results).encode('utf-8')
+                self.send_response(200)
+                self.send_header('content-type', 'application/binary')
+                self.send_header('content-length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_json(self, status: int, payload: Dict, extra_headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(data)))
+                self.send_header('request-id', f"req_mock_{uuid.uuid4().hex[:16]}")
+                for key, value in (extra_headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, message: Dict):
+                self.send_response(200)
+                self.send_header('content-type', 'text/event-stream')
+                self.send_header('cache-control', 'no-cache')
+                self.send_header('connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                for event, data in server.stream_events(message):
+                    self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mode', choices=MockModelServer.MODES, default='mock')
+    parser.add_argument('--cassette', help="Cassette file for record/replay modes")
+    parser.add_argument('--latency', choices=LatencyModel.DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-mean', type=float, default=0.5, help="Mean latency in seconds")
+    parser.add_argument('--latency-stddev', type=float, default=0.2)
+    parser.add_argument('--output-tokens', type=int, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument('--error-status', type=int, default=529)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fraction of requests that straggle")
+    parser.add_argument('--slow-factor', type=float, default=10.0, help="Latency multiplier for stragglers")
+    parser.add_argument('--weak-draft-rate', type=float, default=0.0,
+                        help="Fraction of small-model answers that are unstructured and generic")
+    parser.add_argument('--rpm', type=int, help="Requests per minute before returning 429")
+    parser.add_argument('--stream-chunk-delay', type=float, default=0.01, help="Seconds between streamed deltas")
+    parser.add_argument('--cache-min-tokens', type=int, default=1024, help="Smallest cacheable prompt prefix")
+    parser.add_argument('--batch-delay', type=float, default=1.0, help="Seconds before a batch is processed")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockModelServer(
+        host=args.host,
+        port=args.port,
+        mode=args.mode,
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+        weak_draft_rate=args.weak_draft_rate,
+        requests_per_minute=args.rpm,
+        cassette=args.cassette,
+        stream_chunk_delay=args.stream_chunk_delay,
+        cache_min_tokens=args.cache_min_tokens,
+        batch_delay=args.batch_delay,
+        seed=args.seed
+    )
+
+    print(f"Mock model server ({args.mode}) listening on {server.base_url}")
+    print(f"  export ANTHROPIC_BASE_URL={server.base_url}")
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping mock server.")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
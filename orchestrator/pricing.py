@@ -0,0 +1,134 @@
+"""
+Token pricing for cost estimates.
+
+Prices are USD per million tokens and are matched by model family, so dated
+model ids ('claude-sonnet-4-20250514') resolve without listing every version.
+Prompt-cache writes cost 1.25x the input price and cache reads 0.1x.
+Calls made through the Message Batches API are billed at half price.
+"""
+
+from typing import Dict, List, Union
+
+
+MODEL_PRICES = {
+    'opus': {'input': 15.00, 'output': 75.00},
+    'sonnet': {'input': 3.00, 'output': 15.00},
+    'haiku': {'input': 0.80, 'output': 4.00}
+}
+
+DEFAULT_FAMILY = 'sonnet'
+
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+
+BATCH_DISCOUNT = 0.50
+
+
+def model_prices(model: str) -> Dict:
+    for family, prices in MODEL_PRICES.items():
+        if family in (model or ''):
+            return prices
+    return MODEL_PRICES[DEFAULT_FAMILY]
+
+
+def token_breakdown(tokens_used: Union[int, Dict, None]) -> Dict:
+    """Normalise tokens_used (a plain total or a per-kind dict) to a per-kind dict"""
+    if isinstance(tokens_used, dict):
+        return {
+            'input_tokens': tokens_used.get('input_tokens', 0),
+            'output_tokens': tokens_used.get('output_tokens', 0),
+            'cache_creation_input_tokens': tokens_used.get('cache_creation_input_tokens', 0),
+            'cache_read_input_tokens': tokens_used.get('cache_read_input_tokens', 0)
+        }
+
+    return {
+        'input_tokens': tokens_used or 0,
+        'output_tokens': 0,
+        'cache_creation_input_tokens': 0,
+        'cache_read_input_tokens': 0
+    }
+
+
+def total_tokens(tokens_used: Union[int, Dict, None]) -> int:
+    return sum(token_breakdown(tokens_used).values())
+
+
+def call_cost(model: str, tokens_used: Union[int, Dict, None]) -> float:
+    """Actual USD cost of one call, including cache write/read pricing"""
+    prices = model_prices(model)
+    tokens = token_breakdown(tokens_used)
+
+    return (
+        tokens['input_tokens'] * prices['input']
+        + tokens['cache_creation_input_tokens'] * prices['input'] * CACHE_WRITE_MULTIPLIER
+        + tokens['cache_read_input_tokens'] * prices['input'] * CACHE_READ_MULTIPLIER
+        + tokens['output_tokens'] * prices['output']
+    ) / 1_000_000
+
+
+def billed_calls(call: Dict) -> List[Dict]:
+    """
+    The calls billed for one result: just the result, or for an escalated
+    cascade (orchestrator.cascade) the draft as well, priced at the draft model.
+    A cache hit (ChunkCache) keeps its cascade block but billed nothing.
+    """
+    cascade = call.get('cascade')
+    if not cascade or not cascade['escalated'] or call.get('cached'):
+        return [call]
+    draft = {'model': cascade['draft_model'], 'tokens_used': cascade['draft_tokens_used'], 'batch': call.get('batch')}
+    return [draft, call]
+
+
+def uncached_cost(model: str, tokens_used: Union[int, Dict, None]) -> float:
+    """What the same call would have cost with every prompt token billed at the input price"""
+    prices = model_prices(model)
+    tokens = token_breakdown(tokens_used)
+    prompt_tokens = (
+        tokens['input_tokens']
+        + tokens['cache_creation_input_tokens']
+        + tokens['cache_read_input_tokens']
+    )
+
+    return (prompt_tokens * prices['input'] + tokens['output_tokens'] * prices['output']) / 1_000_000
+
+
+def cache_report(calls: List[Dict]) -> Dict:
+    """
+    Prompt-cache savings over a set of phase1-style call results
+    (tokens and cost include the drafts of escalated cascades).
+    Latency saved compares calls that read the cache against those that did not.
+    """
+    successes = [c for c in calls if c.get('success')]
+    tokens = {key: 0 for key in token_breakdown(None)}
+    actual = uncached = 0.0
+
+    for call in (billed for success in successes for billed in billed_calls(success)):
+        for key, value in token_breakdown(call.get('tokens_used')).items():
+            tokens[key] += value
+        discount = BATCH_DISCOUNT if call.get('batch') else 1.0
+        actual += call_cost(call.get('model'), call.get('tokens_used')) * discount
+        uncached += uncached_cost(call.get('model'), call.get('tokens_used')) * discount
+
+    hits = [c for c in successes if token_breakdown(c.get('tokens_used'))['cache_read_input_tokens']]
+    misses = [c for c in successes if c not in hits]
+
+    latency_saved = 0.0
+    if hits and misses:
+        mean_hit = sum(c['execution_time'] for c in hits) / len(hits)
+        mean_miss = sum(c['execution_time'] for c in misses) / len(misses)
+        latency_saved = max(0.0, mean_miss - mean_hit) * len(hits)
+
+    prompt_tokens = (
+        tokens['input_tokens'] + tokens['cache_creation_input_tokens'] + tokens['cache_read_input_tokens']
+    )
+
+    return {
+        'calls': len(successes),
+        'cache_hits': len(hits),
+        'tokens': tokens,
+        'cached_prompt_share': tokens['cache_read_input_tokens'] / prompt_tokens if prompt_tokens else 0.0,
+        'cost': actual,
+        'cost_without_cache': uncached,
+        'cost_saved': uncached - actual,
+        'latency_saved': latency_saved
+    }
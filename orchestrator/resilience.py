@@ -0,0 +1,386 @@
+"""
+Retries, hedged requests and circuit breaking for agent calls.
+
+ResilientAgentClient is a drop-in AgentClient for the workflows and runners:
+
+    retries  - transient failures (429, 5xx/529 overloaded, connection errors
+               and timeouts) are retried with full-jitter exponential backoff,
+               honouring retry-after; bad requests fail immediately. Streams
+               are only retried before their first token.
+    hedging  - optional: when an attempt has not answered (call) or started
+               answering (stream) within the agent's recent p95 latency, a
+               duplicate is sent and whichever responds first is used. The
+               losing stream is closed; a losing blocking call runs to
+               completion and its answer is discarded.
+    breaker  - per model, consecutive transient failures open the circuit and
+               further calls fail fast until reset_timeout has passed, then a
+               single probe decides whether it closes again.
+
+Results gain 'attempts', 'retries' and 'hedged' fields (and 'circuit_open' when
+rejected), and report() returns the counts per agent. Run it against the
+fault-injecting mock server with:
+
+    python benchmark.py --target resilience --error-rate 0.2 --slow-rate 0.05
+"""
+
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+import anthropic
+import numpy as np
+
+from orchestrator.agent_client import AgentClient
+from orchestrator.telemetry import TELEMETRY
+from orchestrator.tracing import span
+
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+RETRYABLE_ERROR_TYPES = {'APIConnectionError', 'APITimeoutError'}
+
+COUNTERS = ['calls', 'retries', 'hedges', 'hedge_wins', 'failures', 'rejected']
+
+# Set AGENT_HEDGING=1 (e.g. in .env) to hedge slow calls in the apps
+HEDGING_ENV = 'AGENT_HEDGING'
+
+
+def hedging_enabled() -> bool:
+    return os.getenv(HEDGING_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+def is_retryable(result: Dict) -> bool:
+    """Whether a failed result came from a transient upstream problem"""
+    if result.get('error_type') in RETRYABLE_ERROR_TYPES:
+        return True
+    status_code = result.get('status_code')
+    return bool(status_code) and (status_code in RETRYABLE_STATUS or status_code >= 500)
+
+
+def describe_attempts(result: Dict) -> str:
+    """'2 retries, hedged' style note for a result ('' when it took a single plain attempt)"""
+    notes = []
+    if result.get('retries'):
+        notes.append(f"{result['retries']} {'retry' if result['retries'] == 1 else 'retries'}")
+    if result.get('hedged'):
+        notes.append("hedged")
+    if result.get('circuit_open'):
+        notes.append("circuit open")
+    return ', '.join(notes)
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open probe after reset_timeout"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probing = False
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+            self.probing = False
+
+
+class LatencyTracker:
+    """Recent successful latencies for one agent, used to pick the hedging delay"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            return float(np.quantile(list(self.samples), q))
+
+
+class ResilientAgentClient(AgentClient):
+    """AgentClient with retries, optional hedged requests and a per-model circuit breaker"""
+
+    def __init__(self, client: Optional[anthropic.Anthropic] = None, max_retries: int = 3,
+                 backoff_initial: float = 0.5, backoff_max: float = 20.0, hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min_samples: int = 10,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        # Retries happen here, so the SDK's own retry loop is switched off
+        super().__init__(client or anthropic.Anthropic(max_retries=0))
+        self.max_retries = max_retries
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[tuple, LatencyTracker] = {}
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self.lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Bookkeeping
+    # ------------------------------------------------------------------
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self.lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self.breakers[model]
+
+    def tracker(self, agent_name: str, kind: str) -> LatencyTracker:
+        with self.lock:
+            return self.latencies.setdefault((agent_name, kind), LatencyTracker())
+
+    def count(self, agent_name: str, **increments):
+        with self.lock:
+            counts = self.counts.setdefault(agent_name, dict.fromkeys(COUNTERS, 0))
+            for key, value in increments.items():
+                counts[key] += value
+        TELEMETRY.record_events(agent_name, **increments)
+
+    def report(self) -> Dict:
+        """Retry, hedge and failure counts per agent plus the state of every circuit"""
+        with self.lock:
+            return {
+                'agents': {name: dict(counts) for name, counts in self.counts.items()},
+                'circuits': {model: breaker.state for model, breaker in self.breakers.items()}
+            }
+
+    def hedge_delay(self, agent_name: str, kind: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        return self.tracker(agent_name, kind).quantile(self.hedge_quantile, self.hedge_min_samples)
+
+    def backoff(self, attempt: int, result: Dict) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's retry-after"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_initial * 2 ** attempt))
+        try:
+            delay = max(delay, float(result.get('retry_after') or 0))
+        except ValueError:
+            pass
+        return min(delay, self.backoff_max)
+
+    def sleep(self, agent_name: str, attempt: int, result: Dict):
+        """Back off before a retry (a resilience.backoff span when traced)"""
+        delay = self.backoff(attempt, result)
+        with span('resilience.backoff', agent=agent_name, attempt=attempt + 1, seconds=round(delay, 3),
+                  error_type=result.get('error_type')):
+            time.sleep(delay)
+
+    def rejected(self, agent_name: str, request: Dict, start: float) -> Dict:
+        self.count(agent_name, rejected=1, failures=1)
+        return {
+            'success': False,
+            'error': f"Circuit open for {request['model']}: upstream degraded, failing fast",
+            'circuit_open': True,
+            'execution_time': time.time() - start,
+            'model': request['model']
+        }
+
+    def settle(self, agent_name: str, breaker: CircuitBreaker, result: Dict) -> bool:
+        """Update the breaker from an attempt's result; returns whether it is worth retrying"""
+        if result['success']:
+            breaker.record_success()
+            return False
+        if is_retryable(result):
+            breaker.record_failure()
+            return True
+        # The upstream answered (e.g. 400), so it is not degraded
+        breaker.record_success()
+        return False
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def call(self, agent_name: str, request: Dict) -> Dict:
+        start = time.time()
+        breaker = self.breaker(request['model'])
+        self.count(agent_name, calls=1)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                result = self.rejected(agent_name, request, start)
+                break
+
+            result = self.hedged_call(agent_name, request)
+            retry = self.settle(agent_name, breaker, result)
+
+            if result['success']:
+                self.tracker(agent_name, 'call').add(result['execution_time'])
+            if not retry or attempt == self.max_retries:
+                if not result['success']:
+                    self.count(agent_name, failures=1)
+                break
+
+            self.count(agent_name, retries=1)
+            self.sleep(agent_name, attempt, result)
+
+        result['attempts'] = attempt + 1
+        result['retries'] = attempt
+        result.setdefault('hedged', False)
+        result['execution_time'] = time.time() - start
+        return result
+
+    def hedged_call(self, agent_name: str, request: Dict) -> Dict:
+        """One attempt, duplicated if it outlives the agent's p95 latency"""
+        delay = self.hedge_delay(agent_name, 'call')
+        if delay is None:
+            return AgentClient.call(self, agent_name, request)
+
+        answers = queue.Queue()
+
+        def send(copy: int):
+            answers.put((copy, AgentClient.call(self, agent_name, request)))
+
+        threading.Thread(target=contextvars.copy_context().run, args=(send, 0), daemon=True).start()
+        try:
+            copy, result = answers.get(timeout=delay)
+        except queue.Empty:
+            self.count(agent_name, hedges=1)
+            threading.Thread(target=contextvars.copy_context().run, args=(send, 1), daemon=True).start()
+            copy, result = answers.get()
+            if not result['success']:
+                # Give the other copy its chance before reporting a failure
+                copy, result = answers.get()
+
+        if copy == 1:
+            self.count(agent_name, hedge_wins=1)
+            result['hedged'] = True
+        return result
+
+    def stream(self, agent_name: str, request: Dict) -> Iterator[Dict]:
+        """AgentClient.stream with retries until the first token, hedging and circuit breaking"""
+        start = time.time()
+        breaker = self.breaker(request['model'])
+        self.count(agent_name, calls=1)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                result = self.rejected(agent_name, request, start)
+                break
+
+            received = False
+            for event in self.hedged_stream(agent_name, request):
+                if event['type'] == 'delta':
+                    received = True
+                    yield event
+                else:
+                    result = event['result']
+
+            retry = self.settle(agent_name, breaker, result) and not received
+            if result['success'] and result.get('time_to_first_token') is not None:
+                self.tracker(agent_name, 'stream').add(result['time_to_first_token'])
+            if not retry or attempt == self.max_retries:
+                if not result['success']:
+                    self.count(agent_name, failures=1)
+                break
+
+            self.count(agent_name, retries=1)
+            self.sleep(agent_name, attempt, result)
+
+        result['attempts'] = attempt + 1
+        result['retries'] = attempt
+        result.setdefault('hedged', False)
+        result['execution_time'] = time.time() - start
+        yield {'type': 'done', 'agent': agent_name, 'result': result}
+
+    def hedged_stream(self, agent_name: str, request: Dict) -> Iterator[Dict]:
+        """One streamed attempt, duplicated if no token arrives within the agent's p95 time to first token"""
+        delay = self.hedge_delay(agent_name, 'stream')
+        if delay is None:
+            yield from AgentClient.stream(self, agent_name, request)
+            return
+
+        events = queue.Queue()
+        cancelled = [threading.Event(), threading.Event()]
+
+        def pump(copy: int):
+            stream = AgentClient.stream(self, agent_name, request)
+            try:
+                for event in stream:
+                    if cancelled[copy].is_set():
+                        break
+                    events.put((copy, event))
+            finally:
+                # Closing the generator closes the HTTP response of a losing copy
+                stream.close()
+
+        threading.Thread(target=contextvars.copy_context().run, args=(pump, 0), daemon=True).start()
+        hedged = False
+        winner = None
+        failed = set()
+
+        try:
+            while True:
+                try:
+                    copy, event = events.get(timeout=None if hedged or winner is not None else delay)
+                except queue.Empty:
+                    hedged = True
+                    self.count(agent_name, hedges=1)
+                    threading.Thread(target=contextvars.copy_context().run, args=(pump, 1), daemon=True).start()
+                    continue
+
+                if winner is None:
+                    if event['type'] == 'done' and not event['result']['success']:
+                        failed.add(copy)
+                        if hedged and len(failed) < 2:
+                            continue
+                        yield event
+                        return
+                    winner = copy
+                    cancelled[1 - copy].set()
+                    if copy == 1:
+                        self.count(agent_name, hedge_wins=1)
+
+                if copy != winner:
+                    continue
+                if event['type'] == 'done':
+                    event['result']['hedged'] = winner == 1
+                yield event
+                if event['type'] == 'done':
+                    return
+        finally:
+            for flag in cancelled:
+                flag.set()
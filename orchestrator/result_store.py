@@ -0,0 +1,270 @@
+"""
+Compressed, append-only storage for saved results.
+
+Instead of one pretty-printed JSON file plus a _brief.txt/_report.txt per
+result, records are appended to a few large segment files. Each record is
+its own compressed frame, so the (segment, offset, length) kept in the
+results index reads any record with one seek, and a segment is still a valid
+.jsonl.gz (or .jsonl.zst) file for zcat/zstdcat. Segments roll over at
+segment_max_bytes; compaction rewrites segments that are mostly records no
+longer referenced by the index (results deleted with ResultsIndex.remove).
+Only one compaction runs at a time across processes (a lock file in the
+store directory); a compaction that finds it held is skipped. It only
+rewrites segments that were already sealed before the index was read and
+have not been written to for settle_seconds, so a record appended while the
+compaction runs, or appended but not yet in the index, is never taken for
+dead.
+
+    python -m orchestrator.result_store migrate    # pack existing outputs/ files
+    python -m orchestrator.result_store remove outputs/tests/ab_test_....json
+    python -m orchestrator.result_store compact
+    python -m orchestrator.result_store stats
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+STORE_DIR = 'outputs/store'
+
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# A sealed segment this recently written may hold records whose index rows are not in yet
+SETTLE_SECONDS = 60.0
+
+CODEC_EXTENSIONS = {'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+SEGMENT_PATTERN = re.compile(r'^segment_(\d{6})\.jsonl\.(gz|zst)$')
+
+COMPACTION_LOCK = 'compact.lock'
+
+logger = logging.getLogger(__name__)
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, segment: str) -> bytes:
+    if segment.endswith('.zst'):
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class SegmentStore:
+    """Append-only compressed segments with O(1) reads by (segment, offset, length)"""
+
+    def __init__(self, root: str = STORE_DIR, codec: Optional[str] = None,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES):
+        if codec is None:
+            codec = 'zstd' if zstandard else 'gzip'
+        if codec == 'zstd' and zstandard is None:
+            raise ImportError("zstd codec requires the zstandard package (pip install zstandard)")
+
+        self.root = root
+        self.codec = codec
+        self.segment_max_bytes = segment_max_bytes
+        self.lock = threading.Lock()
+        self.compaction_thread_lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+
+    def segments(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.root) if SEGMENT_PATTERN.match(name))
+
+    def sealed_segments(self) -> List[str]:
+        """Segments no longer appended to (all but the newest), listed under the append lock"""
+        with self.lock:
+            return self.segments()[:-1]
+
+    def segment_path(self, segment: str) -> str:
+        return os.path.join(self.root, segment)
+
+    def next_segment(self) -> str:
+        segments = self.segments()
+        number = int(SEGMENT_PATTERN.match(segments[-1]).group(1)) + 1 if segments else 1
+        return f"segment_{number:06d}{CODEC_EXTENSIONS[self.codec]}"
+
+    def active_segment(self) -> str:
+        """Newest segment with this codec and room left, or a fresh one"""
+        segments = self.segments()
+        if segments:
+            latest = segments[-1]
+            if (latest.endswith(CODEC_EXTENSIONS[self.codec])
+                    and os.path.getsize(self.segment_path(latest)) < self.segment_max_bytes):
+                return latest
+        return self.next_segment()
+
+    def append(self, record: Dict, segment: Optional[str] = None) -> Tuple[str, int, int]:
+        """Append one record; returns its (segment, offset, length)"""
+        frame = compress(json.dumps(record).encode('utf-8'), self.codec)
+
+        with self.lock:
+            segment = segment or self.active_segment()
+            fd = os.open(self.segment_path(segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Other processes (app, console, workers) may append to the same segment
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                offset = os.fstat(fd).st_size
+                os.write(fd, frame)
+                os.fsync(fd)
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+        return segment, offset, len(frame)
+
+    def read(self, segment: str, offset: int, length: int) -> Dict:
+        with open(self.segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(decompress(f.read(length), segment))
+
+    def read_many(self, segment: str, locations: List[Tuple[int, int]]) -> Iterator[Dict]:
+        """Read several records of one segment through a single file handle, in offset order"""
+        with open(self.segment_path(segment), 'rb') as f:
+            for offset, length in sorted(locations):
+                f.seek(offset)
+                yield json.loads(decompress(f.read(length), segment))
+
+    def compact(self, live: Dict[str, List[Tuple[str, int, int]]], segments: List[str],
+                min_dead_fraction: float = 0.3, settle_seconds: float = SETTLE_SECONDS) -> Dict:
+        """
+        Rewrite those of `segments` where at least min_dead_fraction of the bytes
+        are not in `live` ({segment: [(key, offset, length), ...]}). `segments`
+        must come from sealed_segments() called before `live` was read, so a
+        rollover in between cannot expose records that `live` has not seen.
+        Returns {key: new location} for every moved record; the caller updates
+        its index, then calls drop().
+        """
+        moved = {}
+        rewritten = []
+
+        for segment in segments:
+            path = self.segment_path(segment)
+            if time.time() - os.path.getmtime(path) < settle_seconds:
+                continue
+            size = os.path.getsize(path)
+            dead_bytes = size - sum(length for _, _, length in live.get(segment, []))
+            if dead_bytes <= 0 or dead_bytes / size < min_dead_fraction:
+                continue
+
+            for key, offset, length in live.get(segment, []):
+                moved[key] = self.append(self.read(segment, offset, length))
+            rewritten.append(segment)
+
+        return {'moved': moved, 'segments': rewritten}
+
+    @contextmanager
+    def compaction_lock(self) -> Iterator[bool]:
+        """Try to become the only compactor (threads and processes); yields whether it succeeded"""
+        if not self.compaction_thread_lock.acquire(blocking=False):
+            yield False
+            return
+        fd = os.open(os.path.join(self.root, COMPACTION_LOCK), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+            self.compaction_thread_lock.release()
+
+    def drop(self, segments: List[str]):
+        for segment in segments:
+            os.remove(self.segment_path(segment))
+
+    def stats(self) -> Dict:
+        segments = self.segments()
+        return {
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(self.segment_path(s)) for s in segments),
+            'codec': self.codec
+        }
+
+
+class Compactor:
+    """Background thread that compacts the results store every `interval` seconds"""
+
+    def __init__(self, index, interval: float = 600.0):
+        self.index = index
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def start(self) -> 'Compactor':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.index.compact()
+            except Exception:
+                logger.exception("Result store compaction failed")
+
+
+def main():
+    from orchestrator.results_index import ResultsIndex
+
+    parser = argparse.ArgumentParser(description="Manage the compressed results store")
+    parser.add_argument('command', choices=['migrate', 'remove', 'compact', 'stats'])
+    parser.add_argument('paths', nargs='*', help="remove: index keys (original JSON paths) of the results to delete")
+    parser.add_argument('--keep-files', action='store_true', help="migrate: leave the original files in place")
+    args = parser.parse_args()
+
+    index = ResultsIndex()
+
+    if args.command == 'migrate':
+        added = index.sync()
+        packed = index.pack_all(delete_files=not args.keep_files)
+        print(f"Indexed {added} new results, packed {packed} into {index.store.root}")
+    elif args.command == 'remove':
+        removed = sum(1 for path in args.paths if index.remove(path))
+        print(f"Removed {removed} of {len(args.paths)} results (packed bytes are reclaimed by compact)")
+    elif args.command == 'compact':
+        report = index.compact()
+        if report.get('skipped'):
+            print("Another compaction is running; skipped")
+        else:
+            print(f"Moved {report['moved']} records, removed {len(report['segments'])} segments")
+
+    stats = index.store.stats()
+    print(f"{stats['segments']} segments, {stats['bytes'] / 1024:.1f} KB ({stats['codec']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+SQLite manifest of saved analyses and A/B tests.
+
+Rows are added when a result is saved (save_analysis / save_test wrap
+WorkflowEngine.save_output and PromptTester.save_test_results), so history
+pages list, count and page through results without globbing outputs/ or
+stat-ing files. Each row carries the summary fields the pages display; the
+full JSON payload is only read when a result is opened (load).
+
+Results saved before the index existed are picked up by sync(), which runs
+automatically the first time the index is created. Files that cannot be read
+or parsed are logged and skipped.
+
+Saved results are then packed into the compressed segment store
+(orchestrator.result_store) and their loose files removed; rows record the
+segment, offset and length, and load()/load_text() read from whichever
+location a result is in.
+"""
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from orchestrator.result_store import SETTLE_SECONDS, SegmentStore
+from orchestrator.tracing import span
+
+
+INDEX_PATH = 'outputs/results_index.db'
+
+ANALYSIS = 'analysis'
+AB_TEST = 'ab_test'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    agent_name TEXT,
+    success INTEGER,
+    winner TEXT,
+    composite_score REAL,
+    summary TEXT,
+    text_path TEXT,
+    segment TEXT,
+    offset INTEGER,
+    length INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_kind_created ON results (kind, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS counts (kind TEXT PRIMARY KEY, n INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS results_count_insert AFTER INSERT ON results BEGIN
+    INSERT INTO counts (kind, n) VALUES (NEW.kind, 1)
+        ON CONFLICT (kind) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS results_count_delete AFTER DELETE ON results BEGIN
+    UPDATE counts SET n = n - 1 WHERE kind = OLD.kind;
+END;
+"""
+
+# Columns added after the first release of the index
+LOCATION_COLUMNS = {'segment': 'TEXT', 'offset': 'INTEGER', 'length': 'INTEGER'}
+
+logger = logging.getLogger(__name__)
+
+
+def timestamp_of(result: Dict, path: str) -> float:
+    """Creation time from the result's ISO timestamp, falling back to the file mtime"""
+    try:
+        return datetime.fromisoformat(result['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return os.path.getmtime(path) if os.path.exists(path) else time.time()
+
+
+class ResultsIndex:
+    """Paginated, counted listing of saved results backed by SQLite"""
+
+    def __init__(self, db_path: str = INDEX_PATH, outputs_dir: str = 'outputs',
+                 store: Optional[SegmentStore] = None):
+        self.db_path = db_path
+        self.outputs_dir = outputs_dir
+        self.store = store or SegmentStore(os.path.join(outputs_dir, 'store'))
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        is_new = not os.path.exists(db_path)
+
+        with closing(self.connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(results)")}
+            for column, column_type in LOCATION_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE results ADD COLUMN {column} {column_type}")
+
+        if is_new:
+            self.sync()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def insert(self, rows: List[tuple]):
+        """Insert index rows in one transaction (rows already indexed are ignored)"""
+        with closing(self.connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO results "
+                "(path, kind, created_at, agent_name, success, winner, composite_score, summary, text_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    @staticmethod
+    def analysis_row(result: Dict, path: str, brief_path: Optional[str] = None) -> tuple:
+        brief = result.get('final_brief') or ''
+        return (
+            path, ANALYSIS, timestamp_of(result, path), ','.join(result.get('phase1_results', {})),
+            int(bool(result.get('success'))), None, None, brief.strip().split('\n', 1)[0][:200], brief_path
+        )
+
+    @staticmethod
+    def test_row(results: Dict, path: str, report_path: Optional[str] = None) -> tuple:
+        winner = results.get('winner', {})
+        return (
+            path, AB_TEST, timestamp_of(results, path), results.get('agent_name'),
+            1, winner.get('variant_name'), winner.get('composite_score'), None, report_path
+        )
+
+    def record_analysis(self, result: Dict, path: str, brief_path: Optional[str] = None):
+        self.insert([self.analysis_row(result, path, brief_path)])
+
+    def record_test(self, results: Dict, path: str, report_path: Optional[str] = None):
+        self.insert([self.test_row(results, path, report_path)])
+
+    def remove(self, path: str) -> bool:
+        """
+        Delete a saved result: its index row, and its files if it is not packed
+        yet (packed bytes become dead and are reclaimed by compaction)
+        """
+        entry = self.get(path)
+        if entry is None:
+            return False
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute("DELETE FROM results WHERE path = ?", (path,))
+
+        if not entry['segment']:
+            for file_path in (path, entry['text_path']):
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+        return True
+
+    def pack(self, path: str, delete_files: bool = True) -> bool:
+        """Move one result's JSON and brief/report file into the segment store"""
+        entry = self.get(path)
+        if entry is None or entry['segment'] or not os.path.exists(path):
+            return False
+
+        record = {
+            'key': path,
+            'kind': entry['kind'],
+            'payload': self.load(path),
+            'text': self.load_text(entry)
+        }
+        segment, offset, length = self.store.append(record)
+
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                "UPDATE results SET segment = ?, offset = ?, length = ? WHERE path = ?",
+                (segment, offset, length, path)
+            )
+
+        if delete_files:
+            for file_path in (path, entry['text_path']):
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+        return True
+
+    def pack_all(self, delete_files: bool = True) -> int:
+        with closing(self.connect()) as conn:
+            paths = [row['path'] for row in conn.execute("SELECT path FROM results WHERE segment IS NULL")]
+        return sum(1 for path in paths if self.pack(path, delete_files))
+
+    def compact(self, min_dead_fraction: float = 0.3, settle_seconds: float = SETTLE_SECONDS) -> Dict:
+        """
+        Rewrite mostly-dead segments and point the moved rows at their new
+        locations; skipped (with 'skipped': True) while another compaction runs
+        """
+        with self.store.compaction_lock() as acquired:
+            if not acquired:
+                return {'moved': 0, 'segments': [], 'skipped': True}
+
+            # List the sealed segments first: anything appended after this goes to a newer one
+            sealed = self.store.sealed_segments()
+            with closing(self.connect()) as conn:
+                rows = conn.execute(
+                    "SELECT path, segment, offset, length FROM results WHERE segment IS NOT NULL"
+                ).fetchall()
+
+            live = {}
+            for row in rows:
+                live.setdefault(row['segment'], []).append((row['path'], row['offset'], row['length']))
+
+            report = self.store.compact(live, sealed, min_dead_fraction, settle_seconds)
+
+            with closing(self.connect()) as conn, conn:
+                conn.executemany(
+                    "UPDATE results SET segment = ?, offset = ?, length = ? WHERE path = ?",
+                    [(*location, path) for path, location in report['moved'].items()]
+                )
+            self.store.drop(report['segments'])
+
+        return {'moved': len(report['moved']), 'segments': report['segments']}
+
+    def sync(self) -> int:
+        """Index result files already in outputs/ (one-off backfill); returns how many were added"""
+        known = self.known_paths()
+        rows = []
+
+        for path in glob.glob(os.path.join(self.outputs_dir, 'analysis_*.json')):
+            result = None if path in known else self.load_unindexed(path)
+            if result is not None:
+                brief_path = path.replace('.json', '_brief.txt')
+                rows.append(self.analysis_row(result, path, brief_path if os.path.exists(brief_path) else None))
+
+        for path in glob.glob(os.path.join(self.outputs_dir, 'tests', 'ab_test_*.json')):
+            results = None if path in known else self.load_unindexed(path)
+            if results is not None:
+                report_path = path.replace('.json', '_report.txt')
+                rows.append(self.test_row(results, path, report_path if os.path.exists(report_path) else None))
+
+        self.insert(rows)
+        return len(rows)
+
+    @staticmethod
+    def load_unindexed(path: str) -> Optional[Dict]:
+        """A result file found by sync(), or None (logged) if it is unreadable or not a result"""
+        try:
+            with open(path, 'r') as f:
+                result = json.load(f)
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            logger.warning("Skipping %s: %s", path, e)
+            return None
+        if not isinstance(result, dict):
+            logger.warning("Skipping %s: not a result object", path)
+            return None
+        return result
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def known_paths(self) -> set:
+        with closing(self.connect()) as conn:
+            return {row['path'] for row in conn.execute("SELECT path FROM results")}
+
+    def entries(self, kind: str) -> List[Dict]:
+        """Every index row of a kind (summaries only, no payloads)"""
+        with closing(self.connect()) as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM results WHERE kind = ?", (kind,))]
+
+    def count(self, kind: str) -> int:
+        """Number of results of a kind (kept in a counter table, no scan)"""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT n FROM counts WHERE kind = ?", (kind,)).fetchone()
+        return row['n'] if row else 0
+
+    def page(self, kind: str, page: int = 0, page_size: int = 20) -> List[Dict]:
+        """Newest-first summaries for one page of results"""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM results WHERE kind = ? ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (kind, page_size, page * page_size)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, path: str) -> Optional[Dict]:
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT * FROM results WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def load(self, path: str) -> Dict:
+        """Full result payload, read only when a result is opened"""
+        entry = self.get(path)
+        if entry and entry['segment']:
+            return self.read_record(entry)['payload']
+
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def load_many(self, entries: List[Dict]) -> Iterator[tuple]:
+        """(entry, payload) for many results, opening each segment once"""
+        by_segment = {}
+        for entry in entries:
+            if entry.get('segment'):
+                by_segment.setdefault(entry['segment'], []).append(entry)
+            else:
+                with open(entry['path'], 'r') as f:
+                    yield entry, json.load(f)
+
+        for segment, segment_entries in by_segment.items():
+            by_offset = {entry['offset']: entry for entry in segment_entries}
+            locations = [(entry['offset'], entry['length']) for entry in segment_entries]
+            try:
+                for (offset, _), record in zip(sorted(locations), self.store.read_many(segment, locations)):
+                    yield by_offset[offset], record['payload']
+            except FileNotFoundError:
+                # Compacted away after these entries were read; nothing was yielded from it yet
+                for entry in segment_entries:
+                    yield entry, self.read_record(entry)['payload']
+
+    def read_record(self, entry: Dict) -> Dict:
+        """Stored record of a packed entry, following it if compaction has moved it since"""
+        try:
+            return self.store.read(entry['segment'], entry['offset'], entry['length'])
+        except FileNotFoundError:
+            current = self.get(entry['path'])
+            if not current or not current['segment'] or current['segment'] == entry['segment']:
+                raise
+            return self.store.read(current['segment'], current['offset'], current['length'])
+
+    def load_text(self, entry: Dict) -> Optional[str]:
+        """Brief or report text saved alongside a result, if any"""
+        if entry.get('segment'):
+            return self.read_record(entry)['text']
+
+        text_path = entry.get('text_path')
+        if not text_path or not os.path.exists(text_path):
+            return None
+        with open(text_path, 'r') as f:
+            return f.read()
+
+
+def save_analysis(engine, result: Dict, index: Optional[ResultsIndex] = None, pack: bool = True) -> str:
+    """
+    engine.save_output plus an index row, packed into the segment store unless
+    pack=False; returns the result's index key (its original JSON path)
+    """
+    index = index or ResultsIndex()
+    with span('save_output'):
+        brief_path = engine.save_output(result)
+    path = brief_path.replace('_brief.txt', '.json')
+
+    with span('results_index.record', kind=ANALYSIS, packed=pack):
+        index.record_analysis(result, path, brief_path)
+        if pack:
+            index.pack(path)
+    return path
+
+
+def save_test(tester, results: Dict, index: Optional[ResultsIndex] = None, pack: bool = True) -> Optional[str]:
+    """
+    tester.save_test_results plus an index row (packed like save_analysis);
+    returns the index key, the JSON path save_test_results returned. A tester
+    that returns no path saves its file unindexed (logged; sync() adds it).
+    """
+    index = index or ResultsIndex()
+    with span('save_test_results', agent=results.get('agent_name')):
+        path = tester.save_test_results(results)
+
+    if not (isinstance(path, str) and path.endswith('.json')):
+        logger.warning("save_test_results returned %r, not a JSON path; the result is not indexed", path)
+        return None
+
+    report_path = path.replace('.json', '_report.txt')
+    with span('results_index.record', kind=AB_TEST, packed=pack):
+        index.record_test(results, path, report_path if os.path.exists(report_path) else None)
+        if pack:
+            index.pack(path)
+    return path
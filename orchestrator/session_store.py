@@ -0,0 +1,503 @@
+"""
+Bounded per-session result storage for the Streamlit apps.
+
+A finished analysis or A/B test is a large dict (every agent's raw_response,
+per-iteration outputs, metrics). Kept in st.session_state it stays in memory
+for as long as the browser session lives, once per session. The SessionStore
+keeps only a compact summary per result in memory and spills the full payload
+to a gzip file under outputs/sessions/<session id>/:
+
+    store = SessionStore()                        # one per process (st.cache_resource)
+    results = store.session()                     # one per browser session (st.session_state)
+    results.put('analysis', result, summary={'agents': 4})
+    results.get('analysis')                       # full payload, or None once evicted
+    results.summaries()                           # [(key, summary, on_disk), ...]
+
+Bounds:
+    session_quota_bytes   compressed payload bytes on disk per session; the least
+                          recently used payloads beyond it are deleted (their
+                          summaries are kept and marked evicted)
+    max_entries           summaries per session; the oldest are dropped
+    cache_bytes           decoded payloads kept in memory across all sessions, so a
+                          rerun doesn't re-read the result it is showing (LRU)
+    idle_seconds          sessions not touched for this long are dropped with their files
+
+Payloads handed out by get() are shared with the memory cache; treat them as
+read-only.
+
+    python -m orchestrator.session_store profile --sessions 100 --results 4
+    python -m orchestrator.session_store stats
+    python -m orchestrator.session_store clear
+"""
+
+import argparse
+import gzip
+import json
+import linecache
+import os
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+SESSIONS_DIR = 'outputs/sessions'
+
+SESSION_QUOTA_BYTES = int(os.getenv('SESSION_QUOTA_MB', '16')) * 1024 * 1024
+
+CACHE_BYTES = int(os.getenv('SESSION_CACHE_MB', '8')) * 1024 * 1024
+
+MAX_ENTRIES = 100
+
+IDLE_SECONDS = 6 * 3600
+
+MEMORY_PROFILES_DIR = 'outputs/memory_profiles'
+
+
+def file_key(key: str) -> str:
+    return re.sub(r'[^\w.-]', '_', key)
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+class SessionStore:
+    """Compact summaries in memory, full payloads on disk, bounded per session and per process"""
+
+    def __init__(self, root: str = SESSIONS_DIR, session_quota_bytes: int = SESSION_QUOTA_BYTES,
+                 cache_bytes: int = CACHE_BYTES, max_entries: int = MAX_ENTRIES,
+                 idle_seconds: float = IDLE_SECONDS):
+        self.root = root
+        self.session_quota_bytes = session_quota_bytes
+        self.cache_bytes = cache_bytes
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        # session id -> OrderedDict(key -> entry), least recently used first
+        self.entries: Dict[str, OrderedDict] = {}
+        self.touched: Dict[str, float] = {}
+        # (session id, key) -> (payload, json bytes), least recently used first
+        self.cache: OrderedDict = OrderedDict()
+        self.cache_used = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self.remove_stale_directories()
+
+    def session(self, session_id: Optional[str] = None) -> 'SessionResults':
+        """Handle for one browser session (a fresh id unless one is given)"""
+        return SessionResults(self, session_id or uuid.uuid4().hex)
+
+    def payload_path(self, session_id: str, key: str) -> str:
+        return os.path.join(self.root, session_id, f"{file_key(key)}.json.gz")
+
+    # ------------------------------------------------------------------
+    # Reads and writes
+    # ------------------------------------------------------------------
+
+    def put(self, session_id: str, key: str, payload, summary: Optional[Dict] = None) -> Dict:
+        """Spill payload to disk and keep summary (default: {}) in memory; returns the summary"""
+        data = json.dumps(payload).encode('utf-8')
+        frame = gzip.compress(data, compresslevel=6)
+        path = self.payload_path(session_id, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(frame)
+        os.replace(tmp_path, path)
+
+        summary = dict(summary or {})
+        with self.lock:
+            entries = self.entries.setdefault(session_id, OrderedDict())
+            entries.pop(key, None)
+            entries[key] = {
+                'summary': summary,
+                'path': path,
+                'disk_bytes': len(frame),
+                'json_bytes': len(data),
+                'stored_at': time.time()
+            }
+            self.touched[session_id] = time.time()
+            self.cache_payload(session_id, key, payload, len(data))
+            removed = self.enforce_quota(session_id)
+
+        for removed_path in removed:
+            self.remove_file(removed_path)
+        self.sweep()
+        return summary
+
+    def get(self, session_id: str, key: str):
+        """The full payload, or None if it was never stored or has been evicted"""
+        with self.lock:
+            self.touched[session_id] = time.time()
+            entry = self.entries.get(session_id, {}).get(key)
+            if entry is None or entry['path'] is None:
+                return None
+            self.entries[session_id].move_to_end(key)
+            cached = self.cache.get((session_id, key))
+            if cached is not None:
+                self.cache.move_to_end((session_id, key))
+                return cached[0]
+            path = entry['path']
+
+        try:
+            with open(path, 'rb') as f:
+                payload = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(session_id, {}).get(key)
+            if entry is not None and entry['path'] == path:
+                self.cache_payload(session_id, key, payload, entry['json_bytes'])
+        return payload
+
+    def summary(self, session_id: str, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(session_id, {}).get(key)
+            return entry['summary'] if entry else None
+
+    def summaries(self, session_id: str) -> List[Tuple[str, Dict, bool]]:
+        """(key, summary, payload still on disk) for a session, oldest stored first"""
+        with self.lock:
+            entries = list(self.entries.get(session_id, {}).items())
+        return [(key, entry['summary'], entry['path'] is not None)
+                for key, entry in sorted(entries, key=lambda item: item[1]['stored_at'])]
+
+    def delete(self, session_id: str, key: str):
+        with self.lock:
+            entry = self.entries.get(session_id, {}).pop(key, None)
+            self.uncache(session_id, key)
+        if entry and entry['path']:
+            self.remove_file(entry['path'])
+
+    def drop(self, session_id: str):
+        """Forget a session and delete its files"""
+        with self.lock:
+            self.entries.pop(session_id, None)
+            self.touched.pop(session_id, None)
+            for cache_key in [cache_key for cache_key in self.cache if cache_key[0] == session_id]:
+                self.uncache(*cache_key)
+        shutil.rmtree(os.path.join(self.root, session_id), ignore_errors=True)
+
+    def clear(self):
+        """Drop every session"""
+        with self.lock:
+            session_ids = list(self.entries)
+        for session_id in session_ids:
+            self.drop(session_id)
+
+    # ------------------------------------------------------------------
+    # Bounds (called with the lock held, except sweep)
+    # ------------------------------------------------------------------
+
+    def cache_payload(self, session_id: str, key: str, payload, json_bytes: int):
+        # A payload stored again under the same key replaces the old one, bytes included
+        self.uncache(session_id, key)
+        if json_bytes > self.cache_bytes:
+            return
+        self.cache[(session_id, key)] = (payload, json_bytes)
+        self.cache_used += json_bytes
+        while self.cache_used > self.cache_bytes and self.cache:
+            _, (_, evicted_bytes) = self.cache.popitem(last=False)
+            self.cache_used -= evicted_bytes
+
+    def uncache(self, session_id: str, key: str):
+        cached = self.cache.pop((session_id, key), None)
+        if cached is not None:
+            self.cache_used -= cached[1]
+
+    def enforce_quota(self, session_id: str) -> List[str]:
+        """Evict least recently used payloads over the session's quota, then the oldest summaries over max_entries"""
+        entries = self.entries[session_id]
+        removed = []
+        on_disk = [key for key, entry in entries.items() if entry['path'] is not None]
+        disk_bytes = sum(entries[key]['disk_bytes'] for key in on_disk)
+        # The payload just stored (last) is never evicted, even if it alone exceeds the quota
+        for key in on_disk[:-1]:
+            if disk_bytes <= self.session_quota_bytes:
+                break
+            entry = entries[key]
+            removed.append(entry['path'])
+            disk_bytes -= entry['disk_bytes']
+            entry['path'] = None
+            entry['summary']['evicted'] = True
+            self.uncache(session_id, key)
+            self.evictions += 1
+
+        while len(entries) > self.max_entries:
+            key, entry = entries.popitem(last=False)
+            if entry['path']:
+                removed.append(entry['path'])
+            self.uncache(session_id, key)
+        return removed
+
+    def sweep(self):
+        """Drop sessions idle for longer than idle_seconds"""
+        cutoff = time.time() - self.idle_seconds
+        with self.lock:
+            idle = [session_id for session_id, touched in self.touched.items() if touched < cutoff]
+        for session_id in idle:
+            self.drop(session_id)
+
+    def remove_stale_directories(self):
+        """Session directories left by earlier processes (their sessions are gone) once they go idle"""
+        cutoff = time.time() - self.idle_seconds
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def session_footprint(self, session_id: str) -> Dict:
+        """Entries, payloads on disk, compressed disk bytes and decoded payload bytes held in the cache"""
+        with self.lock:
+            entries = list(self.entries.get(session_id, {}).values())
+            cached = sum(json_bytes for (cached_id, _), (_, json_bytes) in self.cache.items()
+                         if cached_id == session_id)
+        return {
+            'session_id': session_id,
+            'entries': len(entries),
+            'on_disk': sum(1 for entry in entries if entry['path'] is not None),
+            'disk_bytes': sum(entry['disk_bytes'] for entry in entries if entry['path'] is not None),
+            'summary_bytes': sum(len(json.dumps(entry['summary'])) for entry in entries),
+            'cached_bytes': cached
+        }
+
+    def stats(self) -> Dict:
+        with self.lock:
+            session_ids = list(self.entries)
+            cache_used, cached = self.cache_used, len(self.cache)
+        sessions = [self.session_footprint(session_id) for session_id in session_ids]
+        return {
+            'sessions': len(sessions),
+            'entries': sum(s['entries'] for s in sessions),
+            'disk_bytes': sum(s['disk_bytes'] for s in sessions),
+            'cache_bytes': cache_used,
+            'cached_payloads': cached,
+            'evictions': self.evictions,
+            'per_session': sessions
+        }
+
+
+class SessionResults:
+    """One browser session's view of the SessionStore; small enough to keep in st.session_state"""
+
+    def __init__(self, store: SessionStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    def put(self, key: str, payload, summary: Optional[Dict] = None) -> Dict:
+        return self.store.put(self.session_id, key, payload, summary)
+
+    def get(self, key: str):
+        return self.store.get(self.session_id, key)
+
+    def summary(self, key: str) -> Optional[Dict]:
+        return self.store.summary(self.session_id, key)
+
+    def summaries(self) -> List[Tuple[str, Dict, bool]]:
+        return self.store.summaries(self.session_id)
+
+    def delete(self, key: str):
+        self.store.delete(self.session_id, key)
+
+    def footprint(self) -> Dict:
+        return self.store.session_footprint(self.session_id)
+
+
+def result_summary(result: Dict) -> Dict:
+    """The few fields the apps keep in memory for an analysis or A/B test result"""
+    summary = {
+        'success': result.get('success', 'winner' in result),
+        'execution_time': result.get('execution_time', 0.0),
+        'stored_at': datetime.now().isoformat()
+    }
+    if 'phase1_results' in result:
+        summary['agents'] = len(result['phase1_results'])
+    if 'winner' in result:
+        summary['winner'] = result['winner'].get('variant_name')
+        summary['variants'] = len(result.get('results', {}))
+    return summary
+
+
+# ----------------------------------------------------------------------
+# Memory profile
+# ----------------------------------------------------------------------
+
+def sample_result(index: int, payload_kb: int = 64, agents: int = 4) -> Dict:
+    """A workflow-shaped result whose raw responses add up to about payload_kb"""
+    response_chars = payload_kb * 1024 // agents
+    phase1 = {}
+    for agent in range(agents):
+        # Distinct text per result, so nothing is shared between sessions by interning
+        line = f"Result {index} agent {agent}: the positioning could be sharper for the target buyer. "
+        raw_response = (line * (response_chars // len(line) + 1))[:response_chars]
+        phase1[f"agent_{agent}"] = {
+            'success': True,
+            'output': {'key_insight': line.strip(), 'recommendation': line.strip(), 'raw_response': raw_response},
+            'execution_time': 2.5,
+            'tokens_used': {'input_tokens': 1200, 'output_tokens': 800},
+            'model': 'claude-sonnet-4-5'
+        }
+    return {
+        'success': True,
+        'phase1_results': phase1,
+        'final_brief': f"Executive summary {index}\n" + "- recommendation\n" * 20,
+        'execution_time': 12.0
+    }
+
+
+def measure(mode: str, sessions: int, results_per_session: int, payload_kb: int, store_kwargs: Dict) -> Dict:
+    """tracemalloc the memory held after `sessions` sessions each keep results_per_session results"""
+    tracemalloc.start(10)
+    before = tracemalloc.take_snapshot()
+
+    holders = []
+    store = SessionStore(**store_kwargs) if mode == 'store' else None
+    for session_index in range(sessions):
+        if mode == 'session_state':
+            # What st.session_state held before: every full result dict
+            state = {}
+            for result_index in range(results_per_session):
+                state[f"analysis_{result_index}"] = sample_result(session_index * results_per_session + result_index,
+                                                                  payload_kb)
+            holders.append(state)
+        else:
+            results = store.session()
+            for result_index in range(results_per_session):
+                result = sample_result(session_index * results_per_session + result_index, payload_kb)
+                results.put(f"analysis_{result_index}", result, result_summary(result))
+            holders.append(results)
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, linecache.__file__)]
+    before, after = before.filter_traces(filters), after.filter_traces(filters)
+    held = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    top = [
+        {
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'bytes': stat.size_diff,
+            'blocks': stat.count_diff
+        }
+        for stat in after.compare_to(before, 'lineno')[:5]
+        if stat.size_diff > 0
+    ]
+
+    report = {
+        'mode': mode,
+        'sessions': sessions,
+        'results_per_session': results_per_session,
+        'held_bytes': held,
+        'per_session_bytes': held / sessions if sessions else 0.0,
+        'top_allocations': top
+    }
+    if store is not None:
+        stats = store.stats()
+        report['disk_bytes'] = stats['disk_bytes']
+        report['cache_bytes'] = stats['cache_bytes']
+        report['evictions'] = stats['evictions']
+        # The payload cache is a fixed cost shared by every session, not a per-session one
+        report['per_session_uncached_bytes'] = max(held - stats['cache_bytes'], 0) / sessions if sessions else 0.0
+        report['per_session'] = [
+            {key: value for key, value in footprint.items() if key != 'session_id'}
+            for footprint in stats['per_session'][:5]
+        ]
+        store.clear()
+    return report
+
+
+def print_memory_profile(reports: List[Dict]):
+    print(f"\n{'=' * 70}")
+    print("SESSION MEMORY PROFILE (tracemalloc)")
+    print(f"{'=' * 70}")
+    for report in reports:
+        print(f"\n{report['mode']}: {report['sessions']} sessions x {report['results_per_session']} results")
+        print(f"  held in memory:  {report['held_bytes'] / 1024:,.0f} KB "
+              f"({report['per_session_bytes'] / 1024:,.1f} KB per session)")
+        if 'disk_bytes' in report:
+            print(f"  spilled to disk: {report['disk_bytes'] / 1024:,.0f} KB · payload cache "
+                  f"{report['cache_bytes'] / 1024:,.0f} KB · {report['evictions']} payloads evicted")
+            print(f"  per session excluding the shared payload cache: "
+                  f"{report['per_session_uncached_bytes'] / 1024:,.1f} KB")
+            for footprint in report['per_session'][:3]:
+                print(f"    session: {footprint['entries']} entries, {footprint['on_disk']} on disk "
+                      f"({footprint['disk_bytes'] / 1024:,.1f} KB), summaries {footprint['summary_bytes']} B, "
+                      f"cached {footprint['cached_bytes'] / 1024:,.1f} KB")
+        print("  top allocation sites:")
+        for allocation in report['top_allocations']:
+            print(f"    {allocation['bytes'] / 1024:>10,.1f} KB  {allocation['location']}")
+
+    if len(reports) == 2 and reports[0]['per_session_bytes']:
+        ratio = reports[1]['per_session_bytes'] / reports[0]['per_session_bytes']
+        print(f"\nPer-session footprint with the store: {ratio:.1%} of holding full results in session state")
+    print(f"{'=' * 70}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session result storage: memory profile and spill directory")
+    parser.add_argument('command', choices=['profile', 'stats', 'clear'])
+    parser.add_argument('--root', default=SESSIONS_DIR, help="Spill directory")
+    parser.add_argument('--sessions', type=int, default=100, help="profile: simulated sessions")
+    parser.add_argument('--results', type=int, default=4, help="profile: results kept per session")
+    parser.add_argument('--payload-kb', type=int, default=64, help="profile: raw response size per result")
+    parser.add_argument('--quota-mb', type=float, default=SESSION_QUOTA_BYTES / 1024 / 1024,
+                        help="profile: per-session disk quota")
+    parser.add_argument('--cache-mb', type=float, default=CACHE_BYTES / 1024 / 1024,
+                        help="profile: decoded payload cache shared by all sessions")
+    parser.add_argument('--save', action='store_true', help="profile: save the report to outputs/memory_profiles/")
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        directories = [name for name in os.listdir(args.root)
+                       if os.path.isdir(os.path.join(args.root, name))] if os.path.isdir(args.root) else []
+        print(f"{len(directories)} session directories, "
+              f"{directory_bytes(args.root) / 1024:.1f} KB in {args.root}" if directories else "No spilled sessions")
+        return
+    if args.command == 'clear':
+        shutil.rmtree(args.root, ignore_errors=True)
+        print(f"Removed {args.root}")
+        return
+
+    profile_root = os.path.join(args.root, f"profile_{uuid.uuid4().hex[:8]}")
+    store_kwargs = {
+        'root': profile_root,
+        'session_quota_bytes': int(args.quota_mb * 1024 * 1024),
+        'cache_bytes': int(args.cache_mb * 1024 * 1024)
+    }
+    try:
+        reports = [measure(mode, args.sessions, args.results, args.payload_kb, store_kwargs)
+                   for mode in ('session_state', 'store')]
+    finally:
+        shutil.rmtree(profile_root, ignore_errors=True)
+    print_memory_profile(reports)
+
+    if args.save:
+        os.makedirs(MEMORY_PROFILES_DIR, exist_ok=True)
+        path = os.path.join(MEMORY_PROFILES_DIR, f"memory_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump({'payload_kb': args.payload_kb, 'reports': reports}, f, indent=2)
+        print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
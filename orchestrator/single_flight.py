@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing of identical concurrent analyses.
+
+When several callers ask for the same analysis at once (the same copy pasted
+by several people right after a launch, or repeated documents in a batch),
+only the first runs it; the others attach to that in-flight computation and
+receive its result. Nothing is cached: once the computation finishes, the
+next request with the same input runs again.
+
+    flights = SingleFlight()
+    result, shared = flights.do(fingerprint(input_data, config), workflow.execute, input_data)
+
+Requests are matched on a fingerprint of the document, context and workflow
+config with whitespace normalised, so re-pasted copy still matches.
+JobQueue.submit(key=...) applies the same idea to the app's background jobs.
+"""
+
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+def normalise(text: str) -> str:
+    return ' '.join((text or '').split())
+
+
+def fingerprint(input_data: Dict, config: Optional[Dict] = None) -> str:
+    """Key identifying an analysis request: normalised document and context plus the workflow config"""
+    payload = json.dumps({
+        'document': normalise(input_data.get('document', '')),
+        'context': normalise(input_data.get('context', '')),
+        'config': config
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Flight:
+    """One in-flight computation and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 1
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self.flights: Dict[str, Flight] = {}
+        self.lock = threading.Lock()
+        self.counts = {'calls': 0, 'executions': 0, 'coalesced': 0}
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[object, bool]:
+        """
+        Run fn(*args, **kwargs), or wait for the identical call already running;
+        returns (result, shared) where shared is True for callers that attached.
+        Exceptions reach every caller.
+        """
+        with self.lock:
+            self.counts['calls'] += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.counts['executions'] += 1
+            else:
+                flight.waiters += 1
+                self.counts['coalesced'] += 1
+
+        if leader:
+            try:
+                flight.result = fn(*args, **kwargs)
+            except BaseException as e:
+                flight.error = e
+            finally:
+                with self.lock:
+                    del self.flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, not leader
+
+    def waiters(self) -> Dict[str, int]:
+        """Callers attached to each in-flight key (leader included)"""
+        with self.lock:
+            return {key: flight.waiters for key, flight in self.flights.items()}
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counts, in_flight=len(self.flights))
@@ -0,0 +1,199 @@
+"""
+Streaming execution of the multi-agent workflow.
+
+Runs every phase-1 agent concurrently and yields their tokens as they arrive,
+then streams the synthesis call that writes the final brief. The last event
+carries a result dict with the same shape as WorkflowEngine.execute_workflow,
+so it can be saved with engine.save_output and displayed unchanged.
+
+With warm_cache (the default) one agent starts first and the others are
+launched as soon as it begins answering, so they read the shared document
+prefix from the prompt cache instead of all writing it at once.
+
+With pipeline_synthesis (SYNTHESIS_PIPELINE=1) the synthesis prompt is built
+while phase 1 is still running: analyses are ordered by arrival, and every
+time an agent finishes while others are still running, a one-token request
+writes the prompt so far to the prompt cache. When the last agent lands, the
+brief request only has to prefill that agent's analysis, so the Executive
+Summary starts streaming sooner. The brief itself is unchanged. The brief
+request does not wait for a warm call still in flight: it uses the prefixes
+cached by then, and a warm that lands later is not counted in the result.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from orchestrator.agent_client import (
+    AgentClient,
+    agent_parameters,
+    build_agent_request,
+    build_synthesis_request,
+    phase1_agents,
+    synthesis_prompt
+)
+from orchestrator.pricing import call_cost, total_tokens
+from orchestrator.tracing import bind, start_span
+
+
+BRIEF_STREAM = 'final_brief'
+
+# Set SYNTHESIS_PIPELINE=1 (e.g. in .env) to cache the synthesis prompt as agents finish
+PIPELINE_ENV = 'SYNTHESIS_PIPELINE'
+
+
+def pipelining_enabled() -> bool:
+    return os.getenv(PIPELINE_ENV, '').lower() in ('1', 'true', 'yes')
+
+
+class StreamingWorkflow:
+    """Concurrent, token-streaming counterpart to WorkflowEngine.execute_workflow"""
+
+    def __init__(self, config: Dict, client: Optional[AgentClient] = None,
+                 cache_prefix: bool = True, warm_cache: bool = True,
+                 pipeline_synthesis: Optional[bool] = None):
+        self.config = config
+        self.client = client or AgentClient()
+        self.cache_prefix = cache_prefix
+        self.warm_cache = cache_prefix and warm_cache
+        if pipeline_synthesis is None:
+            pipeline_synthesis = pipelining_enabled()
+        self.pipeline_synthesis = cache_prefix and pipeline_synthesis
+        # The engine's prompts are used unchanged; fail now rather than after phase 1 if one is missing
+        self.params = {name: agent_parameters(config, name) for name in self.agent_names}
+        synthesis_prompt(config)
+
+    @property
+    def agent_names(self) -> List[str]:
+        return phase1_agents(self.config)
+
+    def run(self, input_data: Dict) -> Iterator[Dict]:
+        """
+        Yield workflow events:
+            {'type': 'delta', 'agent', 'text', 'fields'}  - agent (or 'final_brief') tokens
+            {'type': 'done', 'agent', 'result'}           - an agent finished
+            {'type': 'complete', 'result'}                 - full workflow result
+        """
+        start = time.time()
+        events = queue.Queue()
+        agent_names = self.agent_names
+
+        def run_agent(agent_name: str):
+            request = build_agent_request(self.params[agent_name], input_data, self.cache_prefix)
+            try:
+                for event in self.client.stream(agent_name, request):
+                    events.put(event)
+            except Exception as e:
+                events.put({
+                    'type': 'done',
+                    'agent': agent_name,
+                    'result': {'success': False, 'error': str(e), 'execution_time': time.time() - start}
+                })
+
+        phase1_results = {}
+        first_insight = None
+
+        # Successful results in arrival order, and the synthesis prompt prefixes cached from them
+        arrived = {}
+        pipeline = {'warm_calls': 0, 'warm_tokens': 0, 'warm_cost': 0.0, 'cached_analyses': 0, 'warm_results': []}
+        synthesis_started = threading.Event()
+        pipeline_lock = threading.Lock()
+        warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='synthesis-warm')
+
+        def warm_synthesis(count: int):
+            # Stale once a later agent arrived, and pointless once the brief request is out
+            if synthesis_started.is_set() or count < len(arrived):
+                return
+            request = build_synthesis_request(self.config, input_data, dict(list(arrived.items())[:count]),
+                                              self.cache_prefix, cache_analyses=count)
+            request['max_tokens'] = 1
+            warm = self.client.call(BRIEF_STREAM, request)
+            with pipeline_lock:
+                # Too late: the brief request and the result already have their snapshot
+                if synthesis_started.is_set():
+                    return
+                pipeline['warm_calls'] += 1
+                pipeline['warm_tokens'] += total_tokens(warm.get('tokens_used'))
+                pipeline['warm_cost'] += call_cost(warm.get('model'), warm.get('tokens_used'))
+                pipeline['warm_results'].append(warm)
+                # Only a prefix that was actually written gets the brief request's breakpoint
+                if warm['success']:
+                    pipeline['cached_analyses'] = count
+
+        # Agent threads run inside the caller's trace, under a workflow.phase1 span
+        phase1 = start_span('workflow.phase1', agents=len(agent_names), pipelined=self.pipeline_synthesis)
+        with ThreadPoolExecutor(max_workers=max(1, len(agent_names))) as pool:
+            # With warm_cache only the first agent starts now; the rest follow its first event
+            waiting = list(agent_names)
+            for agent_name in waiting[:1] if self.warm_cache else waiting:
+                pool.submit(bind(run_agent, phase1), agent_name)
+            waiting = waiting[1:] if self.warm_cache else []
+
+            while len(phase1_results) < len(agent_names):
+                event = events.get()
+
+                for agent_name in waiting:
+                    pool.submit(bind(run_agent, phase1), agent_name)
+                waiting = []
+
+                if event['type'] == 'delta' and first_insight is None:
+                    first_insight = time.time() - start
+                if event['type'] == 'done':
+                    phase1_results[event['agent']] = event['result']
+                    if event['result']['success']:
+                        arrived[event['agent']] = event['result']
+                        if self.pipeline_synthesis and len(phase1_results) < len(agent_names):
+                            warmer.submit(bind(warm_synthesis, phase1), len(arrived))
+                yield event
+
+        phase1.end()
+        with pipeline_lock:
+            synthesis_started.set()
+            settled = dict(pipeline, warm_results=list(pipeline['warm_results']))
+        warmer.shutdown(wait=False)
+
+        result = {
+            'success': any(r['success'] for r in phase1_results.values()),
+            'timestamp': datetime.now().isoformat(),
+            'input': input_data,
+            'phase1_results': {name: phase1_results[name] for name in agent_names},
+            'time_to_first_insight': first_insight
+        }
+
+        if not result['success']:
+            result['error'] = 'All agents failed'
+            result['execution_time'] = time.time() - start
+            yield {'type': 'complete', 'result': result}
+            return
+
+        if self.pipeline_synthesis:
+            request = build_synthesis_request(self.config, input_data, arrived, self.cache_prefix,
+                                              cache_analyses=settled['cached_analyses'])
+            result['synthesis_pipeline'] = settled
+        else:
+            request = build_synthesis_request(self.config, input_data, phase1_results, self.cache_prefix)
+        for event in self.client.stream(BRIEF_STREAM, request):
+            if event['type'] == 'done':
+                synthesis = event['result']
+                if synthesis['success']:
+                    result['final_brief'] = synthesis['output']['raw_response']
+                else:
+                    result['success'] = False
+                    result['error'] = f"Synthesis failed: {synthesis['error']}"
+                result['synthesis'] = synthesis
+            yield event
+
+        result['execution_time'] = time.time() - start
+        yield {'type': 'complete', 'result': result}
+
+    def execute(self, input_data: Dict) -> Dict:
+        """Run to completion and return only the final result"""
+        result = None
+        for event in self.run(input_data):
+            if event['type'] == 'complete':
+                result = event['result']
+        return result
@@ -0,0 +1,247 @@
+"""
+Token, cost and latency telemetry for agent calls, with a Prometheus-style /metrics endpoint.
+
+Every Messages API attempt made through AgentClient (and so through the
+resilient, cascade and variant layers above it), and every request collected
+from a Message Batch, is recorded in the process-wide TELEMETRY registry:
+
+    agent_calls_total                 calls per agent, model, variant and outcome
+    agent_tokens_total                input, output, cache write and cache read tokens
+    agent_cost_usd_total              estimated cost (orchestrator.pricing)
+    agent_call_duration_seconds       latency histogram per agent, model, variant and outcome
+    agent_time_to_first_token_seconds streaming latency to the first token
+    agent_resilience_events_total     retries, hedges, hedge wins, failures and circuit rejections
+
+The outcome is 'success' or the error type (e.g. RateLimitError). The variant
+label is set by the A/B and evaluation runners with labelled(variant=...).
+Recording is a few dict updates under a lock, and the recent calls are kept
+in a bounded deque for the rolling summary.
+
+    start_metrics_server(9464)    # curl http://127.0.0.1:9464/metrics
+    TELEMETRY.summary(window=900) # per agent/model, last 15 minutes
+
+No client library or collector is needed; point Prometheus (or anything that
+reads the text exposition format) at the endpoint if you want history.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from orchestrator.pricing import BATCH_DISCOUNT, call_cost, token_breakdown
+
+
+METRICS_PORT = 9464
+
+DURATION_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+METRICS = {
+    'agent_calls_total': ('counter', 'Messages API attempts by agent, model, variant and outcome'),
+    'agent_tokens_total': ('counter', 'Tokens by agent, model, variant and kind'),
+    'agent_cost_usd_total': ('counter', 'Estimated USD cost by agent, model and variant'),
+    'agent_call_duration_seconds': ('histogram', 'Attempt latency by agent, model, variant and outcome'),
+    'agent_time_to_first_token_seconds': ('histogram', 'Streaming latency to the first token'),
+    'agent_resilience_events_total': ('counter', 'Retries, hedges, hedge wins, failures and circuit rejections')
+}
+
+TOKEN_KINDS = {
+    'input_tokens': 'input',
+    'output_tokens': 'output',
+    'cache_creation_input_tokens': 'cache_write',
+    'cache_read_input_tokens': 'cache_read'
+}
+
+CALL_LABELS = contextvars.ContextVar('call_labels', default={})
+
+
+@contextmanager
+def labelled(**labels):
+    """Attach extra labels (e.g. variant) to the calls made inside the block on this thread"""
+    token = CALL_LABELS.set(dict(CALL_LABELS.get(), **labels))
+    try:
+        yield
+    finally:
+        CALL_LABELS.reset(token)
+
+
+def escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Tuple, extra: str = '') -> str:
+    parts = [f'{key}="{escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Telemetry:
+    """In-process counters, histograms and a rolling window of recent calls"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS, max_recent: int = 10000):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, Tuple], float] = defaultdict(float)
+        self.histograms: Dict[Tuple[str, Tuple], List] = {}
+        self.recent = deque(maxlen=max_recent)
+        self.lock = threading.Lock()
+
+    def inc(self, metric: str, labels: Dict, value: float = 1.0):
+        with self.lock:
+            self.counters[(metric, tuple(sorted(labels.items())))] += value
+
+    def observe(self, metric: str, labels: Dict, value: float):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            # Per-bucket counts, then sum and count
+            histogram = self.histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record_call(self, agent_name: str, result: Dict):
+        """Record one attempt from its AgentClient result (or a batch result, billed at the batch discount)"""
+        model = result.get('model') or 'unknown'
+        variant = CALL_LABELS.get().get('variant', '')
+        outcome = 'success' if result.get('success') else result.get('error_type', 'error')
+        labels = {'agent': agent_name, 'model': model, 'variant': variant}
+        tokens = token_breakdown(result.get('tokens_used'))
+        cost = call_cost(model, result.get('tokens_used')) if result.get('tokens_used') else 0.0
+        if result.get('batch'):
+            cost *= BATCH_DISCOUNT
+        latency = math.nan if result.get('batch') else result.get('execution_time', 0.0)
+
+        self.inc('agent_calls_total', dict(labels, outcome=outcome))
+        for key, kind in TOKEN_KINDS.items():
+            if tokens[key]:
+                self.inc('agent_tokens_total', dict(labels, kind=kind), tokens[key])
+        if cost:
+            self.inc('agent_cost_usd_total', labels, cost)
+        if not math.isnan(latency):
+            # Batch requests have no per-request latency
+            self.observe('agent_call_duration_seconds', dict(labels, outcome=outcome), latency)
+        if result.get('time_to_first_token') is not None:
+            self.observe('agent_time_to_first_token_seconds', labels, result['time_to_first_token'])
+
+        prompt = tokens['input_tokens'] + tokens['cache_creation_input_tokens'] + tokens['cache_read_input_tokens']
+        with self.lock:
+            self.recent.append((time.time(), agent_name, model, variant, outcome, latency, prompt,
+                                tokens['output_tokens'], tokens['cache_read_input_tokens'], cost))
+
+    def record_events(self, agent_name: str, **counts):
+        """Resilience events (retries=1, hedges=1, ...) counted by ResilientAgentClient"""
+        for event, value in counts.items():
+            if value and event != 'calls':
+                self.inc('agent_resilience_events_total', {'agent': agent_name, 'event': event}, value)
+
+    # ------------------------------------------------------------------
+    # Exposition
+    # ------------------------------------------------------------------
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(values) for key, values in self.histograms.items()}
+
+        lines = []
+        for metric, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            if kind == 'counter':
+                for (name, labels), value in sorted(counters.items()):
+                    if name == metric:
+                        lines.append(f"{metric}{format_labels(labels)} {value:.12g}")
+                continue
+
+            for (name, labels), values in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    bucket = format_labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{metric}_bucket{bucket} {cumulative}")
+                bucket = format_labels(labels, 'le="+Inf"')
+                lines.append(f"{metric}_bucket{bucket} {values[-1]}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{metric}_count{format_labels(labels)} {values[-1]}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, window: float = 900.0) -> List[Dict]:
+        """Per agent and model over the last window seconds: calls, errors, p50/p95 latency, tokens, cost"""
+        cutoff = time.time() - window
+        with self.lock:
+            recent = [call for call in self.recent if call[0] >= cutoff]
+
+        groups: Dict[Tuple[str, str], List] = defaultdict(list)
+        for call in recent:
+            groups[(call[1], call[2])].append(call)
+
+        rows = []
+        for (agent_name, model), calls in sorted(groups.items()):
+            latencies = np.array([call[5] for call in calls if call[4] == 'success' and not math.isnan(call[5])])
+            prompt = sum(call[6] for call in calls)
+            rows.append({
+                'agent': agent_name,
+                'model': model,
+                'calls': len(calls),
+                'errors': sum(1 for call in calls if call[4] != 'success'),
+                'p50_s': float(np.percentile(latencies, 50)) if len(latencies) else math.nan,
+                'p95_s': float(np.percentile(latencies, 95)) if len(latencies) else math.nan,
+                'input_tokens': prompt,
+                'output_tokens': sum(call[7] for call in calls),
+                'cached_share': sum(call[8] for call in calls) / prompt if prompt else 0.0,
+                'cost_usd': sum(call[9] for call in calls)
+            })
+        return rows
+
+
+TELEMETRY = Telemetry()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    telemetry = TELEMETRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.telemetry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+SERVERS: Dict[int, ThreadingHTTPServer] = {}
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = '127.0.0.1',
+                         telemetry: Optional[Telemetry] = None) -> ThreadingHTTPServer:
+    """Serve /metrics on a daemon thread (once per port per process); raises OSError if the port is taken"""
+    if port in SERVERS:
+        return SERVERS[port]
+    handler = type('Handler', (MetricsHandler,), {'telemetry': telemetry or TELEMETRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name=f"metrics-{port}").start()
+    SERVERS[port] = server
+    return server
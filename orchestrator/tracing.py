@@ -0,0 +1,306 @@
+"""
+Nested trace spans across a workflow, exported to local files.
+
+Set AGENT_TRACING=1 (e.g. in .env) and every analysis or A/B test run from
+the apps or interactive.py writes one trace file under outputs/traces/:
+
+    config load and agent init    workflow_engine.init, prompt_tester.init
+    each agent's API call          agent.call / agent.stream (model, tokens, time to first token)
+    parsing                        agent.parse
+    retries                        resilience.backoff
+    workflow phases                workflow.phase1, workflow.dag, dag.node, map_reduce.map / reduce
+    A/B test calls                 variant.call
+    file writes                    save_output, save_test_results, results_index.record
+
+A trace is started with trace(), and span() nests inside whatever span is
+current on the thread (a contextvar). Pool threads join the trace when the
+task is wrapped with bind(). A run that starts on one thread and finishes on
+another (an app job) uses start_trace(): within(root) on the first thread,
+activate(root) where the run ends. Outside a trace, or with tracing off, span() and
+start_span() return a no-op span, so instrumented code costs one contextvar read.
+
+AGENT_TRACING chooses the format:
+    1 / chrome   Chrome trace-event JSON (open in https://ui.perfetto.dev or chrome://tracing)
+    otlp         OpenTelemetry OTLP/JSON (resourceSpans), for any OTLP-aware viewer or collector
+    both         one file of each
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+TRACING_ENV = 'AGENT_TRACING'
+
+TRACES_DIR = 'outputs/traces'
+
+SERVICE_NAME = 'marketing-document-analyzer'
+
+FORMATS = {
+    '1': ['chrome'], 'true': ['chrome'], 'yes': ['chrome'], 'chrome': ['chrome'],
+    'otlp': ['otlp'],
+    'both': ['chrome', 'otlp']
+}
+
+CURRENT_SPAN = contextvars.ContextVar('current_span', default=None)
+
+
+def tracing_formats() -> List[str]:
+    return FORMATS.get(os.getenv(TRACING_ENV, '').lower(), [])
+
+
+def tracing_enabled() -> bool:
+    return bool(tracing_formats())
+
+
+def attribute_value(value):
+    """Span attributes are kept as str, int, float or bool"""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+class Span:
+    """One timed operation in a trace, with attributes and an error status"""
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = {key: attribute_value(value) for key, value in attributes.items() if value is not None}
+        thread = threading.current_thread()
+        self.thread = (thread.ident, thread.name)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update({key: attribute_value(value) for key, value in attributes.items() if value is not None})
+
+    def child(self, name: str, **attributes) -> 'Span':
+        return self.trace.add(Span(self.trace, name, self.span_id, attributes))
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self is self.trace.root:
+            self.trace.export()
+
+
+class NoopSpan:
+    """Stands in for a span outside a trace"""
+
+    def set(self, **attributes):
+        pass
+
+    def child(self, name: str, **attributes) -> 'NoopSpan':
+        return self
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Trace:
+    """All spans under one root, written to TRACES_DIR when the root ends"""
+
+    def __init__(self, name: str, attributes: Dict, formats: List[str], traces_dir: str = TRACES_DIR):
+        self.trace_id = secrets.token_hex(16)
+        self.formats = formats
+        self.traces_dir = traces_dir
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+        self.paths: List[str] = []
+        self.root = self.add(Span(self, name, None, attributes))
+
+    def add(self, span: Span) -> Span:
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def finished_spans(self) -> List[Span]:
+        """Spans still open when the root ended (e.g. a losing hedge) are cut at the root's end"""
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            if span.end_ns is None:
+                span.set(unfinished=True)
+        return spans
+
+    def export(self):
+        spans = self.finished_spans()
+        os.makedirs(self.traces_dir, exist_ok=True)
+        stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.root.name.replace('.', '_')}_{self.trace_id[:8]}"
+        writers = {'chrome': ('trace.json', self.chrome_events), 'otlp': ('otlp.json', self.otlp_spans)}
+        for fmt in self.formats:
+            suffix, build = writers[fmt]
+            path = os.path.join(self.traces_dir, f"{stem}.{suffix}")
+            with open(path, 'w') as f:
+                json.dump(build(spans), f)
+            self.paths.append(path)
+
+    def span_end(self, span: Span) -> int:
+        return span.end_ns if span.end_ns is not None else self.root.end_ns
+
+    def chrome_events(self, spans: List[Span]) -> Dict:
+        """Chrome trace-event format: one complete ('X') event per span, a track per thread"""
+        pid = os.getpid()
+        origin = self.root.start_ns
+        threads: Dict[int, int] = {}
+        events = []
+        for span in spans:
+            ident, thread_name = span.thread
+            if ident not in threads:
+                threads[ident] = len(threads) + 1
+                events.append({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': threads[ident],
+                               'args': {'name': thread_name}})
+            args = dict(span.attributes, span_id=span.span_id)
+            if span.error:
+                args['error'] = span.error
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'ts': (span.start_ns - origin) / 1000,
+                'dur': (self.span_end(span) - span.start_ns) / 1000,
+                'pid': pid,
+                'tid': threads[ident],
+                'args': args
+            })
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.trace_id, 'service': SERVICE_NAME, 'root': self.root.name}
+        }
+
+    def otlp_spans(self, spans: List[Span]) -> Dict:
+        """OTLP/JSON export request with every span of the trace"""
+        def attributes(values: Dict) -> List[Dict]:
+            encoded = []
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    encoded.append({'key': key, 'value': {'boolValue': value}})
+                elif isinstance(value, int):
+                    encoded.append({'key': key, 'value': {'intValue': str(value)}})
+                elif isinstance(value, float):
+                    encoded.append({'key': key, 'value': {'doubleValue': value}})
+                else:
+                    encoded.append({'key': key, 'value': {'stringValue': value}})
+            return encoded
+
+        otlp = []
+        for span in spans:
+            record = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(self.span_end(span)),
+                'attributes': attributes(dict(span.attributes, **{'thread.name': span.thread[1]})),
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+            }
+            if span.parent_id:
+                record['parentSpanId'] = span.parent_id
+            otlp.append(record)
+
+        return {'resourceSpans': [{
+            'resource': {'attributes': attributes({'service.name': SERVICE_NAME, 'process.pid': os.getpid()})},
+            'scopeSpans': [{'scope': {'name': 'orchestrator.tracing'}, 'spans': otlp}]
+        }]}
+
+
+def current_span():
+    """The span code on this thread is running under (a no-op span outside a trace)"""
+    return CURRENT_SPAN.get() or NOOP_SPAN
+
+
+@contextmanager
+def activate(span):
+    """Make span current for the block, ending it with the block's error if one is raised"""
+    token = CURRENT_SPAN.set(span if span is not NOOP_SPAN else None)
+    try:
+        yield span
+    except Exception as e:
+        span.end(error=e)
+        raise
+    finally:
+        CURRENT_SPAN.reset(token)
+        span.end()
+
+
+@contextmanager
+def within(span):
+    """Make span current for the block without ending it, unless the block raises"""
+    token = CURRENT_SPAN.set(span if span is not NOOP_SPAN else None)
+    try:
+        yield span
+    except Exception as e:
+        span.end(error=e)
+        raise
+    finally:
+        CURRENT_SPAN.reset(token)
+
+
+def start_trace(name: str, **attributes):
+    """
+    Root of a new trace (or a child span when one is running) that is neither
+    made current nor ended; the trace is exported when you end() it.
+    """
+    parent = CURRENT_SPAN.get()
+    if parent is not None:
+        return parent.child(name, **attributes)
+    formats = tracing_formats()
+    return Trace(name, attributes, formats).root if formats else NOOP_SPAN
+
+
+@contextmanager
+def trace(name: str, **attributes):
+    """
+    Start a trace (exported when the block ends), or a nested span when one
+    is already running. Usable as a decorator.
+    """
+    with activate(start_trace(name, **attributes)) as active:
+        yield active
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """A child of the current span for the duration of the block"""
+    with activate(current_span().child(name, **attributes)) as active:
+        yield active
+
+
+def start_span(name: str, **attributes):
+    """
+    A child of the current span that is not made current; end() it yourself.
+    For generators, whose body runs in the consumer's context between yields.
+    """
+    return current_span().child(name, **attributes)
+
+
+def bind(fn: Callable, parent=None) -> Callable:
+    """fn to run on another thread inside this thread's trace (under parent if given)"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A fresh copy per call, so one bound fn can run on several threads at once
+        return context.copy().run(call_under, parent, fn, args, kwargs)
+    return run
+
+
+def call_under(parent, fn: Callable, args: tuple, kwargs: Dict):
+    if parent is not None and parent is not NOOP_SPAN:
+        CURRENT_SPAN.set(parent)
+    return fn(*args, **kwargs)
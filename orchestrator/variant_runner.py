@@ -0,0 +1,213 @@
+"""
+A/B variant execution with a shared, cacheable document prefix.
+
+Runs every PromptTester variant x iteration for one agent through the
+AgentClient request layout, where the document/context block comes first and
+is marked for prompt caching. The first call writes the cache, the remaining
+calls read it concurrently. Results use the PromptTester format, so they can
+be passed straight to save_test_results and the existing result pages, and
+carry an extra 'cache_report' with the tokens, cost and latency saved.
+
+Each run is checkpointed call by call (orchestrator.checkpoints), so it can
+be cancelled (no new calls are scheduled, finished ones are kept) and resumed
+by run id without paying for completed calls again.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from orchestrator.agent_client import DEFAULT_MODEL, AgentClient, build_agent_request, model_parameters
+from orchestrator.checkpoints import CANCELLED, COMPLETE, CheckpointStore, RunCheckpoint
+from orchestrator.metrics import all_variant_metrics, pick_winner
+from orchestrator.pricing import cache_report
+from orchestrator.telemetry import labelled
+from orchestrator.tracing import bind, span
+
+
+class VariantRunner:
+    """Drop-in for PromptTester.run_ab_test that shares the document prefix across calls"""
+
+    def __init__(self, tester, config: Optional[Dict] = None, client: Optional[AgentClient] = None,
+                 cache_prefix: bool = True, max_workers: int = 4, checkpoints: Optional[CheckpointStore] = None):
+        self.tester = tester
+        self.config = config
+        self.client = client or AgentClient()
+        self.cache_prefix = cache_prefix
+        self.max_workers = max_workers
+        self.checkpoints = checkpoints or CheckpointStore()
+
+    def variant_parameters(self, agent_name: str, variant_config: Dict) -> Dict:
+        """Agent defaults from the engine config, overridden by the variant"""
+        if self.config and agent_name in self.config.get('agents', {}):
+            base = model_parameters(self.config, agent_name)
+        else:
+            base = {'model': DEFAULT_MODEL, 'temperature': 0.3, 'max_tokens': 1500}
+
+        return {
+            'model': variant_config.get('model', base['model']),
+            'temperature': variant_config.get('temperature', base['temperature']),
+            'max_tokens': variant_config.get('max_tokens', base['max_tokens']),
+            'system_prompt': variant_config['system_prompt']
+        }
+
+    def build_request(self, agent_name: str, variant_config: Dict, input_data: Dict) -> Dict:
+        params = self.variant_parameters(agent_name, variant_config)
+        return build_agent_request(params, input_data, self.cache_prefix)
+
+    def run_ab_test(self, agent_name: str, input_data: Dict, ground_truth: Optional[Dict] = None,
+                    iterations: int = 3, on_progress: Optional[Callable[[int, int], None]] = None,
+                    cancel: Optional[threading.Event] = None) -> Dict:
+        """Run all variants and return results in the PromptTester format"""
+        run_id = self.start(agent_name, input_data, ground_truth, iterations)
+        return self.resume(run_id, on_progress, cancel)
+
+    def start(self, agent_name: str, input_data: Dict, ground_truth: Optional[Dict] = None,
+              iterations: int = 3, run_id: Optional[str] = None) -> str:
+        """Create a checkpointed run and return its id (no calls are made yet); run_id from new_run_id if given"""
+        if iterations < 1:
+            raise ValueError(f"iterations must be at least 1, got {iterations}")
+        variants = self.tester.variants[agent_name]['variants']
+        run = self.checkpoints.create({
+            'agent_name': agent_name,
+            'input_data': input_data,
+            'ground_truth': ground_truth,
+            'iterations': iterations,
+            'variant_ids': list(variants),
+            'variants': variants,
+            'runner': self.settings()
+        }, run_id=run_id)
+        return run.run_id
+
+    def settings(self) -> Dict:
+        """Runner options recorded with a run"""
+        return {'type': 'fixed', 'cache_prefix': self.cache_prefix}
+
+    def resume(self, run_id: str, on_progress: Optional[Callable[[int, int], None]] = None,
+               cancel: Optional[threading.Event] = None) -> Dict:
+        """
+        Finish a run: checkpointed successes are reused and only the remaining
+        calls are sent. If cancel is set, no new calls are scheduled and the
+        partial results come back with 'cancelled': True (resume again later).
+        """
+        run = self.checkpoints.open(run_id)
+        header = run.header
+        agent_name, variants, iterations = header['agent_name'], header['variants'], header['iterations']
+
+        completed = run.completed()
+        outputs = {
+            variant_id: [completed.get((variant_id, i)) for i in range(iterations)]
+            for variant_id in header['variant_ids']
+        }
+        jobs = [(variant_id, i) for i in range(iterations) for variant_id in header['variant_ids']
+                if (variant_id, i) not in completed]
+        total = iterations * len(header['variant_ids'])
+        finished = [total - len(jobs)]
+        lock = threading.Lock()
+        start = time.time()
+
+        def run_job(job):
+            variant_id, iteration = job
+            result = self.call(run, agent_name, variants[variant_id], header['input_data'], variant_id, iteration)
+            outputs[variant_id][iteration] = result
+            with lock:
+                finished[0] += 1
+                done = finished[0]
+            if on_progress:
+                on_progress(done, total)
+
+        self.schedule(jobs, run_job, cancel)
+
+        results = self.assemble(agent_name, variants, outputs, iterations, header['ground_truth'], time.time() - start)
+        return self.finish(run, results, cancelled=any(call is None for calls in outputs.values() for call in calls))
+
+    def call(self, run: RunCheckpoint, agent_name: str, variant_config: Dict, input_data: Dict,
+             variant_id: str, iteration: int) -> Dict:
+        """One checkpointed variant call"""
+        with span('variant.call', agent=agent_name, variant=variant_id, iteration=iteration):
+            request = self.build_request(agent_name, variant_config, input_data)
+            try:
+                with labelled(variant=variant_id):
+                    result = self.client.call(agent_name, request)
+            except Exception as e:
+                # An unexpected error fails this call only; finished calls stay checkpointed
+                result = {'success': False, 'error': f"{type(e).__name__}: {e}", 'execution_time': 0.0}
+            with span('checkpoint.record'):
+                run.record(variant_id, iteration, result)
+        return result
+
+    def schedule(self, jobs: List, run_job: Callable, cancel: Optional[threading.Event] = None,
+                 warm_first: bool = True):
+        """Run jobs on the pool, submitting no new ones once cancel is set (running calls finish)"""
+        if not jobs or (cancel and cancel.is_set()):
+            return
+
+        # The first call writes the shared prefix to the cache; the rest read it
+        if warm_first:
+            run_job(jobs[0])
+            jobs = jobs[1:]
+
+        run_job = bind(run_job)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = set()
+            for job in jobs:
+                if len(running) >= self.max_workers:
+                    _, running = wait(running, return_when=FIRST_COMPLETED)
+                if cancel and cancel.is_set():
+                    break
+                running.add(pool.submit(run_job, job))
+            wait(running)
+
+    @staticmethod
+    def finish(run: RunCheckpoint, results: Dict, cancelled: bool) -> Dict:
+        results['run_id'] = run.run_id
+        if cancelled:
+            results['cancelled'] = True
+            run.set_status(CANCELLED)
+        else:
+            run.set_status(COMPLETE)
+        return results
+
+    def mark_saved(self, run_id: str, saved_path: Optional[str]):
+        """Record where a run's results were saved; it then no longer shows as resumable"""
+        self.checkpoints.open(run_id).set_status(COMPLETE, saved_path or 'saved')
+
+    def assemble(self, agent_name: str, variants: Dict, outputs: Dict[str, List[Dict]], iterations: int,
+                 ground_truth: Optional[Dict] = None, execution_time: Optional[float] = None) -> Dict:
+        """Score per-variant outputs and build the save_test_results payload"""
+        # Every variant's outputs are tokenised and scored in one batch
+        metrics = all_variant_metrics(outputs, ground_truth)
+        results = {
+            variant_id: {
+                'config': variants[variant_id],
+                'outputs': outputs[variant_id],
+                'metrics': metrics[variant_id]
+            }
+            for variant_id in outputs
+        }
+
+        all_calls = [call for calls in outputs.values() for call in calls if call]
+
+        return {
+            'agent_name': agent_name,
+            'timestamp': datetime.now().isoformat(),
+            'iterations': iterations,
+            'ground_truth': ground_truth,
+            'results': results,
+            'winner': pick_winner(results),
+            'execution_time': execution_time,
+            'cache_report': cache_report(all_calls)
+        }
+
+
+def format_cache_report(report: Dict) -> str:
+    tokens = report['tokens']
+    return (
+        f"Prompt cache: {report['cache_hits']}/{report['calls']} calls hit "
+        f"({report['cached_prompt_share']:.0%} of prompt tokens read from cache)\n"
+        f"  Cache writes/reads: {tokens['cache_creation_input_tokens']} / {tokens['cache_read_input_tokens']} tokens\n"
+        f"  Cost: ${report['cost']:.4f} (saved ${report['cost_saved']:.4f} vs ${report['cost_without_cache']:.4f})\n"
+        f"  Latency saved: {report['latency_saved']:.1f}s across cached calls"
+    )
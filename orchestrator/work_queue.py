@@ -0,0 +1,279 @@
+"""
+Durable multi-process work queue on SQLite.
+
+Analyses and A/B tests are enqueued as jobs in one SQLite file, and any
+number of worker processes (python worker.py) drain them:
+
+    claim       - a worker takes the oldest available job inside an IMMEDIATE
+                  transaction and holds a lease on it for visibility_timeout
+                  seconds, extended by heartbeats while it runs
+    expiry      - if a worker dies, its lease lapses and the job becomes
+                  visible to other workers again
+    retries     - a failed job goes back on the queue with exponential
+                  backoff until max_attempts is reached
+    dead letter - jobs out of attempts are kept with status 'dead' and their
+                  last error, and can be requeued by hand
+
+Only the worker holding the current lease can complete or fail a job, so a
+worker whose lease expired mid-run cannot overwrite the result of the worker
+that took over.
+
+By default the file is opened in WAL mode, which relies on shared memory and
+so only works for workers on one host. To share a queue between machines,
+open it with shared=True (python worker.py --shared) in every process: that
+uses the rollback journal instead, which works on a network filesystem with
+reliable file locking (not every NFS setup qualifies).
+
+    queue = WorkQueue()
+    queue.enqueue('analysis', {'document': ..., 'context': ...})
+    job = queue.claim('worker-1')
+    queue.complete(job['id'], 'worker-1', {'path': ...})
+"""
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence
+
+
+QUEUE_PATH = 'outputs/work_queue.db'
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_available ON jobs (status, available_at);
+"""
+
+
+def decode(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+class WorkQueue:
+    """Lease-based job queue shared by worker processes through one SQLite file"""
+
+    def __init__(self, db_path: str = QUEUE_PATH, visibility_timeout: float = 300.0,
+                 max_attempts: int = 3, retry_delay: float = 5.0, shared: bool = False):
+        self.db_path = db_path
+        self.shared = shared
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with closing(self.connect()) as conn:
+            # WAL's shared-memory index cannot be used across machines
+            conn.execute(f"PRAGMA journal_mode={'DELETE' if shared else 'WAL'}")
+            conn.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        # Transactions are managed explicitly so claims can take the write lock up front
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute(f"PRAGMA synchronous={'FULL' if self.shared else 'NORMAL'}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+
+    def enqueue(self, kind: str, payload: Dict, max_attempts: Optional[int] = None,
+                delay: float = 0.0) -> str:
+        """Add a job; returns its id"""
+        job_id = f"{kind}_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), QUEUED, max_attempts or self.max_attempts,
+                 now + delay, now, now)
+            )
+        return job_id
+
+    def enqueue_many(self, kind: str, payloads: Sequence[Dict]) -> List[str]:
+        """Add many jobs in one transaction"""
+        now = time.time()
+        rows = [(f"{kind}_{uuid.uuid4().hex[:12]}", kind, json.dumps(payload), QUEUED, self.max_attempts,
+                 now, now, now) for payload in payloads]
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                "INSERT INTO jobs (id, kind, payload, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute('COMMIT')
+        return [row[0] for row in rows]
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def claim(self, worker_id: str, kinds: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """
+        Lease the oldest available job (queued and due, or leased with an
+        expired lease) to worker_id; None when nothing is available. Expired
+        jobs that have used all their attempts are dead-lettered instead.
+        """
+        now = time.time()
+        kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})" if kinds else ""
+
+        with closing(self.connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                while True:
+                    row = conn.execute(
+                        f"SELECT * FROM jobs WHERE ((status = ? AND available_at <= ?) "
+                        f"OR (status = ? AND lease_expires < ?)) {kind_filter} "
+                        f"ORDER BY available_at LIMIT 1",
+                        (QUEUED, now, LEASED, now, *(kinds or ()))
+                    ).fetchone()
+                    if row is None:
+                        conn.execute('COMMIT')
+                        return None
+
+                    if row['status'] == LEASED and row['attempts'] >= row['max_attempts']:
+                        conn.execute(
+                            "UPDATE jobs SET status = ?, lease_owner = NULL, error = ?, updated_at = ? WHERE id = ?",
+                            (DEAD, f"Lease expired on attempt {row['attempts']} ({row['lease_owner']})", now, row['id'])
+                        )
+                        continue
+
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, updated_at = ? WHERE id = ?",
+                        (LEASED, worker_id, now + self.visibility_timeout, now, row['id'])
+                    )
+                    job = decode(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+                    conn.execute('COMMIT')
+                    return job
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def owned_update(self, job_id: str, worker_id: str, sql: str, params: tuple) -> bool:
+        """Run an UPDATE only while worker_id still holds the job's lease"""
+        with closing(self.connect()) as conn:
+            cursor = conn.execute(
+                f"{sql} WHERE id = ? AND status = ? AND lease_owner = ?",
+                params + (job_id, LEASED, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False if it was lost to another worker"""
+        now = time.time()
+        return self.owned_update(job_id, worker_id, "UPDATE jobs SET lease_expires = ?, updated_at = ?",
+                                 (now + self.visibility_timeout, now))
+
+    def annotate(self, job_id: str, worker_id: str, **fields) -> bool:
+        """Merge fields into the job's payload (e.g. a checkpoint id a retry can resume from)"""
+        job = self.get(job_id)
+        payload = dict(job['payload'], **fields)
+        return self.owned_update(job_id, worker_id, "UPDATE jobs SET payload = ?, updated_at = ?",
+                                 (json.dumps(payload), time.time()))
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict] = None) -> bool:
+        """Store the result; lease_owner is kept as the worker that finished the job"""
+        return self.owned_update(
+            job_id, worker_id,
+            "UPDATE jobs SET status = ?, lease_expires = NULL, result = ?, error = NULL, updated_at = ?",
+            (DONE, json.dumps(result), time.time())
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Requeue with exponential backoff, or dead-letter once out of attempts (or if retry=False)"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+
+        now = time.time()
+        if retry and job['attempts'] < job['max_attempts']:
+            delay = self.retry_delay * 2 ** (job['attempts'] - 1)
+            return self.owned_update(
+                job_id, worker_id,
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, available_at = ?, "
+                "error = ?, updated_at = ?",
+                (QUEUED, now + delay, error, now)
+            )
+        return self.owned_update(
+            job_id, worker_id,
+            "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ?",
+            (DEAD, error, now)
+        )
+
+    # ------------------------------------------------------------------
+    # Inspection
+    # ------------------------------------------------------------------
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return decode(row) if row else None
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Most recently updated jobs, optionally of one status"""
+        with closing(self.connect()) as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+                                    (status, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return [decode(row) for row in rows]
+
+    def stats(self) -> Dict:
+        """Job counts per status (leases that have lapsed are counted as 'expired')"""
+        counts = dict.fromkeys((QUEUED, LEASED, DONE, DEAD, 'expired'), 0)
+        with closing(self.connect()) as conn:
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+                counts[row['status']] = row['n']
+            counts['expired'] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_expires < ?", (LEASED, time.time())
+            ).fetchone()[0]
+        return counts
+
+    def requeue_dead(self, job_id: Optional[str] = None) -> int:
+        """Give dead-lettered jobs (one, or all) a fresh set of attempts"""
+        now = time.time()
+        with closing(self.connect()) as conn:
+            if job_id:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? "
+                    "WHERE id = ? AND status = ?", (QUEUED, now, now, job_id, DEAD))
+            else:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE status = ?",
+                    (QUEUED, now, now, DEAD))
+            return cursor.rowcount
+
+    def purge(self, older_than: float = 7 * 86400) -> int:
+        """Delete finished jobs last updated more than older_than seconds ago"""
+        with closing(self.connect()) as conn:
+            cursor = conn.execute("DELETE FROM jobs WHERE status = ? AND updated_at < ?",
+                                  (DONE, time.time() - older_than))
+            return cursor.rowcount
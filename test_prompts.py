@@ -1,17 +1,78 @@
 from orchestrator.prompt_tester import PromptTester
+from orchestrator.variant_runner import VariantRunner, format_cache_report
+from orchestrator.batch_tester import BatchPromptTester
+from orchestrator.results_index import save_test
+from orchestrator.adaptive_runner import STRATEGIES, AdaptiveVariantRunner, format_adaptive_report, resume_runner
+from orchestrator.checkpoints import CheckpointStore
+from orchestrator.evaluation import DatasetEvaluator, format_leaderboard, load_dataset, save_evaluation
+from orchestrator.resilience import ResilientAgentClient
+from orchestrator.tracing import span, trace
 from dotenv import load_dotenv
+import argparse
+import logging
 import os
 
+# Before main() is traced, so AGENT_TRACING set in .env takes effect
+load_dotenv()
 
+
+def print_winners(all_results):
+    for results in all_results:
+        print(f"\n{'='*70}")
+        print(f"WINNER ({results['batch_run_id']}):")
+        print(f"  {results['winner']['variant_name']}")
+        print(f"  Composite Score: {results['winner']['composite_score']:.3f}")
+        print(f"{'='*70}")
+        print(format_cache_report(results['cache_report']))
+
+
+@trace('test_prompts')
 def main():
-    load_dotenv()
+    parser = argparse.ArgumentParser(description="A/B test prompt variants")
+    parser.add_argument('--agent', default='strategic_analyst')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--batch', action='store_true',
+                        help="Submit through the Message Batches API (half price, asynchronous)")
+    parser.add_argument('--documents', help="JSONL file of documents to test (batch mode)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Finish batch runs left unfinished by an earlier process")
+    parser.add_argument('--adaptive', choices=STRATEGIES,
+                        help="Allocate iterations adaptively and stop once the winner is clear")
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help="Probability the leader is best required to stop early (adaptive mode)")
+    parser.add_argument('--resume-run', metavar='RUN_ID',
+                        help="Finish an interrupted or cancelled A/B run from its checkpoint")
+    parser.add_argument('--list-runs', action='store_true', help="List A/B runs that can be resumed")
+    parser.add_argument('--evaluate', metavar='DATASET',
+                        help="Rank every variant over a labelled JSONL dataset (document, context, ground_truth)")
+    parser.add_argument('--resume-evaluation', metavar='RUN_ID', help="Finish an interrupted dataset evaluation")
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent calls in evaluation mode")
+    parser.add_argument('--score-every', type=int, default=100,
+                        help="Print a partial leaderboard after this many calls (evaluation mode)")
+    args = parser.parse_args()
+
+    if args.list_runs:
+        for run in CheckpointStore().resumable():
+            print(f"{run['run_id']}  {run['status']:9s}  {run['completed_calls']}/{run['total_calls']} calls done")
+        return
 
     if not os.getenv('ANTHROPIC_API_KEY'):
         print("Error: ANTHROPIC_API_KEY not found")
         return
 
     # Initialize tester
-    tester = PromptTester()
+    with span('prompt_tester.init'):
+        tester = PromptTester()
+
+    # Batch mode reports submission and polling progress through logging
+    logging.basicConfig(format='  %(message)s')
+    logging.getLogger('orchestrator.batch_tester').setLevel(logging.INFO)
+
+    if args.resume:
+        batch = BatchPromptTester(tester)
+        for run_results in batch.resume().values():
+            print_winners(run_results)
+        return
 
     # Test input (same as your dissertation methodology)
     input_data = {
@@ -45,16 +106,54 @@ def main():
         'key_weakness': 'Insufficient value justification at $450 price point'
     }
 
-    # Run A/B test
-    results = tester.run_ab_test(
-        agent_name='strategic_analyst',
-        input_data=input_data,
-        ground_truth=ground_truth,
-        iterations=3  # Run each variant 3 times
-    )
+    if args.evaluate or args.resume_evaluation:
+        evaluator = DatasetEvaluator(tester, client=ResilientAgentClient(), max_workers=args.concurrency,
+                                     score_every=args.score_every)
+        if args.resume_evaluation:
+            run_id = args.resume_evaluation
+        else:
+            run_id = evaluator.start(args.agent, load_dataset(args.evaluate), iterations=args.iterations)
+        print(f"Evaluation {run_id} (resume with --resume-evaluation {run_id})")
+        report = evaluator.resume(run_id, on_leaderboard=lambda board: print(f"\n{format_leaderboard(board)}"))
+
+        print(f"\n{'='*70}")
+        if report['winner']:
+            print(f"WINNER over {report['documents']} documents: {report['winner']['variant_name']}")
+        print(f"{'='*70}\n")
+        print(format_cache_report(report['cache_report']))
+        print(f"Report saved to {save_evaluation(report)}\n")
+        return
+
+    if args.batch:
+        tests = load_dataset(args.documents) if args.documents else [
+            {'input_data': input_data, 'ground_truth': ground_truth}
+        ]
+        batch = BatchPromptTester(tester)
+        print_winners(batch.run(args.agent, tests, iterations=args.iterations))
+        return
+
+    # Run A/B test (document prefix shared across variants via prompt caching)
+    if args.resume_run:
+        runner = resume_runner(tester, args.resume_run)
+        run_id = args.resume_run
+    else:
+        if args.adaptive:
+            runner = AdaptiveVariantRunner(tester, strategy=args.adaptive, confidence=args.confidence)
+        else:
+            runner = VariantRunner(tester)
+        run_id = runner.start(
+            agent_name=args.agent,
+            input_data=input_data,
+            ground_truth=ground_truth,
+            iterations=args.iterations  # Run each variant N times
+        )
+
+    # Every call is checkpointed; after an interruption, finish with --resume-run
+    print(f"Run {run_id} (resume with --resume-run {run_id})")
+    results = runner.resume(run_id)
 
     # Save results
-    tester.save_test_results(results)
+    runner.mark_saved(run_id, save_test(tester, results))
 
     # Display winner
     print(f"\n{'='*70}")
@@ -62,6 +161,10 @@ def main():
     print(f"  {results['winner']['variant_name']}")
     print(f"  Composite Score: {results['winner']['composite_score']:.3f}")
     print(f"{'='*70}\n")
+    print(format_cache_report(results['cache_report']))
+    if 'adaptive' in results:
+        print(format_adaptive_report(results['adaptive']))
+    print()
 
 
 if __name__ == "__main__":
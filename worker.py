@@ -0,0 +1,318 @@
+"""
+Queue worker: drains analysis and A/B test jobs from the shared work queue.
+
+Run any number of these on one machine; to spread them over several machines,
+put the queue file on shared storage and pass --shared to every one:
+
+    python worker.py run --concurrency 4
+    python worker.py submit analysis --document brief.txt
+    python worker.py submit ab_test --document brief.txt --agent strategic_analyst --iterations 5
+    python worker.py status
+    python worker.py requeue            # give dead-lettered jobs another go
+
+Jobs run the usual WorkflowEngine / PromptTester code and save into outputs/
+and the results index as the app and CLI do. A/B jobs are checkpointed, so a
+retry after a worker crash resumes the run instead of starting it again.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from orchestrator.workflow_engine import WorkflowEngine
+from orchestrator.prompt_tester import PromptTester
+from orchestrator.map_reduce import workflow_for
+from orchestrator.variant_runner import VariantRunner
+from orchestrator.adaptive_runner import AdaptiveVariantRunner, resume_runner
+from orchestrator.checkpoints import CheckpointStore, new_run_id
+from orchestrator.results_index import save_analysis, save_test
+from orchestrator.resilience import ResilientAgentClient, hedging_enabled
+from orchestrator.single_flight import SingleFlight, fingerprint
+from orchestrator.cascade import cascading_client
+from orchestrator.telemetry import start_metrics_server
+from orchestrator.work_queue import DEAD, LEASED, QUEUE_PATH, QUEUED, WorkQueue
+
+
+KINDS = ('analysis', 'ab_test')
+
+
+class JobFailed(Exception):
+    """A job ran but did not succeed (retried like any other error)"""
+
+
+class LeaseLost(JobFailed):
+    """Another worker may own the job now; this attempt stops without touching it"""
+
+
+def check_lease(job: Dict, worker: 'Worker', worker_id: str, lost_lease: threading.Event):
+    """Raise LeaseLost unless this worker still holds the job (renewing the lease as it checks)"""
+    if lost_lease.is_set() or not worker.queue.heartbeat(job['id'], worker_id):
+        lost_lease.set()
+        raise LeaseLost(f"Lease lost on {job['id']}")
+
+
+def run_analysis(job: Dict, worker: 'Worker', worker_id: str, lost_lease: threading.Event) -> Dict:
+    """Run the (map-reduce for long documents) workflow and save it to the results history"""
+    payload = job['payload']
+    engine = WorkflowEngine()
+    input_data = {'document': payload['document'], 'context': payload.get('context', '')}
+
+    def analyse():
+        check_lease(job, worker, worker_id, lost_lease)
+        result = workflow_for(engine.config, input_data, client=cascading_client(engine.config, worker.client)).execute(input_data)
+        if not result['success']:
+            raise JobFailed(result.get('error', 'Analysis failed'))
+        # A stale worker must not save a second copy of what the new lease holder is saving
+        check_lease(job, worker, worker_id, lost_lease)
+        path = save_analysis(engine, result) if payload.get('save', True) else None
+        return {'path': path, 'execution_time': result['execution_time']}
+
+    # Identical jobs running on this worker's other threads share one run (and one saved result)
+    result, shared = worker.flights.do(fingerprint(input_data, engine.config), analyse)
+    return dict(result, shared=shared)
+
+
+def run_ab_test(job: Dict, worker: 'Worker', worker_id: str, lost_lease: threading.Event) -> Dict:
+    """Start or resume a checkpointed A/B run and save its results"""
+    payload = job['payload']
+    tester = PromptTester()
+    config = WorkflowEngine().config
+    run_id = payload.get('run_id')
+    check_lease(job, worker, worker_id, lost_lease)
+
+    if run_id and CheckpointStore().exists(run_id):
+        # An earlier attempt started this run; its finished calls are reused
+        runner = resume_runner(tester, run_id, config=config, client=worker.client)
+    else:
+        if payload.get('adaptive'):
+            runner = AdaptiveVariantRunner(tester, config=config, client=worker.client, strategy=payload['adaptive'],
+                                           confidence=payload.get('confidence', 0.95))
+        else:
+            runner = VariantRunner(tester, config=config, client=worker.client)
+        if not run_id:
+            # Recorded on the job before the checkpoint exists, so a crash in between can't orphan the run
+            run_id = new_run_id(payload['agent_name'])
+            if not worker.queue.annotate(job['id'], worker_id, run_id=run_id):
+                lost_lease.set()
+                raise LeaseLost(f"Lease lost on {job['id']} before run {run_id} started")
+        runner.start(
+            agent_name=payload['agent_name'],
+            input_data={'document': payload['document'], 'context': payload.get('context', '')},
+            ground_truth=payload.get('ground_truth'),
+            iterations=payload.get('iterations', 3),
+            run_id=run_id
+        )
+
+    # Another worker owns the job once the lease is lost, so stop scheduling calls
+    results = runner.resume(run_id, cancel=lost_lease)
+    if results.get('cancelled'):
+        raise LeaseLost(f"Lease lost; run {run_id} left to the worker that took over")
+
+    check_lease(job, worker, worker_id, lost_lease)
+    path = save_test(tester, results) if payload.get('save', True) else None
+    runner.mark_saved(run_id, path)
+    return {'path': path, 'run_id': run_id, 'winner': results.get('winner', {}).get('variant_name')}
+
+
+HANDLERS = {
+    'analysis': run_analysis,
+    'ab_test': run_ab_test
+}
+
+
+class Worker:
+    """Claims jobs from the queue on a few threads, heartbeating each lease while its job runs"""
+
+    def __init__(self, queue: WorkQueue, kinds: Optional[Sequence[str]] = None, concurrency: int = 1,
+                 poll_interval: float = 1.0, exit_when_empty: bool = False, max_jobs: Optional[int] = None):
+        self.queue = queue
+        self.kinds = list(kinds or KINDS)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.exit_when_empty = exit_when_empty
+        self.max_jobs = max_jobs
+        self.client = ResilientAgentClient(hedge=hedging_enabled())
+        self.flights = SingleFlight()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.counts = {'claimed': 0, 'completed': 0, 'failed': 0, 'lost': 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+    def claim_budget(self) -> bool:
+        """Whether this worker may claim another job (--max-jobs)"""
+        with self.lock:
+            if self.max_jobs is not None and self.counts['claimed'] >= self.max_jobs:
+                return False
+            self.counts['claimed'] += 1
+            return True
+
+    def drained(self) -> bool:
+        stats = self.queue.stats()
+        return stats[QUEUED] == 0 and stats[LEASED] == 0
+
+    def run(self) -> Dict:
+        threads = [threading.Thread(target=self.loop, args=(f"{self.name}:{n}",), daemon=True)
+                   for n in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+        return dict(self.counts)
+
+    def loop(self, worker_id: str):
+        while not self.stop.is_set():
+            if not self.claim_budget():
+                return
+            job = self.queue.claim(worker_id, self.kinds)
+            if job is None:
+                with self.lock:
+                    self.counts['claimed'] -= 1
+                if self.exit_when_empty and self.drained():
+                    return
+                self.stop.wait(self.poll_interval)
+                continue
+            self.process(job, worker_id)
+
+    def process(self, job: Dict, worker_id: str):
+        lost_lease = threading.Event()
+        finished = threading.Event()
+
+        def heartbeat():
+            renewed_at = time.time()
+            while not finished.wait(self.queue.visibility_timeout / 3):
+                try:
+                    renewed = self.queue.heartbeat(job['id'], worker_id)
+                except sqlite3.OperationalError as e:
+                    # e.g. the queue file is locked; retry next tick until the lease would have expired
+                    print(f"[{worker_id}] heartbeat for {job['id']} failed: {e}")
+                    if time.time() - renewed_at < self.queue.visibility_timeout:
+                        continue
+                    renewed = False
+                if not renewed:
+                    lost_lease.set()
+                    return
+                renewed_at = time.time()
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        print(f"[{worker_id}] {job['id']} (attempt {job['attempts']}/{job['max_attempts']})")
+
+        try:
+            result = HANDLERS[job['kind']](job, self, worker_id, lost_lease)
+            finished.set()
+            if self.queue.complete(job['id'], worker_id, result):
+                self.count('completed')
+                print(f"[{worker_id}] ✓ {job['id']}")
+            else:
+                self.count('lost')
+                print(f"[{worker_id}] ✗ {job['id']}: lease lost before completion, result discarded")
+        except LeaseLost as e:
+            # The job is no longer ours to fail or retry
+            finished.set()
+            self.count('lost')
+            print(f"[{worker_id}] ✗ {job['id']}: {e}, stopped")
+        except Exception as e:
+            finished.set()
+            self.count('failed')
+            error = f"{type(e).__name__}: {e}"
+            self.queue.fail(job['id'], worker_id, error, retry=job['kind'] in HANDLERS)
+            print(f"[{worker_id}] ✗ {job['id']}: {error}")
+
+
+def read_file(path: Optional[str]) -> str:
+    if not path:
+        return ''
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work queue for analyses and A/B tests")
+    parser.add_argument('--db', default=QUEUE_PATH, help="Queue file (shared by every worker)")
+    parser.add_argument('--shared', action='store_true',
+                        help="Queue file is on storage shared by several machines (disables WAL)")
+    parser.add_argument('--visibility-timeout', type=float, default=300.0,
+                        help="Seconds a claimed job stays leased without a heartbeat")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help="Drain jobs until stopped")
+    run.add_argument('--concurrency', type=int, default=1, help="Jobs processed at once by this worker")
+    run.add_argument('--kinds', default=','.join(KINDS), help="Comma-separated job kinds to take")
+    run.add_argument('--poll', type=float, default=1.0, help="Seconds between polls when the queue is empty")
+    run.add_argument('--exit-when-empty', action='store_true', help="Stop once no jobs are queued or running")
+    run.add_argument('--max-jobs', type=int, help="Stop after claiming this many jobs")
+    run.add_argument('--metrics-port', type=int, help="Serve Prometheus /metrics on this port")
+    run.add_argument('--metrics-host', default='127.0.0.1',
+                     help="Interface for --metrics-port (0.0.0.0 to allow remote scrapes)")
+
+    submit = commands.add_parser('submit', help="Enqueue a job")
+    submit.add_argument('kind', choices=KINDS)
+    submit.add_argument('--document', required=True, help="File with the document text")
+    submit.add_argument('--context', help="File with the context text")
+    submit.add_argument('--agent', default='strategic_analyst', help="Agent to A/B test")
+    submit.add_argument('--iterations', type=int, default=3)
+    submit.add_argument('--adaptive', choices=['thompson', 'halving'])
+    submit.add_argument('--max-attempts', type=int, default=3)
+
+    commands.add_parser('status', help="Job counts and dead letters")
+
+    requeue = commands.add_parser('requeue', help="Requeue dead-lettered jobs")
+    requeue.add_argument('job_id', nargs='?', help="One job (default: all dead jobs)")
+
+    args = parser.parse_args()
+    queue = WorkQueue(args.db, visibility_timeout=args.visibility_timeout, shared=args.shared)
+
+    if args.command == 'submit':
+        payload = {'document': read_file(args.document), 'context': read_file(args.context)}
+        if args.kind == 'ab_test':
+            payload.update(agent_name=args.agent, iterations=args.iterations, adaptive=args.adaptive)
+        print(queue.enqueue(args.kind, payload, max_attempts=args.max_attempts))
+        return
+
+    if args.command == 'status':
+        print(json.dumps(queue.stats(), indent=2))
+        for job in queue.jobs(DEAD, limit=10):
+            print(f"  dead {job['id']} after {job['attempts']} attempts: {job['error']}")
+        return
+
+    if args.command == 'requeue':
+        print(f"Requeued {queue.requeue_dead(args.job_id)} job(s)")
+        return
+
+    load_dotenv()
+    if not os.getenv('ANTHROPIC_API_KEY'):
+        print("Error: ANTHROPIC_API_KEY not found")
+        return
+
+    run_args = args if args.command == 'run' else run.parse_args([])
+    if run_args.metrics_port:
+        start_metrics_server(run_args.metrics_port, host=run_args.metrics_host)
+        print(f"Metrics on {run_args.metrics_host}:{run_args.metrics_port}/metrics")
+    worker = Worker(queue, kinds=run_args.kinds.split(','), concurrency=run_args.concurrency,
+                    poll_interval=run_args.poll, exit_when_empty=run_args.exit_when_empty,
+                    max_jobs=run_args.max_jobs)
+
+    # Finish the jobs in hand on Ctrl+C / SIGTERM; unfinished leases expire and are retried elsewhere
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop.set())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop.set())
+
+    start = time.time()
+    counts = worker.run()
+    print(f"\n{worker.name}: {counts['completed']} completed, {counts['failed']} failed, "
+          f"{counts['lost']} lost leases in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()